@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import Tiffin, Order, Delivery
+from .models import Tiffin, Order, Delivery, Task
 
 admin.site.register(Tiffin)
 admin.site.register(Order)
-admin.site.register(Delivery) 
\ No newline at end of file
+admin.site.register(Delivery)
+admin.site.register(Task)
@@ -0,0 +1,50 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
+
+
+class ApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'api'
+
+    def ready(self):
+        from users.models import DeliveryBoy, TiffinOwner, User
+        from . import authentication, catalog_cache, db, geo, images, profiling, rollups, search
+        from .models import Order, Tiffin
+
+        connection_created.connect(db.configure_sqlite, dispatch_uid='api.db.configure_sqlite')
+        connection_created.connect(profiling.install_query_recorder,
+                                   dispatch_uid='api.profiling.install_query_recorder')
+
+        post_save.connect(search.tiffin_saved, sender=Tiffin, dispatch_uid='api.search.tiffin_saved')
+        post_delete.connect(search.tiffin_deleted, sender=Tiffin, dispatch_uid='api.search.tiffin_deleted')
+
+        post_save.connect(images.tiffin_saved, sender=Tiffin, dispatch_uid='api.images.tiffin_saved')
+        post_delete.connect(images.tiffin_deleted, sender=Tiffin, dispatch_uid='api.images.tiffin_deleted')
+
+        post_save.connect(catalog_cache.tiffin_changed, sender=Tiffin,
+                          dispatch_uid='api.catalog_cache.tiffin_saved')
+        post_delete.connect(catalog_cache.tiffin_changed, sender=Tiffin,
+                            dispatch_uid='api.catalog_cache.tiffin_deleted')
+        pre_save.connect(catalog_cache.owner_pre_save, sender=TiffinOwner,
+                         dispatch_uid='api.catalog_cache.owner_pre_save')
+        pre_save.connect(geo.owner_pre_save, sender=TiffinOwner, dispatch_uid='api.geo.owner_pre_save')
+        post_save.connect(catalog_cache.owner_changed, sender=TiffinOwner,
+                          dispatch_uid='api.catalog_cache.owner_saved')
+        post_delete.connect(catalog_cache.owner_changed, sender=TiffinOwner,
+                            dispatch_uid='api.catalog_cache.owner_deleted')
+
+        post_save.connect(authentication.user_changed, sender=User,
+                          dispatch_uid='api.authentication.user_saved')
+        post_delete.connect(authentication.user_changed, sender=User,
+                            dispatch_uid='api.authentication.user_deleted')
+        for profile in (TiffinOwner, DeliveryBoy):
+            name = profile._meta.model_name
+            post_save.connect(authentication.profile_changed, sender=profile,
+                              dispatch_uid=f'api.authentication.{name}_saved')
+            post_delete.connect(authentication.profile_changed, sender=profile,
+                                dispatch_uid=f'api.authentication.{name}_deleted')
+
+        pre_save.connect(rollups.order_pre_save, sender=Order, dispatch_uid='api.rollups.order_pre_save')
+        post_save.connect(rollups.order_saved, sender=Order, dispatch_uid='api.rollups.order_saved')
+        post_delete.connect(rollups.order_deleted, sender=Order, dispatch_uid='api.rollups.order_deleted')
@@ -0,0 +1,187 @@
+"""
+Async views for anonymous catalog browsing under ASGI.
+
+Anonymous ``GET`` and ``HEAD`` requests for ``/api/tiffins/`` (with any of
+``?pincode=``, ``?search=``, ``?near=`` and ``?page=``) and for
+``/api/tiffins/<id>/`` are answered by the coroutines below, not by
+``TiffinViewSet``. Under an ASGI server such a request no longer holds a
+thread for its whole duration: a catalog cache hit runs no query, and on a
+miss the queries go through Django's async ORM (``acount``, ``async for``),
+which only borrows a thread for each query. Django's own middleware is still
+sync and takes its thread hops either way (see ``benchmark_asgi``).
+
+The responses match the viewset's: the same ``browse_tiffins`` queryset and
+fast serializer, the same page-number pagination and links, the same
+catalog cache entries and the same ``ETag``s. Clients can switch between the
+two paths without noticing. Every other request is handed to
+``TiffinViewSet`` unchanged, including:
+
+* signed-in users, writes and ``OPTIONS``,
+* the browsable API and indented JSON,
+* error responses (bad pages, unknown pincodes, missing tiffins).
+
+Under WSGI, Django runs every async view in an event loop of its own, so
+``core/urls.py`` only routes here when ``ASYNC_CATALOG`` is on, which
+``core/asgi.py`` arranges. The async path also needs an in-process cache
+(see ``catalog_cache.IN_PROCESS``).
+"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import catalog_cache, conditional, db, fast_serializers
+from .fast_serializers import FastTiffinSerializer
+from .profiling import timed
+from .serializers import TiffinSerializer
+from .views import TiffinViewSet, browse_tiffins
+
+LIST_ACTIONS = {'get': 'list', 'post': 'create'}
+DETAIL_ACTIONS = {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}
+
+# The viewset, for every request the coroutines hand over.
+sync_list = sync_to_async(TiffinViewSet.as_view(LIST_ACTIONS))
+sync_detail = sync_to_async(TiffinViewSet.as_view(DETAIL_ACTIONS))
+
+
+class Fallback(Exception):
+    """Raised to let the viewset answer, typically with an error response."""
+
+
+def _allow(actions):
+    # The Allow header DRF sends, in its method order.
+    methods = [*actions, 'head', 'options']
+    return ', '.join(m.upper() for m in TiffinViewSet.http_method_names if m in methods)
+
+
+ALLOW = {'list': _allow(LIST_ACTIONS), 'retrieve': _allow(DETAIL_ACTIONS)}
+
+
+def anonymous_json_request(request):
+    """
+    Wrap ``request`` in a DRF ``Request`` with the renderer negotiated, or
+    return ``None`` when the viewset should answer it.
+    """
+    if (
+        request.method not in ('GET', 'HEAD')
+        or 'HTTP_AUTHORIZATION' in request.META
+        or not catalog_cache.IN_PROCESS
+    ):
+        return None
+    drf_request = Request(request, authenticators=())
+    renderers = [renderer() for renderer in api_settings.DEFAULT_RENDERER_CLASSES]
+    try:
+        renderer, media_type = DefaultContentNegotiation().select_renderer(drf_request, renderers)
+    except NotAcceptable:
+        return None
+    if not isinstance(renderer, JSONRenderer) or renderer.get_indent(media_type, {}) is not None:
+        return None
+    drf_request.accepted_renderer, drf_request.accepted_media_type = renderer, media_type
+    return drf_request
+
+
+async def catalog_queryset(request):
+    params = request.query_params
+    try:
+        if params.get('search') or params.get('near'):
+            # Checking for the search index and locating the pincode are queries.
+            return await sync_to_async(browse_tiffins)(params)
+        return browse_tiffins(params)
+    except APIException:
+        raise Fallback
+
+
+def serializer_context(request):
+    return {'request': request, 'format': None, 'view': None}
+
+
+async def read_rows(queryset, request):
+    """Serialize ``queryset`` as the viewset's list would."""
+    if fast_serializers.ENABLED:
+        reader = FastTiffinSerializer(context=serializer_context(request))
+        return reader.serialize([row async for row in reader.values(queryset)])
+    instances = [tiffin async for tiffin in queryset]
+    return TiffinSerializer(instances, many=True, context=serializer_context(request)).data
+
+
+async def build_list(request):
+    queryset = await catalog_queryset(request)
+    pagination = api_settings.DEFAULT_PAGINATION_CLASS()
+    page_size = pagination.get_page_size(request)
+    if page_size is None:
+        return await read_rows(queryset, request)
+
+    paginator = pagination.django_paginator_class(queryset, page_size)
+    paginator.count = await queryset.acount()
+    try:
+        page = paginator.page(pagination.get_page_number(request, paginator))
+    except InvalidPage:
+        raise Fallback
+    results = await read_rows(page.object_list, request)
+    page.object_list = results
+    pagination.page, pagination.request = page, request
+    return pagination.get_paginated_response(results).data
+
+
+async def build_detail(request, pk):
+    queryset = await catalog_queryset(request)
+    try:
+        queryset = queryset.filter(pk=pk)
+    except (TypeError, ValueError, ValidationError):
+        raise Fallback
+    results = await read_rows(queryset[:1], request)
+    if not results:
+        raise Fallback
+    return results[0]
+
+
+async def respond(request, action, build, pk=None):
+    """The cached (or freshly built) response, or a 304 if the client has it."""
+    name = f'TiffinViewSet.{action}'
+    key, stale_key = catalog_cache.make_key(request, action, pk=pk)
+    etag = conditional.request_etag(name, request, [key])
+    response = conditional.check(name, request, etag)
+    if response is None:
+        with db.replica_reads():
+            data, fresh = await catalog_cache.aget_or_build(key, stale_key, build)
+        with timed('render'):
+            content = request.accepted_renderer.render(data, request.accepted_media_type, {})
+        response = HttpResponse(content, content_type=request.accepted_renderer.media_type)
+        if not fresh:
+            # The previous version's page; the ETag names the current one.
+            etag = None
+    if etag is not None:
+        conditional.set_validators(response, etag)
+    # The headers DRF adds to every response of the viewset.
+    patch_vary_headers(response, ('Accept',))
+    response['Allow'] = ALLOW[action]
+    return response
+
+
+@csrf_exempt
+async def tiffin_list(request):
+    drf_request = anonymous_json_request(request)
+    if drf_request is not None:
+        try:
+            return await respond(drf_request, 'list', lambda: build_list(drf_request))
+        except Fallback:
+            pass
+    return await sync_list(request)
+
+
+@csrf_exempt
+async def tiffin_detail(request, pk):
+    drf_request = anonymous_json_request(request)
+    if drf_request is not None:
+        try:
+            return await respond(drf_request, 'retrieve', lambda: build_detail(drf_request, pk), pk=pk)
+        except Fallback:
+            pass
+    return await sync_detail(request, pk=pk)
@@ -0,0 +1,154 @@
+"""
+JWT authentication that resolves users from a per-process cache.
+
+``JWTAuthentication`` loads the ``User`` row on every request, and most views
+then reach for ``user.tiffin_owner`` or ``user.delivery_boy`` as well. This
+class loads the user with both profiles in one query and keeps the result in
+memory for ``AUTH_USER_CACHE_TIMEOUT`` seconds, keyed by user id and the
+user's token version.
+
+The version lives in the ``SHARED_CACHE_ALIAS`` cache, which every process
+reads. Saving or deleting a ``User``, ``TiffinOwner`` or ``DeliveryBoy``
+replaces it with a new random token after commit, so every process stops
+using its copy on the next request. Tokens rather than counters keep two
+concurrent bumps from landing on the same value, and a version the cache
+has evicted simply comes back as a new token. Bulk ``update()`` calls skip
+those signals; code that changes users that way should call
+``invalidate_user``.
+"""
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .profiling import timed
+
+TIMEOUT = getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60)
+MAX_ENTRIES = getattr(settings, 'AUTH_USER_CACHE_MAX_ENTRIES', 10000)
+VERSION_CACHE = getattr(settings, 'SHARED_CACHE_ALIAS', 'default')
+
+_lock = threading.Lock()
+# user id -> (token version, expiry, user)
+_users = OrderedDict()
+
+
+def _version_key(user_id):
+    return f'auth:user-version:{user_id}'
+
+
+def get_token_version(user_id):
+    versions = caches[VERSION_CACHE]
+    key = _version_key(user_id)
+    version = versions.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not versions.add(key, version, timeout=None):
+            version = versions.get(key, version)
+    return version
+
+
+def bump_token_version(user_id):
+    caches[VERSION_CACHE].set(_version_key(user_id), uuid.uuid4().hex, timeout=None)
+
+
+def invalidate_user(user_id):
+    """Drop the cached copy of a user everywhere once the transaction commits."""
+
+    def bump():
+        bump_token_version(user_id)
+        with _lock:
+            _users.pop(user_id, None)
+
+    transaction.on_commit(bump)
+
+
+def clear():
+    with _lock:
+        _users.clear()
+
+
+def _copy(user):
+    """
+    Give each request its own instances so that nothing a view sets on
+    ``request.user`` leaks into other requests.
+    """
+    user = copy.copy(user)
+    for name in ('tiffin_owner', 'delivery_boy'):
+        profile = user._state.fields_cache.get(name)
+        if profile is not None:
+            profile = copy.copy(profile)
+            profile._state.fields_cache['user'] = user
+            user._state.fields_cache[name] = profile
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        with timed('auth'):
+            return super().authenticate(request)
+
+    def load_user(self, user_id):
+        return (
+            self.user_model.objects.select_related('tiffin_owner', 'delivery_boy')
+            .get(**{api_settings.USER_ID_FIELD: user_id})
+        )
+
+    def get_cached_user(self, user_id):
+        version = get_token_version(user_id)
+        now = time.monotonic()
+        with _lock:
+            entry = _users.get(user_id)
+            if entry is not None and entry[0] == version and entry[1] > now:
+                _users.move_to_end(user_id)
+                return entry[2]
+
+        user = self.load_user(user_id)
+        with _lock:
+            _users[user_id] = (version, now + TIMEOUT, user)
+            _users.move_to_end(user_id)
+            while len(_users) > MAX_ENTRIES:
+                _users.popitem(last=False)
+        return user
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        try:
+            user = _copy(self.get_cached_user(user_id))
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
+
+
+def user_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_user(instance.pk)
+
+
+def profile_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_user(instance.user_id)
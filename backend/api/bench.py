@@ -0,0 +1,226 @@
+"""
+Helpers shared by the management commands that seed synthetic data and
+measure the API (query budgets, benchmarks, load tests).
+
+Everything here runs against a throwaway database created the same way the
+Django test runner creates one, so the development ``db.sqlite3`` is never
+touched.
+"""
+import contextlib
+import random
+import statistics
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.contrib.auth.hashers import make_password
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from users.models import User, TiffinOwner, DeliveryBoy
+from . import authentication, conditional, geo, search
+from .models import Tiffin, Order, Delivery
+
+PINCODES = ['400001', '400002', '400003', '400004', '400005', '400006', '400007', '400008']
+
+DISHES = [
+    ('Punjabi Thali', 'Dal makhani, paneer butter masala, jeera rice and two rotis'),
+    ('Gujarati Thali', 'Kadhi, khichdi, sev tameta, rotli and shrikhand'),
+    ('South Indian Meal', 'Sambar rice, rasam, curd rice, poriyal and papad'),
+    ('Rajma Chawal', 'Slow cooked kidney beans with steamed basmati rice'),
+    ('Chole Kulche', 'Spicy chickpea curry with soft butter kulchas'),
+    ('Veg Biryani', 'Dum cooked biryani with raita and salan'),
+    ('Paneer Tikka Bowl', 'Grilled paneer, mint chutney and lemon rice'),
+    ('Maharashtrian Thali', 'Varan bhaat, bhakri, pitla and thecha'),
+    ('Bengali Fish Curry', 'Macher jhol with steamed rice and begun bhaja'),
+    ('Millet Khichdi', 'Foxtail millet khichdi with ghee and pickle'),
+]
+
+# Hashing one password per seeded user would dominate seeding time, so every
+# synthetic account shares the same precomputed hash.
+_PASSWORD = None
+
+
+def _password():
+    global _PASSWORD
+    if _PASSWORD is None:
+        _PASSWORD = make_password('password123')
+    return _PASSWORD
+
+
+@contextlib.contextmanager
+def temporary_database(name=None, verbosity=0):
+    """
+    Create a fresh, fully migrated database for the default connection and
+    drop it on exit. Pass ``name`` to get a file-backed SQLite database,
+    which is required when several threads need to share it.
+    """
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    previous_name = test_settings.get('NAME')
+    if name is not None:
+        test_settings['NAME'] = str(name)
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False
+    )
+    # Point read replicas at the same throwaway database, as the test runner
+    # does for TEST['MIRROR'].
+    replica_names = {}
+    for alias in getattr(settings, 'DATABASE_REPLICAS', ()):
+        replica = connections[alias]
+        replica.close()
+        replica_names[alias] = replica.settings_dict['NAME']
+        replica.creation.set_as_test_mirror(connection.settings_dict)
+    # Users and catalog pages cached by an earlier database in this process
+    # share primary keys with the new rows, so start every run cold.
+    cache.clear()
+    authentication.clear()
+    try:
+        yield connection
+    finally:
+        # Keep the counts gathered against this database out of the real one.
+        conditional.flush_counts()
+        for alias, replica_name in replica_names.items():
+            connections[alias].close()
+            connections[alias].settings_dict['NAME'] = replica_name
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+        test_settings['NAME'] = previous_name
+
+
+def seed(owners=5, tiffins_per_owner=4, customers=10, riders=5, orders=50,
+         deliveries=True, pincodes=PINCODES, batch_size=1000, seed_value=0):
+    """
+    Bulk insert a synthetic marketplace and return the created rows grouped
+    by kind. Orders are spread across statuses; every order that reached
+    ``ready_for_delivery`` or later gets a ``Delivery`` row when
+    ``deliveries`` is true, and roughly half of those are assigned.
+    """
+    rng = random.Random(seed_value)
+    password = _password()
+
+    def make_users(prefix, user_type, count):
+        users = [
+            User(
+                username=f'{prefix}{i}',
+                email=f'{prefix}{i}@example.com',
+                password=password,
+                user_type=user_type,
+                phone_number=f'9{i:09d}'[:15],
+                address=f'{i} Example Street',
+                pincode=pincodes[i % len(pincodes)],
+            )
+            for i in range(count)
+        ]
+        User.objects.bulk_create(users, batch_size=batch_size)
+        return list(User.objects.filter(user_type=user_type, username__startswith=prefix).order_by('id'))
+
+    owner_users = make_users('owner', 'owner', owners)
+    customer_users = make_users('customer', 'customer', customers)
+    rider_users = make_users('rider', 'delivery', riders)
+
+    TiffinOwner.objects.bulk_create([
+        TiffinOwner(
+            user=user,
+            business_name=f'Kitchen {i}',
+            business_address=f'{i} Kitchen Lane',
+            business_pincode=user.pincode,
+            is_verified=True,
+        )
+        for i, user in enumerate(owner_users)
+    ], batch_size=batch_size)
+    geo.place_owners(batch_size=batch_size)
+    owner_rows = list(TiffinOwner.objects.select_related('user').order_by('id'))
+
+    DeliveryBoy.objects.bulk_create([
+        DeliveryBoy(user=user, vehicle_number=f'MH01AB{i:04d}', is_available=True)
+        for i, user in enumerate(rider_users)
+    ], batch_size=batch_size)
+    rider_rows = list(DeliveryBoy.objects.select_related('user').order_by('id'))
+
+    tiffins = []
+    for owner in owner_rows:
+        for j in range(tiffins_per_owner):
+            name, description = DISHES[(owner.id + j) % len(DISHES)]
+            tiffins.append(Tiffin(
+                owner=owner,
+                name=name,
+                description=description,
+                price=Decimal(rng.randrange(80, 300)),
+                is_available=rng.random() > 0.1,
+            ))
+    Tiffin.objects.bulk_create(tiffins, batch_size=batch_size)
+    # bulk_create skips post_save, so index the new catalog in one go.
+    search.rebuild_index()
+    tiffin_rows = list(Tiffin.objects.select_related('owner').order_by('id'))
+
+    statuses = [choice for choice, _ in Order.STATUS_CHOICES]
+    order_objs = []
+    for _ in range(orders if tiffin_rows and customer_users else 0):
+        customer = rng.choice(customer_users)
+        tiffin = rng.choice(tiffin_rows)
+        quantity = rng.randint(1, 3)
+        order_objs.append(Order(
+            customer=customer,
+            tiffin=tiffin,
+            quantity=quantity,
+            total_price=tiffin.price * quantity,
+            status=rng.choice(statuses),
+            delivery_address=customer.address,
+            delivery_pincode=customer.pincode,
+        ))
+    Order.objects.bulk_create(order_objs, batch_size=batch_size)
+
+    if deliveries:
+        ready = ('ready_for_delivery', 'picked_up', 'delivered')
+        delivery_objs = []
+        for order in Order.objects.filter(status__in=ready).select_related('tiffin__owner').iterator():
+            rider = rng.choice(rider_rows) if rider_rows and rng.random() < 0.5 else None
+            delivery_objs.append(Delivery(
+                order=order,
+                delivery_boy=rider,
+                pickup_address=order.tiffin.owner.business_address,
+                delivery_address=order.delivery_address,
+                status='pending' if rider is None else 'accepted',
+            ))
+        Delivery.objects.bulk_create(delivery_objs, batch_size=batch_size)
+
+    return SimpleNamespace(
+        owners=owner_rows,
+        customers=customer_users,
+        riders=rider_rows,
+        tiffins=tiffin_rows,
+    )
+
+
+class Timer:
+    """Collect wall-clock samples (in seconds) and summarise them."""
+
+    def __init__(self):
+        self.samples = []
+
+    @contextlib.contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append(time.perf_counter() - start)
+
+    def percentile(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def summary(self):
+        return {
+            'count': len(self.samples),
+            'mean_ms': statistics.fmean(self.samples) * 1000 if self.samples else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+        }
@@ -0,0 +1,234 @@
+"""
+Response cache for the public tiffin catalog.
+
+Entries are keyed by the request's pincode, search term, proximity
+parameters, page and host, plus a version token for the pincode they show.
+Nothing is ever deleted on writes: saving or deleting a ``Tiffin`` or
+``TiffinOwner`` replaces the versions of the affected pincode and of the
+unscoped catalog once the transaction commits, so old entries simply stop
+being read and age out.
+
+Versions live in the ``SHARED_CACHE_ALIAS`` cache, so a write made in one
+process changes the keys every process reads. They are random tokens, as in
+``api.authentication``: two concurrent bumps cannot land on the same value,
+and an evicted version comes back as a new one, which only costs a rebuild.
+The entries themselves, and the locks guarding their rebuilds, stay in the
+default cache.
+
+To keep a version bump from turning into a stampede, only one request per
+key rebuilds the entry (guarded by ``cache.add``). The others serve the last
+good response for that key if there is one, or wait briefly for the rebuild.
+``get_or_build`` says which happened: a stale page predates the key, so it
+must not go out under the key's ``ETag``.
+
+``aget_or_build`` is the same for async views. It calls the default cache
+directly, which only keeps the event loop free when that cache lives in this
+process (``IN_PROCESS``). Reading the version in ``make_key`` is a small
+blocking read of the shared cache (a file, or a Redis round trip) that async
+views make on the loop too.
+"""
+import asyncio
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from users.models import TiffinOwner
+
+ALL_PINCODES = '*'
+
+# Fallback lifetime of a cached page when no write bumps its version.
+TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+# How long a rebuild may hold its lock, and so how long waiters wait.
+LOCK_TIMEOUT = getattr(settings, 'CATALOG_CACHE_LOCK_TIMEOUT', 5)
+POLL_INTERVAL = 0.05
+VERSION_CACHE = getattr(settings, 'SHARED_CACHE_ALIAS', 'default')
+
+IN_PROCESS = settings.CACHES['default']['BACKEND'] in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _version_key(pincode):
+    return f'catalog:version:{pincode}'
+
+
+def get_version(pincode):
+    versions = caches[VERSION_CACHE]
+    key = _version_key(pincode)
+    version = versions.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not versions.add(key, version, timeout=None):
+            version = versions.get(key, version)
+    return version
+
+
+def bump_version(pincode):
+    caches[VERSION_CACHE].set(_version_key(pincode), uuid.uuid4().hex, timeout=None)
+
+
+def invalidate(*pincodes):
+    """Bump the given pincodes and the unscoped catalog after commit."""
+    scopes = {ALL_PINCODES, *(p for p in pincodes if p)}
+
+    def bump():
+        for scope in scopes:
+            bump_version(scope)
+
+    transaction.on_commit(bump)
+
+
+def is_cacheable(request):
+    user = request.user
+    return not (user.is_authenticated and user.user_type == 'owner')
+
+
+def make_key(request, action, pk=None):
+    """
+    Build the cache key for a catalog request. Lists are scoped to their
+    pincode; detail pages and unfiltered lists use the unscoped version.
+    The keys are kept on the request, which asks for them twice (for its
+    ETag and for the page) and should only read the version once.
+    """
+    memo = request.__dict__.setdefault('_catalog_keys', {})
+    if (action, pk) in memo:
+        return memo[action, pk]
+    params = request.query_params
+    pincode = (params.get('pincode') or ALL_PINCODES) if action == 'list' else ALL_PINCODES
+    parts = [
+        action,
+        str(pk or ''),
+        params.get('search', ''),
+        params.get('near', ''),
+        params.get('radius_km', ''),
+        params.get('page', '1'),
+        request.get_host(),
+    ]
+    digest = hashlib.sha1('\x1f'.join(parts).encode()).hexdigest()
+    memo[action, pk] = f'catalog:{pincode}:{get_version(pincode)}:{digest}', f'catalog:stale:{pincode}:{digest}'
+    return memo[action, pk]
+
+
+def get_or_build(key, stale_key, build):
+    """Return ``(data, fresh)``; ``fresh`` is False for the previous version's page."""
+    data = cache.get(key)
+    if data is not None:
+        return data, True
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        try:
+            data = build()
+            cache.set_many({key: data, stale_key: data}, timeout=TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return data, True
+
+    # Someone else is rebuilding this page. Serve the previous version if we
+    # have it, otherwise wait for the rebuild rather than hitting the DB too.
+    stale = cache.get(stale_key)
+    if stale is not None:
+        return stale, False
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        data = cache.get(key)
+        if data is not None:
+            return data, True
+        if cache.get(lock_key) is None:
+            break
+    return build(), True
+
+
+async def aget_or_build(key, stale_key, build):
+    """``get_or_build`` with a coroutine function as ``build``."""
+    data = cache.get(key)
+    if data is not None:
+        return data, True
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        try:
+            data = await build()
+            cache.set_many({key: data, stale_key: data}, timeout=TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return data, True
+
+    stale = cache.get(stale_key)
+    if stale is not None:
+        return stale, False
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        data = cache.get(key)
+        if data is not None:
+            return data, True
+        if cache.get(lock_key) is None:
+            break
+    return await build(), True
+
+
+class CatalogCacheMixin:
+    """
+    Serve ``list`` and ``retrieve`` from the cache for cacheable requests. A
+    stale page sets ``serving_stale`` so that ``ConditionalGetMixin`` sends
+    it without validators.
+    """
+    serving_stale = False
+
+    def list(self, request, *args, **kwargs):
+        if not is_cacheable(request):
+            return super().list(request, *args, **kwargs)
+        key, stale_key = make_key(request, 'list')
+        data, fresh = get_or_build(
+            key, stale_key, lambda: super(CatalogCacheMixin, self).list(request, *args, **kwargs).data
+        )
+        self.serving_stale = not fresh
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not is_cacheable(request):
+            return super().retrieve(request, *args, **kwargs)
+        key, stale_key = make_key(request, 'retrieve', pk=kwargs.get('pk'))
+        data, fresh = get_or_build(
+            key, stale_key, lambda: super(CatalogCacheMixin, self).retrieve(request, *args, **kwargs).data
+        )
+        self.serving_stale = not fresh
+        return Response(data)
+
+
+def tiffin_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if sender.owner.is_cached(instance):
+        pincode = instance.owner.business_pincode
+    else:
+        pincode = (
+            TiffinOwner.objects.filter(pk=instance.owner_id)
+            .values_list('business_pincode', flat=True)
+            .first()
+        )
+    invalidate(pincode)
+
+
+def owner_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._previous_pincode = (
+        TiffinOwner.objects.filter(pk=instance.pk)
+        .values_list('business_pincode', flat=True)
+        .first()
+    )
+
+
+def owner_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    invalidate(instance.business_pincode, getattr(instance, '_previous_pincode', None))
@@ -0,0 +1,221 @@
+"""
+Conditional GETs (ETag / Last-Modified) for list and detail actions.
+
+``ConditionalGetMixin`` works out a response's validators before the view
+builds anything, from queries the view would run anyway. A detail loads its
+object (which ``get_object`` then reuses) and takes its ``updated_at`` and
+those of the related rows named in ``etag_related`` that the serializer
+nests. A list runs one aggregate over the rows it would return,
+``MAX(updated_at)`` and ``COUNT(*)`` plus the related ``MAX(updated_at)``, and
+the page-number paginator uses that count instead of its own. The ETag
+hashes those with the user, the full URL and the negotiated media type. A
+request whose ``If-None-Match`` matches gets a ``304`` straight away; every
+other response carries the ``ETag`` and ``Last-Modified`` headers.
+
+Cursor pages (``?pagination=cursor``) are not validated: they seek one page
+of rows on an index, and an aggregate over every matching row would undo
+that.
+
+Deleting a row does not move the newest ``updated_at``, so list responses
+revalidate only on the ETag, which includes the count. Details also honour
+``If-Modified-Since``. Values denormalised from rows without an
+``updated_at`` (usernames, business names) do not change the validators.
+Viewsets that know a cheaper version of their data can override
+``get_validators``.
+
+Each check is counted per ``View.action`` and outcome: ``hit`` for 304s,
+``miss`` for changed data and ``unconditional`` for requests without
+validators. Counts gather in memory and are added to the ``ConditionalCount``
+rows every ``CONDITIONAL_STATS_FLUSH_SECONDS`` by the next sync request (and
+when the process exits), so the totals cover every process.
+``manage.py conditional_stats`` prints the hit rates.
+"""
+import asyncio
+import atexit
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import ConditionalCount
+
+logger = logging.getLogger(__name__)
+
+OUTCOMES = ('hit', 'miss', 'unconditional')
+FLUSH_SECONDS = getattr(settings, 'CONDITIONAL_STATS_FLUSH_SECONDS', 60)
+
+_lock = threading.Lock()
+# (view action, outcome) -> checks not yet added to the database
+_pending = Counter()
+_flushed_at = time.monotonic()
+
+
+def count(name, outcome):
+    with _lock:
+        _pending[(name, outcome)] += 1
+    if time.monotonic() - _flushed_at >= FLUSH_SECONDS and not _on_event_loop():
+        flush_counts()
+
+
+def _on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def flush_counts():
+    """Add the counts gathered in this process to the database."""
+    global _flushed_at
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _flushed_at = time.monotonic()
+    if not pending:
+        return
+    table = connection.ops.quote_name(ConditionalCount._meta.db_table)
+    key = ', '.join(map(connection.ops.quote_name, ('view', 'outcome')))
+    column = connection.ops.quote_name('count')
+    placeholders = ', '.join(['(%s, %s, %s)'] * len(pending))
+    params = [value for (name, outcome), n in pending.items() for value in (name, outcome, n)]
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({key}, {column}) VALUES {placeholders} '
+                f'ON CONFLICT ({key}) DO UPDATE SET {column} = {table}.{column} + excluded.{column}',
+                params,
+            )
+    except DatabaseError:
+        logger.exception('Could not store conditional GET counts; retrying on the next flush')
+        with _lock:
+            _pending.update(pending)
+
+
+atexit.register(flush_counts)
+
+
+def get_counts(name):
+    stored = dict(ConditionalCount.objects.filter(view=name).values_list('outcome', 'count'))
+    return {outcome: stored.get(outcome, 0) for outcome in OUTCOMES}
+
+
+def reset_counts(name):
+    ConditionalCount.objects.filter(view=name).delete()
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.sha1('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+class ConditionalGetMixin:
+    conditional_actions = ('list', 'retrieve')
+    # Related updated_at columns the serializer reads, e.g. 'order__updated_at'.
+    etag_related = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs))
+
+    def get_validators(self):
+        """
+        Return ``(etag parts, last modified datetime or None)`` for the current
+        action, or ``None`` when there is nothing to validate.
+        """
+        if self.action == 'retrieve':
+            # Load the object the response is built from and keep it for
+            # get_object(); a missing one is reported as usual.
+            self._validated_object = instance = self.get_object()
+            stamps = [instance.updated_at] + [_follow(instance, field) for field in self.etag_related]
+            return [stamps[0], 1, *stamps[1:]], max(filter(None, stamps), default=None)
+        wants_keyset = getattr(self.paginator, 'wants_keyset', None)
+        if wants_keyset is not None and wants_keyset(self.request):
+            return None
+        aggregates = {'last': Max('updated_at'), 'rows': Count('pk')}
+        for i, field in enumerate(self.etag_related):
+            aggregates[f'related_{i}'] = Max(field)
+        values = self.filter_queryset(self.get_queryset()).order_by().aggregate(**aggregates)
+        # The page-number paginator takes its count from here (see api.pagination).
+        self.validated_count = values['rows']
+        stamps = [value for key, value in values.items() if key != 'rows' and value is not None]
+        return list(values.values()), max(stamps, default=None)
+
+    def get_object(self):
+        instance = getattr(self, '_validated_object', None)
+        return instance if instance is not None else super().get_object()
+
+    def conditional(self, request, build):
+        name = f'{type(self).__name__}.{self.action}'
+        validators = self.get_validators() if self.action in self.conditional_actions else None
+        if validators is None:
+            return build()
+
+        parts, last_modified = validators
+        etag = request_etag(name, request, parts)
+        timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+        # Lists ignore If-Modified-Since: a deletion leaves the newest
+        # updated_at where it was.
+        response = check(name, request, etag, timestamp if self.action == 'retrieve' else None)
+        if response is None:
+            response = build()
+            # A view that could only build an older version of the data
+            # (see api.catalog_cache) must not label it with these validators.
+            if response.status_code != 200 or getattr(self, 'serving_stale', False):
+                return response
+        return set_validators(response, etag, timestamp)
+
+
+def _follow(instance, path):
+    for name in path.split('__'):
+        if instance is None:
+            return None
+        instance = getattr(instance, name)
+    return instance
+
+
+def request_etag(name, request, parts):
+    """The ETag of ``name``'s response to this (DRF) request, given its validator ``parts``."""
+    user = request.user
+    return make_etag(name, user.pk if user.is_authenticated else '', request.get_host(),
+                     request.get_full_path(), request.accepted_media_type, *parts)
+
+
+def check(name, request, etag, last_modified=None):
+    """
+    Count the request under ``name`` and return the ``304`` (or, for a failed
+    ``If-Match``, ``412``) to send instead of the response, if any.
+    """
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        count(name, 'hit' if not_modified.status_code == 304 else 'miss')
+    else:
+        conditional_request = 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+        count(name, 'miss' if conditional_request else 'unconditional')
+    return not_modified
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+def conditional_views():
+    """Every viewset class that mixes in ``ConditionalGetMixin``."""
+    found, pending = [], list(ConditionalGetMixin.__subclasses__())
+    while pending:
+        cls = pending.pop()
+        found.append(cls)
+        pending.extend(cls.__subclasses__())
+    return sorted(found, key=lambda cls: cls.__name__)
@@ -0,0 +1,165 @@
+"""
+Database connection tuning and read-replica routing.
+
+``configure_sqlite`` runs ``settings.SQLITE_PRAGMAS`` on every new SQLite
+connection: WAL journaling so readers and the writer stop blocking each
+other, plus cache, mmap and busy-timeout tuning. Replica connections are
+also put in ``query_only`` mode.
+
+Viewsets using ``ReplicaReadMixin`` run the actions in ``replica_actions``
+against a randomly picked alias from ``settings.DATABASE_REPLICAS``;
+everything else, and every write, uses ``default``. A user who has just
+written is pinned to ``default`` for ``DATABASE_REPLICA_STICKY_SECONDS`` so
+they read their own writes while the replicas catch up. The pin is set by
+``read_your_writes_middleware`` after any unsafe request. It lives in the
+Django cache, so it holds across processes when that cache is shared.
+
+``lock_rows`` locks rows for the rest of a transaction before they are
+read, so the writes that follow are decided from values no other
+connection can change first.
+
+Locally, set ``HOMEEATS_SQLITE_REPLICAS`` to a comma-separated list of
+files and keep them current with ``manage.py sync_sqlite_replicas``.
+"""
+import contextlib
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import F
+from django.utils.decorators import sync_and_async_middleware
+
+REPLICAS = tuple(getattr(settings, 'DATABASE_REPLICAS', ()))
+STICKY_SECONDS = getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 10)
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    if connection.alias in REPLICAS:
+        pragmas['query_only'] = 'ON'
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def choose_replica():
+    return random.choice(REPLICAS) if REPLICAS else None
+
+
+def _sticky_key(user_id):
+    return f'db:sticky:{user_id}'
+
+
+def pin_to_primary(user_id):
+    cache.set(_sticky_key(user_id), 1, timeout=STICKY_SECONDS)
+
+
+def is_pinned(user_id):
+    return cache.get(_sticky_key(user_id)) is not None
+
+
+def lock_rows(queryset):
+    """
+    Lock the rows of ``queryset`` until the current transaction ends and
+    return a queryset that reads them from the same database. Call it first
+    thing inside ``transaction.atomic()``.
+
+    SQLite has no ``SELECT ... FOR UPDATE``. There the rows are written back
+    unchanged instead, which takes the database's write lock the way ``BEGIN
+    IMMEDIATE`` would: other writers wait for this transaction, and its own
+    reads cannot go stale before it writes.
+    """
+    queryset = queryset.using(router.db_for_write(queryset.model))
+    features = connections[queryset.db].features
+    if features.has_select_for_update:
+        if features.has_select_for_update_of:
+            return queryset.select_for_update(of=('self',))
+        return queryset.select_for_update()
+    pk = queryset.model._meta.pk.attname
+    queryset.update(**{pk: F(pk)})
+    return queryset
+
+
+@contextlib.contextmanager
+def replica_reads():
+    """Send the reads made inside the block to a replica, if any are configured."""
+    token = _read_alias.set(choose_replica()) if REPLICAS else None
+    try:
+        yield
+    finally:
+        if token is not None:
+            _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """Send reads to the alias chosen for the current request, writes to default."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold copies of the same rows.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in REPLICAS:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """Serve ``replica_actions`` from a replica unless the user is pinned."""
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        user = request.user
+        if (
+            REPLICAS
+            and self.action in self.replica_actions
+            and request.method in SAFE_METHODS
+            and not (user.is_authenticated and is_pinned(user.pk))
+        ):
+            self._replica_token = _read_alias.set(choose_replica())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _read_alias.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def _after_write(request):
+    # DRF copies the user it authenticated onto the Django request.
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        pin_to_primary(user.pk)
+
+
+@sync_and_async_middleware
+def read_your_writes_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            response = await get_response(request)
+            if REPLICAS and request.method not in SAFE_METHODS:
+                await sync_to_async(_after_write)(request)
+            return response
+    else:
+        def middleware(request):
+            response = get_response(request)
+            if REPLICAS and request.method not in SAFE_METHODS:
+                _after_write(request)
+            return response
+    return middleware
@@ -0,0 +1,159 @@
+"""
+Automatic assignment of pending deliveries to available riders.
+
+Each matching round loads two sets of per-pincode queues: the unassigned,
+pending deliveries (oldest order first), and the riders with
+``is_available=True`` in that pincode, ordered by how many deliveries they
+already carry. Deliveries are handed out in that order, always to the
+least-loaded rider, until a rider reaches ``DISPATCH_MAX_ACTIVE_PER_RIDER``.
+
+A rider's load is counted from their accepted and picked up deliveries, so
+it includes deliveries they accepted by hand and drops as soon as one is
+delivered or cancelled. ``is_available`` is the rider's own on/off-duty
+switch; dispatch only reads it.
+
+Assignments are written in one transaction with the same conditional UPDATE
+that ``DeliveryViewSet.accept`` uses, so a rider who accepts a delivery by
+hand during a round simply wins it.
+
+The pending deliveries themselves are created by the ``create_deliveries``
+task, which ``OrderViewSet`` queues when orders become ready for delivery.
+"""
+import heapq
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from users.models import DeliveryBoy
+from . import events, tasks
+from .models import Delivery, Order
+
+ACTIVE_STATUSES = ('accepted', 'picked_up')
+# Orders that need a Delivery row.
+DELIVERABLE_STATUSES = ('ready_for_delivery', 'picked_up', 'delivered')
+MAX_ACTIVE_PER_RIDER = getattr(settings, 'DISPATCH_MAX_ACTIVE_PER_RIDER', 1)
+BATCH_SIZE = getattr(settings, 'DISPATCH_BATCH_SIZE', 500)
+
+
+@dataclass
+class Assignment:
+    delivery_id: int
+    order_id: int
+    rider_id: int
+    rider_user_id: int
+    customer_id: int
+    owner_user_id: int
+
+
+@dataclass
+class RoundResult:
+    pending: int = 0
+    riders: int = 0
+    assigned: list = field(default_factory=list)
+    lost: int = 0
+
+
+def load_queues(batch_size=BATCH_SIZE, max_active=MAX_ACTIVE_PER_RIDER):
+    """
+    Return ``(deliveries, riders)``: per-pincode deques of pending delivery
+    rows, oldest first, and per-pincode heaps of ``(load, rider_id, user_id)``.
+    Only pincodes with a free rider are loaded, so a backlog in one pincode
+    cannot crowd the others out of the batch.
+    """
+    riders = defaultdict(list)
+    rows = (
+        DeliveryBoy.objects.filter(is_available=True)
+        .annotate(load=Count('deliveries', filter=Q(deliveries__status__in=ACTIVE_STATUSES)))
+        .values_list('load', 'id', 'user_id', 'user__pincode')
+    )
+    for load, rider_id, user_id, pincode in rows:
+        if load < max_active:
+            riders[pincode].append((load, rider_id, user_id))
+    for heap in riders.values():
+        heapq.heapify(heap)
+
+    deliveries = defaultdict(deque)
+    if riders:
+        pending = (
+            Delivery.objects.filter(delivery_boy__isnull=True, status='pending',
+                                    order__delivery_pincode__in=list(riders))
+            .order_by('order__created_at', 'id')
+            .values('id', 'order_id', 'order__delivery_pincode', 'order__customer_id',
+                    'order__tiffin__owner__user_id')[:batch_size]
+        )
+        for row in pending:
+            deliveries[row['order__delivery_pincode']].append(row)
+    return deliveries, riders
+
+
+def match(deliveries, riders, max_active=MAX_ACTIVE_PER_RIDER):
+    """
+    Pair deliveries with riders in memory and return the assignments.
+    """
+    assignments = []
+    for pincode, queue in deliveries.items():
+        heap = riders.get(pincode)
+        while queue and heap:
+            load, rider_id, user_id = heapq.heappop(heap)
+            row = queue.popleft()
+            assignments.append(Assignment(
+                delivery_id=row['id'],
+                order_id=row['order_id'],
+                rider_id=rider_id,
+                rider_user_id=user_id,
+                customer_id=row['order__customer_id'],
+                owner_user_id=row['order__tiffin__owner__user_id'],
+            ))
+            if load + 1 < max_active:
+                heapq.heappush(heap, (load + 1, rider_id, user_id))
+    return assignments
+
+
+def run_round(batch_size=BATCH_SIZE, max_active=MAX_ACTIVE_PER_RIDER):
+    """Run one matching round and return what it did."""
+    deliveries, riders = load_queues(batch_size, max_active)
+    result = RoundResult(
+        pending=sum(len(queue) for queue in deliveries.values()),
+        riders=sum(len(heap) for heap in riders.values()),
+    )
+    assignments = match(deliveries, riders, max_active)
+    if not assignments:
+        return result
+
+    now = timezone.now()
+    with transaction.atomic():
+        for assignment in assignments:
+            claimed = Delivery.objects.filter(
+                pk=assignment.delivery_id, status='pending', delivery_boy__isnull=True
+            ).update(delivery_boy_id=assignment.rider_id, status='accepted', updated_at=now)
+            if claimed:
+                result.assigned.append(assignment)
+            else:
+                result.lost += 1
+
+        for assignment in result.assigned:
+            events.delivery_status_changed(
+                assignment.delivery_id, assignment.order_id, 'accepted', assignment.customer_id,
+                assignment.owner_user_id, assignment.rider_user_id
+            )
+    return result
+
+
+@tasks.task
+def create_deliveries(order_ids):
+    """Create the pending ``Delivery`` of every order in ``order_ids`` that needs one."""
+    rows = (
+        Order.objects.filter(id__in=order_ids, status__in=DELIVERABLE_STATUSES, delivery__isnull=True)
+        .values_list('id', 'delivery_address', 'tiffin__owner__business_address')
+    )
+    # A retry after a crash, or a second task for the same orders, skips
+    # the deliveries that already exist.
+    return len(Delivery.objects.bulk_create([
+        Delivery(order_id=order_id, pickup_address=pickup_address, delivery_address=delivery_address,
+                 status='pending', delivery_boy=None)
+        for order_id, delivery_address, pickup_address in rows
+    ], ignore_conflicts=True))
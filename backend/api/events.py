@@ -0,0 +1,194 @@
+"""
+Server-sent events for order and delivery status changes.
+
+Views publish status changes to per-user channels (``user:<id>``) on the
+broker named by ``settings.EVENTS_BROKER``. ``event_stream`` is an async view
+mounted at ``/api/events/`` that subscribes the authenticated user to their
+channel and streams each message as an SSE event, with a comment line every
+``EVENTS_HEARTBEAT_SECONDS`` so idle connections stay open through proxies.
+
+``InProcessBroker`` keeps subscriptions in memory, so it only reaches clients
+connected to the same process. Any object with the same ``subscribe`` /
+``publish`` interface (for example one backed by Redis pub/sub) can replace it
+through the setting. The stream needs an ASGI server; under WSGI every open
+stream holds a worker thread.
+"""
+import asyncio
+import collections
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .authentication import CachedJWTAuthentication
+
+HEARTBEAT_SECONDS = getattr(settings, 'EVENTS_HEARTBEAT_SECONDS', 15)
+# Messages buffered per subscriber before the oldest ones are dropped.
+QUEUE_SIZE = getattr(settings, 'EVENTS_QUEUE_SIZE', 100)
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """
+    One subscriber's queue. It lives on the event loop that created it and
+    is safe to deliver to from any thread.
+    """
+
+    def __init__(self, broker, channels, maxsize=QUEUE_SIZE):
+        self.broker = broker
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def deliver(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The subscriber's loop has shut down; it will unsubscribe itself.
+            pass
+
+    def _put(self, message):
+        if self.queue.full():
+            # A slow client loses its oldest updates rather than stalling
+            # publishers or growing without bound.
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """Return the next message, or ``None`` if ``timeout`` passes first."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = collections.defaultdict(set)
+
+    def subscribe(self, channels):
+        """Subscribe to ``channels``; must be called from a running event loop."""
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+        return len(subscribers)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({s for subscribers in self._subscribers.values() for s in subscribers})
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'EVENTS_BROKER', 'api.events.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish(user_ids, message):
+    """Send ``message`` to every user in ``user_ids`` once the transaction commits."""
+    recipients = {user_id for user_id in user_ids if user_id is not None}
+
+    def send():
+        broker = get_broker()
+        for user_id in recipients:
+            broker.publish(user_channel(user_id), message)
+
+    transaction.on_commit(send)
+
+
+def order_status_changed(order_id, status, customer_id, owner_user_id, rider_user_id=None):
+    publish(
+        [customer_id, owner_user_id, rider_user_id],
+        {'type': 'order.status', 'order': order_id, 'status': status},
+    )
+
+
+def delivery_status_changed(delivery_id, order_id, status, customer_id, owner_user_id, rider_user_id=None):
+    publish(
+        [customer_id, owner_user_id, rider_user_id],
+        {'type': 'delivery.status', 'delivery': delivery_id, 'order': order_id, 'status': status},
+    )
+
+
+def format_event(message):
+    return f'event: {message["type"]}\ndata: {json.dumps(message, separators=(",", ":"))}\n\n'
+
+
+def _authenticate(request):
+    """
+    Resolve the user from the usual ``Authorization: Bearer`` header, or from
+    ``?token=`` because browsers' EventSource cannot send headers.
+    """
+    auth = CachedJWTAuthentication()
+    try:
+        raw_token = request.GET.get('token')
+        if raw_token:
+            return auth.get_user(auth.get_validated_token(raw_token))
+        result = auth.authenticate(request)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+    return result[0] if result else None
+
+
+async def event_stream(request):
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    async def stream():
+        subscription = get_broker().subscribe([user_channel(user.pk)])
+        try:
+            yield f'retry: 5000\n: connected as {user.pk}\n\n'
+            while True:
+                message = await subscription.get(timeout=HEARTBEAT_SECONDS)
+                if message is None:
+                    yield ': keepalive\n\n'
+                else:
+                    yield format_event(message)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
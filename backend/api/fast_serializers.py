@@ -0,0 +1,250 @@
+"""
+Read-only serialization straight from ``.values()`` rows.
+
+A ``ModelSerializer`` list builds a model instance per row, then walks every
+field through ``get_attribute`` and ``to_representation``. For list
+endpoints that is most of the CPU time. A ``FastSerializer`` compiles its
+DRF ``serializer_class`` once into a plan of ``(key, values path, convert)``
+steps and then builds each item with plain dict lookups. Plain strings,
+numbers, booleans and primary keys are copied as they are. Datetimes are
+converted to the active timezone once per call rather than once per field,
+and decimals still go through the DRF field, so the rendered output is
+byte-identical to the ``ModelSerializer``. That includes keys DRF omits when
+a nullable relation on a dotted ``source`` is empty.
+
+``SerializerMethodField``s are computed by ``get_<field>(row)`` on the
+``FastSerializer``, which lists the values paths it reads in
+``method_values``. ``FastListMixin`` switches a viewset's ``list`` action
+to this path unless ``FAST_READ_SERIALIZERS`` is off.
+"""
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from . import images
+from .profiling import timed
+from .serializers import DeliverySerializer, OrderSerializer, TiffinSerializer, UserSerializer
+
+ENABLED = getattr(settings, 'FAST_READ_SERIALIZERS', True)
+
+# Field types whose to_representation returns the database value unchanged.
+PASSTHROUGH = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.ChoiceField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+def _passthrough(value):
+    return value
+
+
+def _is_plain_datetime(field):
+    """True for DateTimeFields rendering aware ISO 8601 in the active timezone."""
+    return (
+        type(field) is serializers.DateTimeField
+        and getattr(field, 'format', api_settings.DATETIME_FORMAT).lower() == ISO_8601
+        and not hasattr(field, 'timezone')
+        and settings.USE_TZ
+    )
+
+
+def _datetime(value, tz):
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, tz)
+    value = value.astimezone(tz).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+class FastSerializer:
+    serializer_class = None
+    # method field name -> values paths its get_<name>(row) reads
+    method_values = {}
+
+    _plans = {}
+
+    def __init__(self, context=None):
+        self.context = context or {}
+        self.steps, self.paths = self.get_plan()
+
+    @classmethod
+    def get_plan(cls):
+        plan = cls._plans.get(cls)
+        if plan is None:
+            plan = cls._plans[cls] = cls.compile()
+        return plan
+
+    @classmethod
+    def compile(cls):
+        paths = []
+        steps = cls._compile(cls.serializer_class(), '', cls.serializer_class.Meta.model, paths)
+        return steps, tuple(dict.fromkeys(paths))
+
+    @classmethod
+    def _compile(cls, serializer, prefix, model, paths):
+        steps = []
+        for field in serializer._readable_fields:
+            key = field.field_name
+            if isinstance(field, serializers.SerializerMethodField):
+                if prefix:
+                    raise ImproperlyConfigured(f'{cls.__name__} cannot compile nested method field {key!r}.')
+                paths.extend(cls.method_values.get(key, ()))
+                steps.append(('method', key, getattr(cls, f'get_{key}'), None, ()))
+                continue
+
+            source_attrs = field.source_attrs
+            path = prefix + '__'.join(source_attrs)
+            guards, target = cls._resolve(model, source_attrs, prefix)
+            paths.extend(guards)
+
+            if isinstance(field, serializers.BaseSerializer):
+                related = target.related_model
+                pk_path = f'{path}__{related._meta.pk.name}'
+                paths.append(pk_path)
+                nested = cls._compile(field, f'{path}__', related, paths)
+                steps.append(('nested', key, nested, pk_path, guards))
+                continue
+
+            paths.append(path)
+            if isinstance(field, serializers.FileField):
+                steps.append(('file', key, cls._file_converter(field, target), path, guards))
+            elif _is_plain_datetime(field):
+                steps.append(('datetime', key, _datetime, path, guards))
+            else:
+                convert = _passthrough if isinstance(field, PASSTHROUGH) else field.to_representation
+                steps.append(('value', key, convert, path, guards))
+        return steps
+
+    @staticmethod
+    def _resolve(model, source_attrs, prefix):
+        """
+        Walk ``source_attrs`` through ``model``. Return the values paths of
+        nullable relations crossed on the way (DRF skips the key when one is
+        empty) and the final model field.
+        """
+        guards = []
+        field = None
+        for i, attr in enumerate(source_attrs):
+            try:
+                field = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                raise ImproperlyConfigured(f'Cannot compile source {".".join(source_attrs)!r} on {model.__name__}.')
+            if i < len(source_attrs) - 1:
+                if field.null:
+                    guards.append(prefix + '__'.join(source_attrs[:i + 1]))
+                model = field.related_model
+        return tuple(guards), field
+
+    @staticmethod
+    def _file_converter(field, model_field):
+        storage = model_field.storage
+
+        def convert(name, context):
+            if not name:
+                return None
+            if not getattr(field, 'use_url', True):
+                return name
+            url = storage.url(name)
+            request = context.get('request')
+            return request.build_absolute_uri(url) if request is not None else url
+
+        return convert
+
+    def values(self, queryset):
+        return queryset.values(*self.paths)
+
+    def to_representation(self, row):
+        with timed('serialize'):
+            self.timezone = timezone.get_current_timezone()
+            return self._build(self.steps, row)
+
+    def _build(self, steps, row):
+        item = {}
+        for kind, key, convert, path, guards in steps:
+            if kind == 'method':
+                item[key] = convert(self, row)
+                continue
+            if guards and any(row[guard] is None for guard in guards):
+                continue
+            value = row[path]
+            if value is None:
+                item[key] = None
+            elif kind == 'value':
+                item[key] = convert(value)
+            elif kind == 'datetime':
+                item[key] = convert(value, self.timezone)
+            elif kind == 'nested':
+                item[key] = self._build(convert, row)
+            else:
+                item[key] = convert(value, self.context)
+        return item
+
+    def serialize(self, rows):
+        with timed('serialize'):
+            self.timezone = timezone.get_current_timezone()
+            build, steps = self._build, self.steps
+            return [build(steps, row) for row in rows]
+
+
+class FastTiffinSerializer(FastSerializer):
+    serializer_class = TiffinSerializer
+    method_values = {'image_variants': ('image', 'image_variants')}
+
+    def get_image_variants(self, row):
+        return images.build_variant_urls(row['image'], row['image_variants'], self.context.get('request'))
+
+
+class FastOrderSerializer(FastSerializer):
+    serializer_class = OrderSerializer
+
+
+class FastDeliverySerializer(FastSerializer):
+    serializer_class = DeliverySerializer
+
+
+class FastUserSerializer(FastSerializer):
+    serializer_class = UserSerializer
+    method_values = {
+        'tiffin_owner': ('tiffin_owner__id', 'tiffin_owner__business_name', 'tiffin_owner__business_address',
+                         'tiffin_owner__business_pincode', 'tiffin_owner__is_verified'),
+        'delivery_boy': ('delivery_boy__id', 'delivery_boy__vehicle_number', 'delivery_boy__is_available'),
+    }
+
+    def get_tiffin_owner(self, row):
+        if row['tiffin_owner__id'] is None:
+            return None
+        return {
+            'business_name': row['tiffin_owner__business_name'],
+            'business_address': row['tiffin_owner__business_address'],
+            'business_pincode': row['tiffin_owner__business_pincode'],
+            'is_verified': row['tiffin_owner__is_verified'],
+        }
+
+    def get_delivery_boy(self, row):
+        if row['delivery_boy__id'] is None:
+            return None
+        return {
+            'vehicle_number': row['delivery_boy__vehicle_number'],
+            'is_available': row['delivery_boy__is_available'],
+        }
+
+
+class FastListMixin:
+    """Serve ``list`` from ``.values()`` rows through ``fast_serializer_class``."""
+    fast_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        if not ENABLED or self.fast_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+        reader = self.fast_serializer_class(context=self.get_serializer_context())
+        queryset = reader.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(reader.serialize(page))
+        return Response(reader.serialize(queryset))
@@ -0,0 +1,167 @@
+"""
+Proximity search over kitchen locations.
+
+Every ``TiffinOwner`` has a ``latitude``/``longitude``. Owners who do not
+set one are placed at the centre of their ``business_pincode``, taken from
+the ``Pincode`` table. That table ships with ``api/data/pincodes.csv``, and
+``manage.py load_pincodes`` can import a fuller directory. Each location also
+gets a ``geo_cell``, the number of its square on a grid of
+``GEO_GRID_CELL_DEGREES``, numbered row by row. ``users_owner_geo_cell_idx``
+covers ``(geo_cell, latitude, longitude)``.
+
+A radius query lists the cells that overlap the circle and looks each one
+up in that index, so it never scans every owner and reads candidates'
+positions from the index alone. The exact cut-off and the ordering use an
+equirectangular distance, which is accurate to well under a percent at city
+scale. The grid does not wrap around the antimeridian.
+"""
+import csv
+import math
+import os
+
+from django.conf import settings
+from django.db.models import F, FloatField, Q, Value
+
+from users.models import TiffinOwner
+
+from .models import Pincode
+
+CELL_DEGREES = getattr(settings, 'GEO_GRID_CELL_DEGREES', 0.01)
+DEFAULT_RADIUS_KM = getattr(settings, 'GEO_DEFAULT_RADIUS_KM', 5)
+MAX_RADIUS_KM = getattr(settings, 'GEO_MAX_RADIUS_KM', 25)
+
+KM_PER_DEGREE = 6371.0088 * math.pi / 180
+COLUMNS = math.ceil(360 / CELL_DEGREES)
+BUNDLED_PINCODES = os.path.join(os.path.dirname(__file__), 'data', 'pincodes.csv')
+
+
+def _row(latitude):
+    return math.floor((latitude + 90) / CELL_DEGREES)
+
+
+def _column(longitude):
+    return math.floor((longitude + 180) / CELL_DEGREES)
+
+
+def cell_for(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    return _row(latitude) * COLUMNS + _column(longitude)
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    dx = (lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    return KM_PER_DEGREE * math.hypot(lat2 - lat1, dx)
+
+
+def cells_within(latitude, longitude, radius_km):
+    """Numbers of the grid cells that overlap the circle."""
+    dlat = radius_km / KM_PER_DEGREE
+    scale = max(math.cos(math.radians(latitude)), 1e-6)
+    dlng = dlat / scale
+    cells = []
+    for row in range(_row(latitude - dlat), _row(latitude + dlat) + 1):
+        bottom = row * CELL_DEGREES - 90
+        dy = max(bottom - latitude, 0, latitude - bottom - CELL_DEGREES)
+        for column in range(_column(longitude - dlng), _column(longitude + dlng) + 1):
+            left = column * CELL_DEGREES - 180
+            dx = max(left - longitude, 0, longitude - left - CELL_DEGREES) * scale
+            if dy * dy + dx * dx <= dlat * dlat:
+                cells.append(row * COLUMNS + column)
+    return cells
+
+
+def locate(pincode):
+    """``(latitude, longitude)`` of a pincode's centre, or ``None``."""
+    return Pincode.objects.filter(code=pincode).values_list('latitude', 'longitude').first()
+
+
+def place(owner):
+    """Default an owner's location to their pincode and refresh ``geo_cell``."""
+    if owner.latitude is None or owner.longitude is None:
+        owner.latitude, owner.longitude = locate(owner.business_pincode) or (None, None)
+    owner.geo_cell = cell_for(owner.latitude, owner.longitude)
+
+
+def near(queryset, latitude, longitude, radius_km, prefix='owner__'):
+    """
+    Restrict ``queryset`` to rows whose owner lies within ``radius_km`` and
+    order them nearest first. ``prefix`` leads from the queryset's model to
+    ``TiffinOwner``.
+    """
+    in_cells = Q(**{f'{prefix}geo_cell__in': cells_within(latitude, longitude, radius_km)})
+    scale = math.cos(math.radians(latitude))
+    dy = F(f'{prefix}latitude') - Value(latitude)
+    dx = (F(f'{prefix}longitude') - Value(longitude)) * Value(scale)
+    limit = (radius_km / KM_PER_DEGREE) ** 2
+    return (
+        queryset.filter(in_cells)
+        .alias(geo_distance=dy * dy + dx * dx)
+        .filter(geo_distance__lte=Value(limit, output_field=FloatField()))
+        .order_by('geo_distance', 'pk')
+    )
+
+
+def read_pincodes(path):
+    """
+    Yield ``(code, name, latitude, longitude)`` from a CSV with ``pincode``,
+    ``latitude`` and ``longitude`` columns (``name`` is optional). Rows
+    without a usable position are skipped.
+    """
+    with open(path, newline='', encoding='utf-8') as handle:
+        for row in csv.DictReader(handle):
+            code = (row.get('pincode') or '').strip()
+            try:
+                latitude, longitude = float(row['latitude']), float(row['longitude'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if len(code) == 6 and code.isdigit():
+                yield code, (row.get('name') or '').strip()[:100], latitude, longitude
+
+
+def load_pincodes(path=BUNDLED_PINCODES, model=Pincode, batch_size=1000):
+    """Insert or update the pincodes in ``path``; return how many were read."""
+    rows = {
+        code: model(code=code, name=name, latitude=latitude, longitude=longitude)
+        for code, name, latitude, longitude in read_pincodes(path)
+    }
+    model.objects.bulk_create(
+        rows.values(), batch_size=batch_size, update_conflicts=True,
+        unique_fields=['code'], update_fields=['name', 'latitude', 'longitude'],
+    )
+    return len(rows)
+
+
+def place_owners(pincode_model=Pincode, owner_model=TiffinOwner, batch_size=1000):
+    """
+    Place owners that have no location at their pincode's centre and
+    recompute every ``geo_cell``. Return the number of owners updated.
+    """
+    centres = {
+        code: (latitude, longitude)
+        for code, latitude, longitude in pincode_model.objects.values_list('code', 'latitude', 'longitude')
+    }
+    changed = []
+    for owner in owner_model.objects.only('id', 'business_pincode', 'latitude', 'longitude', 'geo_cell'):
+        before = (owner.latitude, owner.longitude, owner.geo_cell)
+        if owner.latitude is None or owner.longitude is None:
+            owner.latitude, owner.longitude = centres.get(owner.business_pincode, (None, None))
+        owner.geo_cell = cell_for(owner.latitude, owner.longitude)
+        if (owner.latitude, owner.longitude, owner.geo_cell) != before:
+            changed.append(owner)
+    owner_model.objects.bulk_update(changed, ['latitude', 'longitude', 'geo_cell'], batch_size=batch_size)
+    return len(changed)
+
+
+def owner_pre_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.pk is not None:
+        stored = (
+            TiffinOwner.objects.filter(pk=instance.pk)
+            .values_list('business_pincode', 'latitude', 'longitude').first()
+        )
+        if stored and stored[0] != instance.business_pincode and stored[1:] == (instance.latitude, instance.longitude):
+            # Moved to another pincode without giving a new position.
+            instance.latitude = instance.longitude = None
+    place(instance)
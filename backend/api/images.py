@@ -0,0 +1,176 @@
+"""
+Resized variants of tiffin photos.
+
+Owners upload full-size phone photos; list views should not ship those. When
+a tiffin is saved with a new image, ``tiffin_saved`` queues
+``process_tiffin_image`` on a small thread pool once the transaction commits.
+The job writes a JPEG and a WebP file for every size in ``VARIANTS``, with
+EXIF orientation applied and all metadata stripped, and records their paths
+in ``Tiffin.image_variants``. ``variant_urls`` is what the serializer exposes;
+until the variants exist it points every size at the original upload.
+"""
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import catalog_cache
+from .models import Tiffin
+
+logger = logging.getLogger(__name__)
+
+# name -> bounding box; images are shrunk to fit, never enlarged.
+VARIANTS = {
+    'thumb': (200, 200),
+    'card': (640, 480),
+}
+FORMATS = {
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+}
+VARIANT_DIR = 'tiffins/variants'
+
+WORKERS = getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='tiffin-images')
+    return _executor
+
+
+def render_variants(source):
+    """
+    Return ``{variant: {format: bytes}}`` for an open image file. Only pixel
+    data is written back out, so EXIF, GPS and ICC metadata are dropped.
+    """
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGBA') if 'A' in image.getbands() else image.convert('RGB')
+            if image.mode == 'RGBA':
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+
+        rendered = {}
+        for name, box in VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail(box, Image.Resampling.LANCZOS)
+            rendered[name] = {}
+            for fmt, options in FORMATS.items():
+                buffer = io.BytesIO()
+                resized.save(buffer, **options)
+                rendered[name][fmt] = buffer.getvalue()
+        return rendered
+
+
+def process_tiffin_image(tiffin_id):
+    """Build and store the variants for a tiffin's current image."""
+    close_old_connections()
+    try:
+        tiffin = Tiffin.objects.select_related('owner').filter(pk=tiffin_id).first()
+        if tiffin is None or not tiffin.image:
+            return None
+        source_name = tiffin.image.name
+        previous = tiffin.image_variants or {}
+
+        with tiffin.image.open('rb') as source:
+            rendered = render_variants(source)
+
+        stem = posixpath.splitext(posixpath.basename(source_name))[0]
+        variants = {'source': source_name}
+        for name, files in rendered.items():
+            variants[name] = {}
+            for fmt, data in files.items():
+                path = f'{VARIANT_DIR}/{tiffin_id}/{stem}-{name}.{"jpg" if fmt == "jpeg" else fmt}'
+                if default_storage.exists(path):
+                    default_storage.delete(path)
+                variants[name][fmt] = default_storage.save(path, ContentFile(data))
+
+        # Only record the variants if the image was not replaced meanwhile.
+        updated = Tiffin.objects.filter(pk=tiffin_id, image=source_name).update(
+            image_variants=variants, updated_at=timezone.now(),
+        )
+        if not updated:
+            remove_variants(variants)
+            return None
+        remove_variants(previous, keep=variants)
+        catalog_cache.invalidate(tiffin.owner.business_pincode)
+        return variants
+    except Exception:
+        logger.exception('Failed to build image variants for tiffin %s', tiffin_id)
+        return None
+    finally:
+        close_old_connections()
+
+
+def variant_paths(variants):
+    return {path for name in VARIANTS for path in variants.get(name, {}).values()}
+
+
+def remove_variants(variants, keep=None):
+    """Delete the files in ``variants`` that ``keep`` does not also use."""
+    for path in variant_paths(variants or {}) - variant_paths(keep or {}):
+        try:
+            default_storage.delete(path)
+        except OSError:
+            logger.warning('Could not delete image variant %s', path)
+
+
+def needs_processing(tiffin):
+    return bool(tiffin.image) and (tiffin.image_variants or {}).get('source') != tiffin.image.name
+
+
+def variant_urls(tiffin, request=None):
+    """
+    Map every variant name to ``{format: url}``, plus ``status``. While the
+    variants are still being built every entry points at the original.
+    """
+    return build_variant_urls(tiffin.image.name if tiffin.image else None, tiffin.image_variants, request)
+
+
+def build_variant_urls(image_name, variants, request=None):
+    """``variant_urls`` for an image name and variants dict read with ``.values()``."""
+    if not image_name:
+        return None
+
+    def absolute(url):
+        return request.build_absolute_uri(url) if request is not None else url
+
+    variants = variants or {}
+    if variants.get('source') == image_name:
+        urls = {
+            name: {fmt: absolute(default_storage.url(path)) for fmt, path in variants[name].items()}
+            for name in VARIANTS if name in variants
+        }
+        urls['status'] = 'ready'
+        return urls
+
+    original = absolute(Tiffin._meta.get_field('image').storage.url(image_name))
+    urls = {name: {fmt: original for fmt in FORMATS} for name in VARIANTS}
+    urls['status'] = 'pending'
+    return urls
+
+
+def tiffin_saved(sender, instance, raw=False, **kwargs):
+    if raw or not needs_processing(instance):
+        return
+    tiffin_id = instance.pk
+    transaction.on_commit(lambda: get_executor().submit(process_tiffin_image, tiffin_id))
+
+
+def tiffin_deleted(sender, instance, **kwargs):
+    variants = instance.image_variants
+    if variants:
+        transaction.on_commit(lambda: remove_variants(variants))
@@ -0,0 +1,154 @@
+"""
+Rider positions, kept in memory and written to the database in batches.
+
+Riders report their position every few seconds. Writing each ping to
+``DeliveryBoy`` would mean one ``UPDATE`` (and one SQLite write lock) per
+ping. Instead ``record`` keeps only the newest unwritten position per rider
+in this process. Every ``RIDER_LOCATION_FLUSH_SECONDS`` a background thread
+writes them all in one ``executemany``, or sooner once more than
+``RIDER_LOCATION_MAX_BUFFERED`` riders are waiting. A rider who pinged ten
+times since the last flush costs one row write.
+
+Reads try the store first and fall back to the columns on ``DeliveryBoy``.
+The store is per process, like the event broker, so a position leaves it as
+soon as it has been written: from then on reads go to the database, where
+another process may have stored a newer one. A read that lands on a process
+that did not receive the rider's pings sees the last flushed position, at
+most one flush interval old. The flush never moves a rider's stored position
+back in time, so processes cannot overwrite each other's newer positions.
+"""
+import atexit
+import logging
+import threading
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from users.models import DeliveryBoy
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SECONDS = getattr(settings, 'RIDER_LOCATION_FLUSH_SECONDS', 5)
+MAX_BATCH = getattr(settings, 'RIDER_LOCATION_MAX_BATCH', 100)
+MAX_BUFFERED = getattr(settings, 'RIDER_LOCATION_MAX_BUFFERED', 5000)
+
+
+class Position(NamedTuple):
+    latitude: float
+    longitude: float
+    recorded_at: object
+
+
+class LocationStore:
+    def __init__(self, flush_seconds=FLUSH_SECONDS, max_buffered=MAX_BUFFERED):
+        self.flush_seconds = flush_seconds
+        self.max_buffered = max_buffered
+        self.lock = threading.Lock()
+        # rider id -> newest position not yet written
+        self.positions = {}
+        self.wake = threading.Event()
+        self.flusher = None
+
+    def record(self, rider_id, pings):
+        """
+        Keep the newest of ``pings`` (``Position``s) for ``rider_id`` if it is
+        newer than what the store holds. Return True if the position changed.
+        """
+        newest = max(pings, key=lambda ping: ping.recorded_at)
+        with self.lock:
+            current = self.positions.get(rider_id)
+            if current is not None and current.recorded_at >= newest.recorded_at:
+                return False
+            self.positions[rider_id] = newest
+            if len(self.positions) > self.max_buffered:
+                self.wake.set()
+            if self.flusher is None:
+                self.flusher = threading.Thread(target=self.run, name='rider-location-flush', daemon=True)
+                self.flusher.start()
+        return True
+
+    def get(self, rider_id):
+        with self.lock:
+            return self.positions.get(rider_id)
+
+    def flush(self):
+        """Write every buffered rider's position; return how many rows were sent."""
+        with self.lock:
+            batch = list(self.positions.items())
+        if not batch:
+            return 0
+        try:
+            _write(batch)
+        except DatabaseError:
+            logger.exception('Could not write %d rider positions; retrying on the next flush', len(batch))
+            return 0
+        with self.lock:
+            for rider_id, position in batch:
+                # Keep positions that arrived while the batch was written.
+                if self.positions.get(rider_id) is position:
+                    del self.positions[rider_id]
+        return len(batch)
+
+    def run(self):
+        while True:
+            self.wake.wait(self.flush_seconds)
+            self.wake.clear()
+            close_old_connections()
+            self.flush()
+
+    def clear(self):
+        with self.lock:
+            self.positions.clear()
+
+
+def _write(batch):
+    table = connection.ops.quote_name(DeliveryBoy._meta.db_table)
+    field = DeliveryBoy._meta.get_field('location_updated_at')
+    rows = []
+    for rider_id, position in batch:
+        recorded_at = field.get_db_prep_value(position.recorded_at, connection)
+        rows.append((position.latitude, position.longitude, recorded_at, rider_id, recorded_at))
+    # One transaction for the batch: SQLite would otherwise commit (and sync
+    # the WAL) after every row.
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {table} SET latitude = %s, longitude = %s, location_updated_at = %s '
+            f'WHERE id = %s AND (location_updated_at IS NULL OR location_updated_at < %s)',
+            rows,
+        )
+
+
+_store = LocationStore()
+atexit.register(_store.flush)
+
+
+def get_store():
+    return _store
+
+
+def record(rider_id, pings):
+    """
+    Accept ``pings`` (dicts with ``latitude``, ``longitude`` and an optional
+    ``recorded_at``) from a rider. Timestamps default to now and are capped
+    at now.
+    """
+    now = timezone.now()
+    positions = [
+        Position(ping['latitude'], ping['longitude'], min(ping.get('recorded_at') or now, now))
+        for ping in pings
+    ]
+    return _store.record(rider_id, positions)
+
+
+def current_position(rider_id):
+    """The rider's latest known ``Position``, or ``None``."""
+    position = _store.get(rider_id)
+    if position is not None:
+        return position
+    row = (
+        DeliveryBoy.objects.filter(pk=rider_id, location_updated_at__isnull=False)
+        .values_list('latitude', 'longitude', 'location_updated_at').first()
+    )
+    return Position(*row) if row else None
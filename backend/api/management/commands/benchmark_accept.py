@@ -0,0 +1,116 @@
+import logging
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from rest_framework.test import APIClient
+
+from api.bench import temporary_database, seed
+from api.models import Order, Delivery
+
+
+class Command(BaseCommand):
+    help = (
+        'Have many riders accept the same batch of deliveries concurrently, '
+        'measure claim throughput and check every delivery has exactly one winner.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deliveries', type=int, default=500)
+        parser.add_argument('--riders', type=int, default=32)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for accept order.')
+
+    def handle(self, *args, **options):
+        # Losing riders get 409s by the thousand; don't log each one.
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        with tempfile.TemporaryDirectory() as tmp:
+            with temporary_database(name=Path(tmp) / 'accept.sqlite3'):
+                delivery_ids, riders = self.prepare(options['deliveries'], options['riders'])
+                attempts, elapsed = self.storm(delivery_ids, riders, options['seed'])
+                problems = self.verify(delivery_ids, attempts)
+
+        outcomes = Counter(code for _, _, code in attempts)
+        wins = outcomes.get(200, 0)
+        self.stdout.write(f'{len(riders)} riders, {len(delivery_ids)} deliveries, {len(attempts)} attempts')
+        self.stdout.write(f'Elapsed: {elapsed:.2f} s')
+        self.stdout.write(f'Attempts/s: {len(attempts) / elapsed:.0f}')
+        self.stdout.write(f'Claims/s: {wins / elapsed:.0f}')
+        self.stdout.write('Responses: ' + ', '.join(f'{code}={n}' for code, n in sorted(outcomes.items())))
+
+        if problems:
+            raise CommandError('\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS('Every delivery was claimed by exactly one rider.'))
+
+    def prepare(self, deliveries, riders):
+        data = seed(owners=4, tiffins_per_owner=2, customers=20, riders=riders,
+                    orders=deliveries, deliveries=False, pincodes=['400001'])
+        Order.objects.update(status='ready_for_delivery')
+        Delivery.objects.bulk_create([
+            Delivery(order=order, pickup_address=order.tiffin.owner.business_address,
+                     delivery_address=order.delivery_address, status='pending')
+            for order in Order.objects.select_related('tiffin__owner')
+        ])
+        return list(Delivery.objects.values_list('id', flat=True)), data.riders
+
+    def storm(self, delivery_ids, riders, seed_value):
+        attempts = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(riders))
+
+        def ride(rider, order):
+            client = APIClient()
+            client.force_authenticate(user=rider.user)
+            results = []
+            barrier.wait()
+            try:
+                for delivery_id in order:
+                    try:
+                        response = client.post(f'/api/deliveries/{delivery_id}/accept/')
+                        code = response.status_code
+                    except Exception:
+                        code = 500
+                    results.append((delivery_id, rider.id, code))
+            finally:
+                connections.close_all()
+            with lock:
+                attempts.extend(results)
+
+        rng = random.Random(seed_value)
+        threads = []
+        for rider in riders:
+            order = list(delivery_ids)
+            rng.shuffle(order)
+            threads.append(threading.Thread(target=ride, args=(rider, order)))
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return attempts, time.perf_counter() - start
+
+    def verify(self, delivery_ids, attempts):
+        winners = defaultdict(list)
+        problems = []
+        for delivery_id, rider_id, code in attempts:
+            if code == 200:
+                winners[delivery_id].append(rider_id)
+            elif code != 409:
+                problems.append(f'Rider {rider_id} got {code} accepting delivery {delivery_id}')
+
+        assigned = dict(Delivery.objects.values_list('id', 'delivery_boy'))
+        for delivery_id in delivery_ids:
+            won = winners.get(delivery_id, [])
+            if len(won) != 1:
+                problems.append(f'Delivery {delivery_id} had {len(won)} winners: {won}')
+            elif assigned[delivery_id] != won[0]:
+                problems.append(
+                    f'Delivery {delivery_id} was won by rider {won[0]} '
+                    f'but is assigned to {assigned[delivery_id]}'
+                )
+        return problems
@@ -0,0 +1,207 @@
+import asyncio
+import io
+import random
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+import core.urls
+from api.bench import Timer, temporary_database, seed
+
+# mode -> (server, whether the catalog URLs go to the async views)
+MODES = {
+    'wsgi + sync views': ('wsgi', False),
+    'asgi + sync views': ('asgi', False),
+    'asgi + async views': ('asgi', True),
+}
+
+
+def urlconf(async_catalog):
+    """A ROOT_URLCONF with the catalog URLs on the async views or on the viewset."""
+    module = types.ModuleType('async_catalog_urls' if async_catalog else 'sync_catalog_urls')
+    others = [p for p in core.urls.urlpatterns if p not in core.urls.catalog_urlpatterns]
+    module.urlpatterns = [*core.urls.catalog_urlpatterns, *others] if async_catalog else others
+    return module
+
+
+class Command(BaseCommand):
+    help = (
+        'Have many concurrent anonymous clients browse the catalog (lists, pincode '
+        'filters, search, proximity and detail pages), once through the sync viewset '
+        'on a threaded WSGI server, once through it under ASGI, and once through the '
+        'async views under ASGI. Reports throughput, latency and threads used.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000, help='Concurrent clients.')
+        parser.add_argument('--requests', type=int, default=5, help='Requests per client.')
+        parser.add_argument('--threads', type=int, default=32, help='Worker threads of the WSGI server.')
+        parser.add_argument('--db-latency-ms', type=float, default=0,
+                            help='Delay added to every query, standing in for a networked database.')
+        parser.add_argument('--no-cache', action='store_true', help='Run without the catalog cache.')
+
+    def handle(self, *args, **options):
+        latency = options['db_latency_ms'] / 1000
+
+        def slow_queries(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow_queries)
+
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}} if options['no_cache'] else None
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            with temporary_database(name=Path(tmp) / 'asgi.sqlite3'):
+                data = seed(owners=40, tiffins_per_owner=8, customers=1, riders=1, orders=0,
+                            pincodes=['400001', '400050', '400070', '380009'])
+                urls = self.catalog_urls(data)
+                if latency:
+                    connection_created.connect(add_latency)
+                try:
+                    for mode, (server, async_catalog) in MODES.items():
+                        overrides = {'ROOT_URLCONF': urlconf(async_catalog)}
+                        if caches:
+                            overrides['CACHES'] = caches
+                        with override_settings(**overrides):
+                            cache.clear()
+                            results[mode] = self.run(server, urls, options)
+                finally:
+                    connection_created.disconnect(add_latency)
+
+        self.stdout.write(
+            f'{options["clients"]} clients x {options["requests"]} requests, '
+            f'{options["threads"]} WSGI threads, {options["db_latency_ms"]:g} ms per query, '
+            f'catalog cache {"off" if options["no_cache"] else "on"}'
+        )
+        self.stdout.write(f'{"mode":<20}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"threads":>9}')
+        for mode, result in results.items():
+            summary = result['timer'].summary()
+            self.stdout.write(
+                f'{mode:<20}{result["rps"]:>9.0f}{summary["p50_ms"]:>9.1f}{summary["p95_ms"]:>9.1f}'
+                f'{summary["p99_ms"]:>9.1f}{result["threads"]:>9}'
+            )
+        failed = {mode: result['errors'] for mode, result in results.items() if result['errors']}
+        if failed:
+            raise CommandError(f'Requests failed: {failed}')
+
+    def catalog_urls(self, data):
+        rng = random.Random(0)
+        tiffin_ids = [tiffin.id for tiffin in data.tiffins if tiffin.is_available]
+        urls = [('/api/tiffins/', ''), ('/api/tiffins/', 'page=2'), ('/api/tiffins/', 'search=thali')]
+        urls += [('/api/tiffins/', f'pincode={code}') for code in ('400001', '400050', '380009')]
+        urls += [('/api/tiffins/', f'near={code}&radius_km=5') for code in ('400001', '400070')]
+        urls += [(f'/api/tiffins/{pk}/', '') for pk in rng.sample(tiffin_ids, 20)]
+        return urls
+
+    def run(self, server, urls, options):
+        timer = Timer()
+        errors = []
+        rng = random.Random(1)
+        plans = [[rng.choice(urls) for _ in range(options['requests'])] for _ in range(options['clients'])]
+        peak = [threading.active_count()]
+        done = threading.Event()
+
+        def sample_threads():
+            while not done.wait(0.01):
+                peak[0] = max(peak[0], threading.active_count())
+
+        if server == 'wsgi':
+            handler = WSGIHandler()
+            pool = ThreadPoolExecutor(max_workers=options['threads'])
+
+            async def fetch(path, query):
+                return await asyncio.get_running_loop().run_in_executor(pool, self.call_wsgi, handler, path, query)
+        else:
+            handler = ASGIHandler()
+
+            async def fetch(path, query):
+                return await self.call_asgi(handler, path, query)
+
+        async def client(plan):
+            for path, query in plan:
+                with timer.measure():
+                    status = await fetch(path, query)
+                if status != 200:
+                    errors.append(status)
+
+        async def main():
+            # Warm up, so every mode starts with a filled catalog cache.
+            for path, query in urls:
+                await fetch(path, query)
+            timer.samples.clear()
+            started = time.perf_counter()
+            await asyncio.gather(*(client(plan) for plan in plans))
+            return time.perf_counter() - started
+
+        sampler = threading.Thread(target=sample_threads, daemon=True)
+        sampler.start()
+        try:
+            elapsed = asyncio.run(main())
+        finally:
+            done.set()
+            sampler.join()
+            if server == 'wsgi':
+                pool.shutdown()
+        return {
+            'timer': timer,
+            'errors': errors,
+            'rps': len(timer.samples) / elapsed,
+            'threads': peak[0],
+        }
+
+    def call_wsgi(self, handler, path, query):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'SCRIPT_NAME': '', 'PATH_INFO': path, 'QUERY_STRING': query,
+            'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'testserver', 'HTTP_ACCEPT': 'application/json',
+            'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        status = []
+        response = handler(environ, lambda line, headers, exc_info=None: status.append(line))
+        b''.join(response)
+        response.close()
+        return int(status[0].split()[0])
+
+    async def call_asgi(self, handler, path, query):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+            'query_string': query.encode(), 'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+            'headers': [(b'host', b'testserver'), (b'accept', b'application/json')],
+        }
+        request_sent = False
+        disconnected = asyncio.Event()
+        status = []
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        try:
+            await handler(scope, receive, send)
+        finally:
+            disconnected.set()
+        return status[0]
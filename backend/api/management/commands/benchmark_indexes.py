@@ -0,0 +1,134 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.bench import temporary_database, seed
+from api.models import Tiffin, Order, Delivery
+from api.views import TiffinViewSet, OrderViewSet, DeliveryViewSet
+from users.models import TiffinOwner
+
+INDEXED_MODELS = [TiffinOwner, Tiffin, Order, Delivery]
+
+# Indexes the schema had before the tuned ones replaced them, recreated for
+# the "before" run.
+BASELINE_INDEXES = [
+    (Delivery, models.Index(fields=['delivery_boy'], name='api_delivery_delivery_boy_fk')),
+]
+
+
+def viewset_queryset(viewset_class, user, params=None):
+    """Return the queryset ``viewset_class`` would list for ``user``."""
+    request = Request(APIRequestFactory().get('/', params or {}))
+    request.user = user
+    view = viewset_class(request=request, action='list', format_kwarg=None, kwargs={})
+    return view.get_queryset()
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a large synthetic dataset and compare query plans and timings of '
+        'the hot viewset queries with and without the model indexes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--owners', type=int, default=2000)
+        parser.add_argument('--customers', type=int, default=20000)
+        parser.add_argument('--riders', type=int, default=1000)
+        parser.add_argument('--pincodes', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed runs per query; the median is reported.')
+        parser.add_argument('--output', help='Write the results as JSON to this path.')
+
+    def handle(self, *args, **options):
+        pincodes = [f'4{i:05d}' for i in range(options['pincodes'])]
+        with temporary_database():
+            self.stdout.write('Seeding...')
+            data = seed(owners=options['owners'], tiffins_per_owner=5,
+                        customers=options['customers'], riders=options['riders'],
+                        orders=options['orders'], pincodes=pincodes)
+            scenarios = self.scenarios(data)
+
+            self.set_indexes(enabled=False)
+            before = self.run_scenarios(scenarios, options['repeat'])
+            self.set_indexes(enabled=True)
+            after = self.run_scenarios(scenarios, options['repeat'])
+
+        results = []
+        for name in scenarios:
+            results.append({'scenario': name, 'before': before[name], 'after': after[name]})
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for label, result in (('before', before[name]), ('after', after[name])):
+                self.stdout.write(
+                    f'  {label:<6} count {result["count_ms"]:8.2f} ms   '
+                    f'page {result["page_ms"]:8.2f} ms'
+                )
+                for line in result['plan']:
+                    self.stdout.write(f'           {line}')
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(f'Wrote {options["output"]}')
+
+    def scenarios(self, data):
+        owner = data.owners[0]
+        rider = data.riders[0]
+        customer = data.customers[0]
+        return {
+            'tiffins: browse by pincode': lambda: viewset_queryset(
+                TiffinViewSet, AnonymousUser(), {'pincode': owner.business_pincode}),
+            'orders: customer history': lambda: viewset_queryset(
+                OrderViewSet, customer).order_by('-created_at', '-id'),
+            'orders: owner kitchen queue': lambda: viewset_queryset(OrderViewSet, owner.user),
+            'orders: rider pincode queue': lambda: viewset_queryset(OrderViewSet, rider.user),
+            'deliveries: rider assigned + unassigned': lambda: viewset_queryset(
+                DeliveryViewSet, rider.user),
+            'deliveries: customer': lambda: viewset_queryset(DeliveryViewSet, customer),
+        }
+
+    def set_indexes(self, enabled):
+        with connection.schema_editor() as editor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    if enabled:
+                        editor.add_index(model, index)
+                    else:
+                        editor.remove_index(model, index)
+            for model, index in BASELINE_INDEXES:
+                if enabled:
+                    editor.remove_index(model, index)
+                else:
+                    editor.add_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def run_scenarios(self, scenarios, repeat):
+        results = {}
+        for name, build in scenarios.items():
+            page = build()[:10]
+            sql, params = page.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[-1] for row in cursor.fetchall()]
+
+            count_times, page_times = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                build().count()
+                count_times.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                list(build()[:10])
+                page_times.append(time.perf_counter() - start)
+            results[name] = {
+                'count_ms': statistics.median(count_times) * 1000,
+                'page_ms': statistics.median(page_times) * 1000,
+                'plan': plan,
+            }
+        return results
@@ -0,0 +1,130 @@
+import json
+import math
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F, FloatField, Value
+
+from api import geo
+from api.bench import temporary_database, seed
+from api.management.commands.benchmark_indexes import viewset_queryset
+from api.models import Pincode
+from api.views import TiffinViewSet
+from users.models import TiffinOwner
+
+CENTRES = ['400001', '400028', '400050', '400076', '400092']
+RADII_KM = [1, 3, 5, 10]
+
+
+def scan_near(queryset, latitude, longitude, radius_km):
+    """``geo.near`` without the grid: every owner's distance is computed."""
+    scale = math.cos(math.radians(latitude))
+    dy = F('owner__latitude') - Value(latitude)
+    dx = (F('owner__longitude') - Value(longitude)) * Value(scale)
+    limit = (radius_km / geo.KM_PER_DEGREE) ** 2
+    return (
+        queryset.alias(geo_distance=dy * dy + dx * dx)
+        .filter(geo_distance__lte=Value(limit, output_field=FloatField()))
+        .order_by('geo_distance', 'pk')
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Scatter kitchens over the bundled Mumbai pincodes and time ?near= '
+        'queries through the geo_cell grid against a full distance scan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owners', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed runs per query; the median is reported.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results as JSON to this path.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        results = []
+        with temporary_database():
+            codes = list(Pincode.objects.filter(code__startswith='400').values_list('code', flat=True))
+            self.stdout.write(f'Seeding {options["owners"]} kitchens...')
+            start = time.perf_counter()
+            seed(owners=options['owners'], tiffins_per_owner=1, customers=1, riders=1, orders=0,
+                 deliveries=False, pincodes=codes, batch_size=5000)
+            self.scatter(rng)
+            self.stdout.write(f'Seeded in {time.perf_counter() - start:.1f} s')
+
+            for code in CENTRES:
+                latitude, longitude = geo.locate(code)
+                for radius in RADII_KM:
+                    params = {'near': code, 'radius_km': str(radius)}
+                    grid = lambda: viewset_queryset(TiffinViewSet, AnonymousUser(), params)
+                    scan = lambda: scan_near(
+                        viewset_queryset(TiffinViewSet, AnonymousUser()), latitude, longitude, radius)
+                    result = {
+                        'near': code,
+                        'radius_km': radius,
+                        'grid': self.measure(grid, options['repeat']),
+                        'scan': self.measure(scan, options['repeat']),
+                    }
+                    if result['grid'].pop('ids') != result['scan'].pop('ids'):
+                        raise CommandError(f'Grid and scan disagree for near={code} radius_km={radius}')
+                    results.append(result)
+                    self.report(result)
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(f'Wrote {options["output"]}')
+
+    def scatter(self, rng):
+        """Move every kitchen to a random point inside the bundled pincodes' bounding box."""
+        bounds = Pincode.objects.filter(code__startswith='400').values_list('latitude', 'longitude')
+        latitudes, longitudes = zip(*bounds)
+        rows = []
+        for owner_id in TiffinOwner.objects.values_list('id', flat=True):
+            latitude = rng.uniform(min(latitudes), max(latitudes))
+            longitude = rng.uniform(min(longitudes), max(longitudes))
+            rows.append((latitude, longitude, geo.cell_for(latitude, longitude), owner_id))
+        table = connection.ops.quote_name(TiffinOwner._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {table} SET latitude = %s, longitude = %s, geo_cell = %s WHERE id = %s', rows)
+            cursor.execute('ANALYZE')
+
+    def measure(self, build, repeat):
+        page = build()[:10]
+        sql, params = page.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = [row[-1] for row in cursor.fetchall()]
+
+        count_times, page_times = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            count = build().count()
+            count_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            ids = list(build().values_list('id', flat=True)[:10])
+            page_times.append(time.perf_counter() - start)
+        return {
+            'matches': count,
+            'count_ms': statistics.median(count_times) * 1000,
+            'page_ms': statistics.median(page_times) * 1000,
+            'plan': plan,
+            'ids': ids,
+        }
+
+    def report(self, result):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'near={result["near"]} radius_km={result["radius_km"]}: {result["grid"]["matches"]} tiffins'))
+        for label in ('grid', 'scan'):
+            timing = result[label]
+            self.stdout.write(
+                f'  {label:<5} count {timing["count_ms"]:8.2f} ms   page {timing["page_ms"]:8.2f} ms')
+            for line in timing['plan']:
+                self.stdout.write(f'         {line}')
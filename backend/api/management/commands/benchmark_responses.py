@@ -0,0 +1,121 @@
+import gzip
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api import catalog_cache, compression, renderers, sync
+from api.bench import temporary_database, seed
+from api.models import Delivery, Order
+from api.renderers import FastJSONParser, FastJSONRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        'For each main endpoint, compare the stdlib JSON renderer and parser with '
+        'orjson, and the bytes on the wire and CPU per response without and with '
+        'gzip / brotli compression.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=50, help='Runs per measurement.')
+
+    def handle(self, *args, **options):
+        if not renderers.ENABLED:
+            raise CommandError('orjson is not installed or FAST_JSON is off.')
+        repeat = options['repeat']
+        encodings = compression.available_encodings()
+        accept_encoding = ', '.join(encodings)
+        mismatches = []
+
+        with temporary_database():
+            data = seed(owners=20, tiffins_per_owner=10, customers=50, riders=20,
+                        orders=options['orders'], pincodes=['400001'])
+            owner, rider = data.owners[0], data.riders[0]
+            customer = next(c for c in data.customers if c.id == Order.objects.values('customer').first()['customer'])
+            Delivery.objects.filter(order__tiffin__owner=owner).update(delivery_boy=rider)
+            delivery = Delivery.objects.filter(delivery_boy=rider).first()
+            tiffin = data.tiffins[0]
+            # Serve the rows just seeded from the changes feed too.
+            sync.SETTLE_SECONDS = 0
+
+            # name -> (url, user)
+            endpoints = {
+                'tiffins.list': ('/api/tiffins/', None),
+                'tiffins.retrieve': (f'/api/tiffins/{tiffin.id}/', None),
+                'orders.list': ('/api/orders/?pagination=cursor&page_size=100', customer),
+                'deliveries.list': ('/api/deliveries/?pagination=cursor&page_size=100', rider.user),
+                'deliveries.retrieve': (f'/api/deliveries/{delivery.id}/', rider.user),
+                'changes': ('/api/changes/?limit=200', owner.user),
+            }
+
+            self.stdout.write(f'Encodings offered: {accept_encoding}\n')
+            self.stdout.write(
+                f'{"endpoint":<20}{"json":>8}{"wire":>8}{"enc":>6}'
+                f'{"render us":>11}{"orjson us":>11}{"parse us":>10}{"orjson us":>11}{"compress us":>13}'
+                f'{"json ms":>9}{"orjson ms":>11}{"+compress ms":>14}'
+            )
+            for name, (url, user) in endpoints.items():
+                client = APIClient()
+                if user is not None:
+                    client.force_authenticate(user=user)
+                payload = client.get(url).data
+                plain = JSONRenderer().render(payload)
+                fast = FastJSONRenderer().render(payload)
+                if plain != fast:
+                    mismatches.append(name)
+
+                render_us = self.cpu(lambda: JSONRenderer().render(payload), repeat) * 1e6
+                fast_render_us = self.cpu(lambda: FastJSONRenderer().render(payload), repeat) * 1e6
+                parse_us = self.cpu(lambda: JSONParser().parse(io.BytesIO(plain)), repeat) * 1e6
+                fast_parse_us = self.cpu(lambda: FastJSONParser().parse(io.BytesIO(plain)), repeat) * 1e6
+                compress_us = self.cpu(lambda: compression.compress(plain, encodings[0]), repeat) * 1e6
+
+                # Whole requests: stdlib JSON, orjson, orjson and compression.
+                renderers.ENABLED = False
+                try:
+                    json_ms = self.cpu(lambda: self.fetch(client, url), repeat) * 1000
+                finally:
+                    renderers.ENABLED = True
+                orjson_ms = self.cpu(lambda: self.fetch(client, url), repeat) * 1000
+                compressed_ms = self.cpu(lambda: self.fetch(client, url, accept_encoding), repeat) * 1000
+
+                response = self.fetch(client, url, accept_encoding)
+                encoding = response.get('Content-Encoding', '-')
+                decompress = {'gzip': gzip.decompress, 'br': getattr(compression.brotli, 'decompress', None)}
+                if encoding in decompress and decompress[encoding](response.content) != plain:
+                    mismatches.append(f'{name} ({encoding})')
+
+                self.stdout.write(
+                    f'{name:<20}{len(plain):>8}{len(response.content):>8}{encoding:>6}'
+                    f'{render_us:>11.0f}{fast_render_us:>11.0f}{parse_us:>10.0f}{fast_parse_us:>11.0f}'
+                    f'{compress_us:>13.0f}{json_ms:>9.2f}{orjson_ms:>11.2f}{compressed_ms:>14.2f}'
+                )
+            catalog_cache.invalidate()
+
+        self.stdout.write(
+            '\njson/wire: response bytes without and with compression. render/parse/compress: '
+            'CPU per call. The last three columns are CPU per whole request with stdlib '
+            'json, with orjson, and with orjson and compression.'
+        )
+        if mismatches:
+            raise CommandError('Output differs from the stdlib renderer for: ' + ', '.join(mismatches))
+        self.stdout.write(self.style.SUCCESS('orjson output is byte-identical for every endpoint.'))
+
+    def fetch(self, client, url, accept_encoding=None):
+        extra = {'HTTP_ACCEPT_ENCODING': accept_encoding} if accept_encoding else {}
+        response = client.get(url, **extra)
+        if response.status_code != 200:
+            raise CommandError(f'GET {url} returned {response.status_code}')
+        return response
+
+    def cpu(self, func, repeat):
+        """CPU seconds per call, averaged over ``repeat`` calls."""
+        started = time.process_time()
+        for _ in range(repeat):
+            func()
+        return (time.process_time() - started) / repeat
@@ -0,0 +1,107 @@
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import locations
+from api.bench import Timer, temporary_database, seed
+from users.models import DeliveryBoy
+
+
+class Command(BaseCommand):
+    help = (
+        'Have riders report their position concurrently, once through a PATCH of '
+        'DeliveryBoy.current_location per ping and once through the coalescing '
+        'location endpoint, and compare latency and database writes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--riders', type=int, default=50)
+        parser.add_argument('--pings', type=int, default=40, help='Pings per rider.')
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            with temporary_database(name=Path(tmp) / 'locations.sqlite3'):
+                data = seed(owners=1, tiffins_per_owner=1, customers=1, riders=options['riders'], orders=0)
+                clients = []
+                for rider in data.riders:
+                    client = APIClient()
+                    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(rider.user)}')
+                    clients.append((rider, client))
+
+                def patch(rider, client, i):
+                    return client.patch(f'/api/delivery-boys/{rider.id}/',
+                                        {'current_location': f'19.{i:04d},72.8000'}, format='json')
+
+                def ping(rider, client, i):
+                    return client.post('/api/delivery-boys/location/',
+                                       {'latitude': 19 + i / 10000, 'longitude': 72.8}, format='json')
+
+                # Flush once, at the end, so every write is counted here.
+                store = locations.get_store()
+                store.flush_seconds = 3600
+                results = {}
+                for name, send in (('patch', patch), ('location', ping)):
+                    results[name] = self.run(clients, send, options['pings'], options['threads'])
+                start = time.perf_counter()
+                results['location']['writes'] += store.flush()
+                flush_ms = (time.perf_counter() - start) * 1000
+
+                stored = DeliveryBoy.objects.filter(latitude=19 + (options['pings'] - 1) / 10000).count()
+                store.clear()
+
+        self.stdout.write(f'{options["riders"]} riders x {options["pings"]} pings, {options["threads"]} threads')
+        for name, result in results.items():
+            summary = result['timer'].summary()
+            self.stdout.write(
+                f'  {name:<9} {result["pings_per_s"]:8.0f} pings/s   p50 {summary["p50_ms"]:6.2f} ms   '
+                f'p95 {summary["p95_ms"]:6.2f} ms   row writes {result["writes"]}'
+            )
+        self.stdout.write(f'  final flush of {options["riders"]} riders: {flush_ms:.2f} ms')
+        if any(result['errors'] for result in results.values()):
+            raise CommandError('Some pings were rejected.')
+        if stored != options['riders']:
+            raise CommandError(f'Only {stored} of {options["riders"]} riders have their last position stored.')
+        self.stdout.write(self.style.SUCCESS('Every rider ended at its last reported position.'))
+
+    def run(self, clients, send, pings, threads):
+        timer = Timer()
+        writes = [0]
+        errors = []
+        lock = threading.Lock()
+
+        def count_writes(execute, sql, params, many, context):
+            if sql.startswith('UPDATE'):
+                with lock:
+                    writes[0] += len(params) if many else 1
+            return execute(sql, params, many, context)
+
+        def worker(assigned):
+            with connections['default'].execute_wrapper(count_writes):
+                for i in range(pings):
+                    for rider, client in assigned:
+                        with timer.measure():
+                            response = send(rider, client, i)
+                        if response.status_code >= 300:
+                            errors.append(response.status_code)
+            connections.close_all()
+
+        workers = [threading.Thread(target=worker, args=(clients[n::threads],)) for n in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        return {
+            'timer': timer,
+            'writes': writes[0],
+            'errors': errors,
+            'pings_per_s': len(clients) * pings / elapsed,
+        }
@@ -0,0 +1,92 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.bench import temporary_database, seed
+from api.fast_serializers import (
+    FastDeliverySerializer, FastOrderSerializer, FastTiffinSerializer, FastUserSerializer
+)
+from api.models import Delivery, Order, Tiffin
+from users.models import User
+
+# name -> (queryset as the list endpoint builds it, fast serializer)
+CASES = {
+    'tiffins': (lambda: Tiffin.objects.select_related('owner').order_by('id'), FastTiffinSerializer),
+    'orders': (
+        lambda: Order.objects.select_related('customer', 'tiffin', 'delivery_boy__user').order_by('id'),
+        FastOrderSerializer,
+    ),
+    'deliveries': (
+        lambda: Delivery.objects.select_related(
+            'delivery_boy__user', 'order__customer', 'order__tiffin', 'order__delivery_boy__user'
+        ).order_by('id'),
+        FastDeliverySerializer,
+    ),
+    'users': (lambda: User.objects.select_related('tiffin_owner', 'delivery_boy').order_by('id'), FastUserSerializer),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare rows per second of the DRF list serializers against the .values() '
+        'fast serializers, and check both render byte-identical JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000, help='Orders to seed (deliveries follow).')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case; the best is kept.')
+
+    def handle(self, *args, **options):
+        request = Request(APIRequestFactory().get('/api/'))
+        context = {'request': request, 'format': None, 'view': None}
+        renderer = JSONRenderer()
+        mismatches = []
+
+        with temporary_database():
+            seed(owners=50, tiffins_per_owner=10, customers=1000, riders=200, orders=options['rows'])
+            # Give some tiffins an image, and some of those finished variants.
+            for i, tiffin in enumerate(Tiffin.objects.order_by('id')[:300]):
+                variants = {}
+                if i % 2:
+                    variants = {'source': f'tiffins/t{tiffin.id}.jpg',
+                                'thumb': {'jpeg': f'tiffins/variants/{tiffin.id}/t-thumb.jpg'}}
+                Tiffin.objects.filter(pk=tiffin.pk).update(image=f'tiffins/t{tiffin.id}.jpg', image_variants=variants)
+
+            self.stdout.write(f'{"case":<12}{"rows":>7}{"drf rows/s":>14}{"fast rows/s":>14}{"speedup":>9}')
+            for name, (make_queryset, fast_class) in CASES.items():
+                queryset = make_queryset()
+                serializer_class = fast_class.serializer_class
+
+                def drf():
+                    return serializer_class(list(queryset.all()), many=True, context=context).data
+
+                def fast():
+                    reader = fast_class(context=context)
+                    return reader.serialize(list(reader.values(queryset.all())))
+
+                drf_data, drf_time = self.measure(drf, options['repeat'])
+                fast_data, fast_time = self.measure(fast, options['repeat'])
+                if renderer.render(drf_data) != renderer.render(fast_data):
+                    mismatches.append(name)
+
+                rows = len(drf_data)
+                self.stdout.write(
+                    f'{name:<12}{rows:>7}{rows / drf_time:>14.0f}{rows / fast_time:>14.0f}'
+                    f'{drf_time / fast_time:>8.1f}x'
+                )
+
+        if mismatches:
+            raise CommandError('Rendered output differs for: ' + ', '.join(mismatches))
+        self.stdout.write(self.style.SUCCESS('Rendered JSON is byte-identical for every case.'))
+
+    def measure(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return data, best
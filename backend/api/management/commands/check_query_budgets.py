@@ -0,0 +1,101 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.bench import temporary_database, seed
+from api.models import Tiffin, Order, Delivery
+from users.models import TiffinOwner, DeliveryBoy
+
+# Maximum number of SQL queries each read action may issue, regardless of how
+# many rows end up on the page. List actions are paginated, so they pay for a
+# COUNT(*) plus the page itself; everything else must come from joins.
+QUERY_BUDGETS = {
+    ('tiffins', 'list'): 2,
+    ('tiffins', 'retrieve'): 1,
+    ('orders', 'list'): 2,
+    ('orders', 'retrieve'): 1,
+    ('deliveries', 'list'): 2,
+    ('deliveries', 'retrieve'): 1,
+    ('tiffin-owners', 'list'): 2,
+    ('tiffin-owners', 'retrieve'): 1,
+    ('delivery-boys', 'list'): 2,
+    ('delivery-boys', 'retrieve'): 1,
+    ('users', 'list'): 2,
+    ('users', 'retrieve'): 1,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database and fail if any list/retrieve action on the '
+        'API issues more SQL queries than its budget.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200,
+                            help='Number of synthetic orders to seed.')
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            data = seed(owners=12, tiffins_per_owner=3, customers=12, riders=12,
+                        orders=options['orders'], pincodes=['400001'])
+            failures = self.check_budgets(data)
+
+        if failures:
+            raise CommandError(
+                'Query budget exceeded:\n' + '\n'.join(f'  {line}' for line in failures)
+            )
+        self.stdout.write(self.style.SUCCESS('All actions are within their query budget.'))
+
+    def check_budgets(self, data):
+        owner = data.owners[0]
+        rider = data.riders[0]
+        customer = Order.objects.values_list('customer', flat=True).first()
+        customer = next(c for c in data.customers if c.id == customer)
+        # Give every role a full page to read so lazy relations would show up.
+        Delivery.objects.filter(order__tiffin__owner=owner).update(delivery_boy=rider)
+
+        detail_ids = {
+            'tiffins': Tiffin.objects.filter(is_available=True).values_list('id', flat=True).first(),
+            'orders': Order.objects.filter(customer=customer).values_list('id', flat=True).first(),
+            'deliveries': Delivery.objects.filter(delivery_boy=rider).values_list('id', flat=True).first(),
+            'tiffin-owners': TiffinOwner.objects.values_list('id', flat=True).first(),
+            'delivery-boys': DeliveryBoy.objects.values_list('id', flat=True).first(),
+            'users': customer.id,
+        }
+        roles = {
+            'tiffins': None,
+            'orders': customer,
+            'deliveries': rider.user,
+            'tiffin-owners': customer,
+            'delivery-boys': customer,
+            'users': customer,
+        }
+
+        failures = []
+        for (resource, action), budget in QUERY_BUDGETS.items():
+            client = APIClient()
+            if roles[resource] is not None:
+                client.force_authenticate(user=roles[resource])
+            url = f'/api/{resource}/'
+            if action == 'retrieve':
+                url += f'{detail_ids[resource]}/'
+
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.get(url)
+            used = len(ctx.captured_queries)
+
+            if response.status_code != 200:
+                failures.append(f'GET {url} returned {response.status_code}')
+                continue
+            rows = len(response.data['results']) if action == 'list' else 1
+            line = f'{resource}.{action}: {used} queries for {rows} row(s), budget {budget}'
+            if used > budget:
+                failures.append(line)
+                self.stdout.write(self.style.ERROR(line))
+                for query in ctx.captured_queries:
+                    self.stdout.write(f'    {query["sql"]}')
+            else:
+                self.stdout.write(line)
+        return failures
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from api import conditional
+
+# Import the viewsets so every ConditionalGetMixin subclass is registered.
+import api.views  # noqa: F401
+
+
+class Command(BaseCommand):
+    help = 'Print how often conditional GETs were answered with 304 Not Modified, per view and action.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them.')
+
+    def handle(self, *args, **options):
+        # Counts gathered in this process, e.g. when called from a benchmark.
+        conditional.flush_counts()
+        self.stdout.write(f'{"view":<28} {"hit":>8} {"miss":>8} {"uncond.":>8} {"hit rate":>9}')
+        for view in conditional.conditional_views():
+            for action in view.conditional_actions:
+                name = f'{view.__name__}.{action}'
+                counts = conditional.get_counts(name)
+                conditional_total = counts['hit'] + counts['miss']
+                rate = f'{counts["hit"] / conditional_total:.1%}' if conditional_total else '-'
+                self.stdout.write(
+                    f'{name:<28} {counts["hit"]:>8} {counts["miss"]:>8} {counts["unconditional"]:>8} {rate:>9}'
+                )
+                if options['reset']:
+                    conditional.reset_counts(name)
+        if options['reset']:
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import catalog_cache, geo
+
+
+class Command(BaseCommand):
+    help = (
+        'Import pincode centres from a CSV with pincode, latitude and longitude '
+        'columns (default: the bundled api/data/pincodes.csv), then place kitchens '
+        'without a location at their pincode.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=geo.BUNDLED_PINCODES)
+
+    def handle(self, *args, **options):
+        try:
+            loaded = geo.load_pincodes(options['path'])
+        except OSError as exc:
+            raise CommandError(f'Could not read {options["path"]}: {exc}')
+        placed = geo.place_owners()
+        if placed:
+            catalog_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'Loaded {loaded} pincodes; updated {placed} kitchens.'))
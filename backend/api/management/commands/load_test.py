@@ -0,0 +1,506 @@
+import contextlib
+import json
+import logging
+import platform
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+import warnings
+from collections import defaultdict, deque
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import UnorderedObjectListWarning
+from django.db import connections
+from django.db.models import Max, Sum
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import stock
+from api.bench import DISHES, PINCODES, Timer, seed, temporary_database
+from api.models import Delivery, Order, Tiffin, TiffinStock
+from users.models import DeliveryBoy
+
+SCALES = {
+    'small': {'owners': 40, 'tiffins_per_owner': 5, 'customers': 1000, 'riders': 200, 'orders': 10000},
+    'medium': {'owners': 150, 'tiffins_per_owner': 8, 'customers': 10000, 'riders': 1000, 'orders': 100000},
+    'large': {'owners': 500, 'tiffins_per_owner': 10, 'customers': 50000, 'riders': 3000, 'orders': 500000},
+}
+
+# Scenario -> share of the mixed phase.
+MIX = {
+    'browse': 30,
+    'search': 15,
+    'tiffin_detail': 10,
+    'place_order': 12,
+    'order_history': 10,
+    'owner_status_update': 10,
+    'owner_dashboard': 5,
+    'rider_deliveries': 8,
+}
+
+NEXT_STATUS = {'pending': 'confirmed', 'confirmed': 'preparing'}
+SEARCH_TERMS = sorted({word.lower() for name, _ in DISHES for word in name.split()})
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'load_baseline.json'
+# Below this many requests an endpoint's p95 is one of its slowest few
+# samples, so only its query count is compared.
+MIN_TIMED_SAMPLES = 200
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a large synthetic dataset, drive a realistic request mix, a rider '
+        'accept storm and a lunch rush on one tiffin with a daily capacity through '
+        'the API (failing if it oversells), and report throughput, latency percentiles '
+        'and SQL queries per endpoint. Results are written as JSON and compared '
+        'against a stored baseline. Latency and throughput depend on the machine, '
+        'so refresh the baseline with --save-baseline on the reference host.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+        parser.add_argument('--requests', type=int, default=4000, help='Requests in the mixed phase.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Client threads.')
+        parser.add_argument('--storm-deliveries', type=int, default=100)
+        parser.add_argument('--storm-riders', type=int, default=16)
+        parser.add_argument('--rush-customers', type=int, default=32)
+        parser.add_argument('--rush-capacity', type=int, default=60, help='Daily capacity of the rushed tiffin.')
+        parser.add_argument('--rush-shards', type=int, default=4, help='Capacity shards of the rushed tiffin.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--runs', type=int, default=3,
+                            help='Repeat the whole load on fresh data and report the median of each figure; '
+                                 'a single run is too noisy to compare against the baseline.')
+        parser.add_argument('--output', help='Write results JSON here.')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE),
+                            help='Baseline JSON to compare against.')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Store the results as the new baseline instead of comparing.')
+        parser.add_argument('--threshold', type=float, default=25.0,
+                            help='Percent change in p95 latency or throughput that counts as a regression.')
+
+    def handle(self, *args, **options):
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        warnings.simplefilter('ignore', UnorderedObjectListWarning)
+        scale = SCALES[options['scale']]
+        runs = [self.run_once(scale, options) for _ in range(max(options['runs'], 1))]
+        endpoints = self.merge(runs)
+
+        results = {
+            'meta': {
+                'scale': options['scale'],
+                'dataset': scale,
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'seed': options['seed'],
+                'runs': len(runs),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'finished_at': timezone.now().isoformat(),
+            },
+            'endpoints': endpoints,
+        }
+        self.report(endpoints)
+
+        if options['output']:
+            self.write_json(options['output'], results)
+        baseline = Path(options['baseline'])
+        if options['save_baseline']:
+            self.write_json(baseline, results)
+            self.stdout.write(self.style.SUCCESS(f'Saved baseline to {baseline}'))
+            return
+        if not baseline.exists():
+            self.stdout.write(self.style.WARNING(f'No baseline at {baseline}; run with --save-baseline.'))
+            return
+
+        regressions = self.compare(json.loads(baseline.read_text()), results, options['threshold'])
+        errors = [name for name, stats in endpoints.items() if stats['errors']]
+        if errors:
+            regressions.append('Unexpected responses from: ' + ', '.join(errors))
+        if regressions:
+            raise CommandError('Regressions against baseline:\n' + '\n'.join(f'  {line}' for line in regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against baseline.'))
+
+    def run_once(self, scale, options):
+        rng = random.Random(options['seed'])
+        with tempfile.TemporaryDirectory() as tmp:
+            with temporary_database(name=Path(tmp) / 'load.sqlite3'):
+                started = time.perf_counter()
+                data = seed(**scale, seed_value=options['seed'])
+                self.stdout.write(f'Seeded {options["scale"]} dataset in {time.perf_counter() - started:.1f} s')
+                fixtures = Fixtures(data, rng)
+                endpoints = {}
+                endpoints.update(self.run_mix(fixtures, rng, options))
+                endpoints.update(self.run_storm(fixtures, rng, options))
+                endpoints.update(self.run_rush(fixtures, rng, options))
+                connections.close_all()
+        return endpoints
+
+    @staticmethod
+    def merge(runs):
+        """Each endpoint's median figures across runs; errors are added up."""
+        if len(runs) == 1:
+            return runs[0]
+        merged = {}
+        for name in runs[0]:
+            stats = [run[name] for run in runs if name in run]
+            merged[name] = {key: statistics.median(entry[key] for entry in stats) for key in stats[0]}
+            merged[name]['errors'] = sum(entry['errors'] for entry in stats)
+        return merged
+
+    def run_mix(self, fixtures, rng, options):
+        names = list(MIX)
+        plan = deque(rng.choices(names, weights=[MIX[name] for name in names], k=options['requests']))
+        recorder = Recorder()
+        lock = threading.Lock()
+
+        def worker(worker_seed):
+            local_rng = random.Random(worker_seed)
+            clients = ClientPool(fixtures)
+            try:
+                while True:
+                    with lock:
+                        if not plan:
+                            return
+                        name = plan.popleft()
+                    request = getattr(fixtures, name)(local_rng)
+                    if request is None:
+                        continue
+                    recorder.call(name, clients.get(request.user), request)
+            finally:
+                connections.close_all()
+
+        elapsed = self.run_threads(worker, options['concurrency'], rng)
+        return recorder.stats(elapsed)
+
+    def run_storm(self, fixtures, rng, options):
+        """Many riders in one pincode accept the same fresh deliveries at once."""
+        pincode, delivery_ids, riders = fixtures.prepare_storm(
+            options['storm_deliveries'], options['storm_riders'])
+        recorder = Recorder()
+        barrier = threading.Barrier(len(riders))
+
+        def ride(rider, order):
+            client = ClientPool(fixtures).get(rider.user)
+            barrier.wait()
+            try:
+                for delivery_id in order:
+                    # Losers get 409.
+                    recorder.call('rider_accept', client,
+                                  Request('post', f'/api/deliveries/{delivery_id}/accept/', expect=(200, 409)))
+            finally:
+                connections.close_all()
+
+        threads = []
+        for rider in riders:
+            order = list(delivery_ids)
+            rng.shuffle(order)
+            threads.append(threading.Thread(target=ride, args=(rider, order)))
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        won = Delivery.objects.filter(id__in=delivery_ids, delivery_boy__isnull=False).count()
+        self.stdout.write(f'Accept storm in {pincode}: {len(riders)} riders, {won}/{len(delivery_ids)} claimed')
+        return recorder.stats(elapsed)
+
+    def run_rush(self, fixtures, rng, options):
+        """
+        Many customers order the same tiffin at once, one by one and in
+        carts, until well past its daily capacity. Fails if it oversells.
+        """
+        capacity, shards = options['rush_capacity'], options['rush_shards']
+        tiffin, customers, first_order_id = fixtures.prepare_rush(capacity, shards, options['rush_customers'])
+        # About four times as many portions as there are.
+        per_customer = max(4, -(-2 * capacity // len(customers)))
+        recorder = Recorder()
+        barrier = threading.Barrier(len(customers))
+
+        def order(customer, customer_seed):
+            local_rng = random.Random(customer_seed)
+            client = ClientPool(fixtures).get(customer)
+
+            def item():
+                return {'tiffin': tiffin.id, 'quantity': local_rng.randint(1, 3),
+                        'delivery_address': customer.address, 'delivery_pincode': customer.pincode}
+
+            barrier.wait()
+            try:
+                for _ in range(per_customer):
+                    # Orders past the capacity get 400, carts 207 or 400.
+                    if local_rng.random() < 0.25:
+                        recorder.call('rush_batch', client, Request(
+                            'post', '/api/orders/batch/', {'items': [item(), item()]}, expect=(201, 207, 400)))
+                    else:
+                        recorder.call('rush_order', client, Request(
+                            'post', '/api/orders/', item(), expect=(201, 400)))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=order, args=(customer, rng.random())) for customer in customers]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        placed = Order.objects.filter(tiffin=tiffin, id__gt=first_order_id).aggregate(
+            total=Sum('quantity'), held=Sum('stock_taken'))
+        sold, held = placed['total'] or 0, placed['held'] or 0
+        left = stock.remaining(tiffin.id) or 0
+        tiffin.refresh_from_db()
+        self.stdout.write(
+            f'Lunch rush on tiffin {tiffin.id}: {len(customers)} customers, {sold}/{capacity} portions sold '
+            f'over {shards} shards, {left} left, {"available" if tiffin.is_available else "sold out"}'
+        )
+        if sold > capacity or sold + left != capacity:
+            raise CommandError(f'Tiffin {tiffin.id} sold {sold} portions of {capacity} with {left} left.')
+        if held != sold:
+            raise CommandError(f'Orders for tiffin {tiffin.id} record {held} portions taken of {sold} sold.')
+        if left == 0 and tiffin.is_available:
+            raise CommandError(f'Tiffin {tiffin.id} sold out but is still available.')
+        return recorder.stats(elapsed)
+
+    def run_threads(self, target, count, rng):
+        threads = [threading.Thread(target=target, args=(rng.random(),)) for _ in range(count)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+    def report(self, endpoints):
+        self.stdout.write(
+            f'{"endpoint":<22}{"count":>7}{"err":>5}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}'
+            f'{"p99 ms":>9}{"queries":>9}'
+        )
+        for name, stats in endpoints.items():
+            self.stdout.write(
+                f'{name:<22}{stats["count"]:>7}{stats["errors"]:>5}{stats["throughput_rps"]:>9.1f}'
+                f'{stats["p50_ms"]:>9.1f}{stats["p95_ms"]:>9.1f}{stats["p99_ms"]:>9.1f}'
+                f'{stats["queries_mean"]:>9.2f}'
+            )
+
+    def compare(self, baseline, results, threshold):
+        if baseline['meta'].get('scale') != results['meta']['scale']:
+            self.stdout.write(self.style.WARNING(
+                f'Baseline was recorded at scale {baseline["meta"].get("scale")!r}; comparing anyway.'))
+        limit = threshold / 100
+        regressions = []
+        self.stdout.write(f'{"endpoint":<22}{"p95 ms":>18}{"req/s":>18}{"queries":>16}')
+        for name, new in results['endpoints'].items():
+            old = baseline['endpoints'].get(name)
+            if old is None:
+                self.stdout.write(f'{name:<22}  (not in baseline)')
+                continue
+            flags = []
+            timed = new['count'] >= MIN_TIMED_SAMPLES
+            if timed and new['p95_ms'] > old['p95_ms'] * (1 + limit):
+                flags.append(f'{name}: p95 {old["p95_ms"]:.1f} -> {new["p95_ms"]:.1f} ms')
+            if timed and new['throughput_rps'] < old['throughput_rps'] * (1 - limit):
+                flags.append(f'{name}: throughput {old["throughput_rps"]:.1f} -> {new["throughput_rps"]:.1f} req/s')
+            # Query counts barely depend on the machine, so hold them tighter,
+            # except in the small rush phases where shard retries under
+            # contention move the mean from run to run.
+            query_limit = 0.1 if timed else limit
+            if new['queries_mean'] > old['queries_mean'] * (1 + query_limit) + 0.5:
+                flags.append(f'{name}: queries {old["queries_mean"]:.2f} -> {new["queries_mean"]:.2f} per request')
+            regressions.extend(flags)
+            line = (
+                f'{name:<22}{self.delta(old["p95_ms"], new["p95_ms"]):>18}'
+                f'{self.delta(old["throughput_rps"], new["throughput_rps"]):>18}'
+                f'{self.delta(old["queries_mean"], new["queries_mean"]):>16}'
+            )
+            if not timed:
+                line += f'  ({new["count"]} requests: queries only)'
+            self.stdout.write(self.style.ERROR(line) if flags else line)
+        return regressions
+
+    @staticmethod
+    def delta(old, new):
+        change = (new - old) / old * 100 if old else 0.0
+        return f'{new:.1f} ({change:+.0f}%)'
+
+    @staticmethod
+    def write_json(path, results):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+
+
+class Request:
+    def __init__(self, method, path, data=None, user=None, expect=(200,)):
+        self.method = method
+        self.path = path
+        self.data = data
+        self.user = user
+        self.expect = expect
+
+
+class ClientPool:
+    """One API client per user for a worker thread, authenticated with a real JWT."""
+
+    def __init__(self, fixtures):
+        self.fixtures = fixtures
+        self.clients = {}
+
+    def get(self, user):
+        key = user.pk if user is not None else None
+        client = self.clients.get(key)
+        if client is None:
+            client = self.clients[key] = APIClient()
+            if user is not None:
+                client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.fixtures.token(user)}')
+        return client
+
+
+class Recorder:
+    """Latency, status and SQL query count per endpoint, across threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timers = defaultdict(Timer)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def call(self, name, client, request):
+        count = [0]
+
+        def counter(execute, sql, params, many, context):
+            count[0] += 1
+            return execute(sql, params, many, context)
+
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            started = time.perf_counter()
+            try:
+                if request.method == 'get':
+                    response = client.get(request.path)
+                else:
+                    response = getattr(client, request.method)(request.path, request.data, format='json')
+                status = response.status_code
+            except Exception:
+                status = 500
+            elapsed = time.perf_counter() - started
+
+        with self.lock:
+            self.timers[name].samples.append(elapsed)
+            self.queries[name].append(count[0])
+            if status not in request.expect:
+                self.errors[name] += 1
+
+    def stats(self, elapsed):
+        results = {}
+        for name, timer in sorted(self.timers.items()):
+            summary = timer.summary()
+            queries = self.queries[name]
+            results[name] = {
+                **summary,
+                'errors': self.errors[name],
+                'throughput_rps': summary['count'] / elapsed if elapsed else 0.0,
+                'queries_mean': sum(queries) / len(queries),
+                'queries_max': max(queries),
+            }
+        return results
+
+
+class Fixtures:
+    """The ids and users scenarios draw from, loaded once after seeding."""
+
+    def __init__(self, data, rng):
+        self.customers = data.customers
+        self.owners = data.owners
+        self.riders = data.riders
+        self.owner_users = {owner.id: owner.user for owner in data.owners}
+        self.tiffin_ids = list(Tiffin.objects.filter(is_available=True).values_list('id', flat=True))
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+        # Each order is moved on at most once per run, so concurrent owners
+        # never race on the same row.
+        updatable = list(
+            Order.objects.filter(status__in=NEXT_STATUS).values_list('id', 'status', 'tiffin__owner_id')
+        )
+        rng.shuffle(updatable)
+        self.updatable = deque(updatable)
+
+    def token(self, user):
+        with self._lock:
+            token = self._tokens.get(user.pk)
+            if token is None:
+                token = self._tokens[user.pk] = str(AccessToken.for_user(user))
+            return token
+
+    # Scenarios: each returns the Request to send, or None to skip.
+
+    def browse(self, rng):
+        return Request('get', f'/api/tiffins/?pincode={rng.choice(PINCODES)}&page={rng.choice([1, 1, 1, 2])}')
+
+    def search(self, rng):
+        return Request('get', f'/api/tiffins/?search={rng.choice(SEARCH_TERMS)}')
+
+    def tiffin_detail(self, rng):
+        return Request('get', f'/api/tiffins/{rng.choice(self.tiffin_ids)}/')
+
+    def place_order(self, rng):
+        customer = rng.choice(self.customers)
+        return Request('post', '/api/orders/', {
+            'tiffin': rng.choice(self.tiffin_ids),
+            'quantity': rng.randint(1, 3),
+            'delivery_address': customer.address,
+            'delivery_pincode': customer.pincode,
+        }, user=customer, expect=(201,))
+
+    def order_history(self, rng):
+        return Request('get', '/api/orders/?pagination=cursor', user=rng.choice(self.customers))
+
+    def owner_status_update(self, rng):
+        with self._lock:
+            if not self.updatable:
+                return None
+            order_id, status, owner_id = self.updatable.popleft()
+        return Request('post', f'/api/orders/{order_id}/update_status/', {'status': NEXT_STATUS[status]},
+                       user=self.owner_users[owner_id])
+
+    def owner_dashboard(self, rng):
+        return Request('get', '/api/tiffin-owners/dashboard/', user=rng.choice(self.owners).user)
+
+    def rider_deliveries(self, rng):
+        return Request('get', '/api/deliveries/?delivery_boy_is_null=true', user=rng.choice(self.riders).user)
+
+    def prepare_storm(self, deliveries, riders):
+        pincode = PINCODES[0]
+        orders = list(
+            Order.objects.filter(delivery_pincode=pincode, delivery__isnull=True)
+            .select_related('tiffin__owner')[:deliveries]
+        )
+        Order.objects.filter(id__in=[order.id for order in orders]).update(status='ready_for_delivery')
+        created = Delivery.objects.bulk_create([
+            Delivery(order=order, pickup_address=order.tiffin.owner.business_address,
+                     delivery_address=order.delivery_address, status='pending')
+            for order in orders
+        ])
+        storm_riders = list(
+            DeliveryBoy.objects.filter(user__pincode=pincode).select_related('user')[:riders]
+        )
+        if len(storm_riders) < 2:
+            raise CommandError(f'Need at least two riders in {pincode} for the accept storm.')
+        return pincode, [delivery.id for delivery in created], storm_riders
+
+    def prepare_rush(self, capacity, shards, customers):
+        tiffin = Tiffin.objects.get(pk=self.tiffin_ids[0])
+        Tiffin.objects.filter(pk=tiffin.pk).update(is_available=True, daily_capacity=capacity, capacity_shards=shards)
+        TiffinStock.objects.filter(tiffin=tiffin).delete()
+        first_order_id = Order.objects.aggregate(last=Max('id'))['last'] or 0
+        return tiffin, self.customers[:customers], first_order_id
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api import images
+from api.models import Tiffin
+
+
+class Command(BaseCommand):
+    help = 'Build resized image variants for tiffins whose variants are missing or out of date.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Rebuild variants for every tiffin with an image.')
+
+    def handle(self, *args, **options):
+        tiffins = Tiffin.objects.exclude(image='').exclude(image__isnull=True).only('id', 'image', 'image_variants')
+        ids = [t.id for t in tiffins if options['all'] or images.needs_processing(t)]
+        done = sum(1 for tiffin_id in ids if images.process_tiffin_image(tiffin_id) is not None)
+        self.stdout.write(self.style.SUCCESS(f'Processed {done} of {len(ids)} tiffin images.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the sales rollups behind the owner dashboard from the full order history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Orders read per batch, by id range.')
+
+    def handle(self, *args, **options):
+        verbose = options['verbosity'] > 1
+        count = rollups.rebuild(options['chunk_size'], stdout=self.stdout if verbose else None)
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {count} orders.'))
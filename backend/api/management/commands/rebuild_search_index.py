@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index over tiffin names and descriptions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default',
+                            help='Database alias to rebuild the index on.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not search.is_available(using):
+            raise CommandError(
+                f'No full-text index on "{using}"; search uses the icontains fallback.'
+            )
+        count = search.rebuild_index(using)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} tiffins.'))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api import dispatch
+
+
+class Command(BaseCommand):
+    help = 'Assign pending deliveries to available riders in periodic matching rounds.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds between rounds when nothing was left to assign.')
+        parser.add_argument('--once', action='store_true', help='Run a single round and exit.')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            started = time.perf_counter()
+            result = dispatch.run_round()
+            elapsed = (time.perf_counter() - started) * 1000
+            if result.pending or options['verbosity'] > 1:
+                self.stdout.write(
+                    f'{len(result.assigned)} assigned, {result.lost} lost to manual accepts, '
+                    f'{result.pending} pending, {result.riders} riders free ({elapsed:.1f} ms)'
+                )
+            if options['once']:
+                return
+            # A full batch means there is probably more waiting; go again now.
+            if result.pending < dispatch.BATCH_SIZE or not result.assigned:
+                time.sleep(options['interval'])
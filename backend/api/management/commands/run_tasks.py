@@ -0,0 +1,56 @@
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import tasks
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks with retries, on a thread or process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pool', choices=tasks.POOLS, default=tasks.POOL,
+                            help='Run tasks on threads, or on processes for CPU-bound tasks.')
+        parser.add_argument('--concurrency', type=int, default=tasks.CONCURRENCY,
+                            help='Tasks run at the same time.')
+        parser.add_argument('--poll', type=float, default=tasks.POLL_SECONDS,
+                            help='Seconds between looks at the queue when it is idle.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no task is due instead of waiting for more.')
+        parser.add_argument('--stats-interval', type=float, default=60,
+                            help='Seconds between queue depth and latency reports; 0 for none.')
+
+    def handle(self, *args, **options):
+        worker = tasks.Worker(concurrency=options['concurrency'], pool=options['pool'],
+                              poll_seconds=options['poll'])
+        stop = threading.Event()
+        # Finish the running tasks on SIGTERM or Ctrl-C, then exit.
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        signal.signal(signal.SIGINT, lambda *args: stop.set())
+        self.stdout.write(
+            f'Worker {worker.id}: {options["concurrency"]} {options["pool"]} workers, polling every {options["poll"]:g} s'
+        )
+
+        interval = options['stats_interval']
+        reported = time.monotonic()
+        try:
+            while not stop.is_set():
+                if not worker.run_once() and options['burst'] and not worker.running:
+                    break
+                if interval and time.monotonic() - reported >= interval:
+                    self.report(worker)
+                    reported = time.monotonic()
+        finally:
+            worker.close()
+        self.report(worker)
+
+    def report(self, worker):
+        stats = tasks.metrics()
+        counts = worker.counts
+        self.stdout.write(
+            f'{counts["done"]} done, {counts["retried"]} retried, {counts["failed"]} failed here; queue: '
+            f'{stats["due"]} due, {stats["queued"]} queued, {stats["running"]} running, '
+            f'oldest due {stats["oldest_due_seconds"]:.1f} s'
+        )
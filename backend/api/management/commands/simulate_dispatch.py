@@ -0,0 +1,124 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import dispatch
+from api.bench import temporary_database, seed, Timer
+from api.models import Order, Delivery
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate a steady stream of ready orders and riders finishing trips, '
+        'run dispatch rounds against it, and report assignment latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rate', type=int, default=3000, help='New deliveries per simulated minute.')
+        parser.add_argument('--minutes', type=float, default=2, help='Simulated minutes to run.')
+        parser.add_argument('--riders', type=int, default=2000)
+        parser.add_argument('--pincodes', type=int, default=20)
+        parser.add_argument('--tick', type=float, default=2.0,
+                            help='Simulated seconds between dispatch rounds.')
+        parser.add_argument('--service-time', type=float, default=30.0,
+                            help='Simulated seconds a rider needs to finish a delivery.')
+
+    def handle(self, *args, **options):
+        pincodes = [f'5{i:05d}' for i in range(options['pincodes'])]
+        with temporary_database():
+            data = seed(owners=50, tiffins_per_owner=2, customers=500, riders=options['riders'],
+                        orders=0, deliveries=False, pincodes=pincodes)
+            stats = self.simulate(data, options)
+
+        created, assigned = stats['created'], stats['assigned']
+        waits = Timer()
+        waits.samples = stats['waits']
+        rounds = stats['rounds']
+        wall = sum(rounds.samples)
+        self.stdout.write(f'Simulated {options["minutes"]} min at {options["rate"]} deliveries/min '
+                          f'with {options["riders"]} riders in {len(pincodes)} pincodes')
+        self.stdout.write(f'Deliveries created: {created}, assigned: {assigned}, '
+                          f'still pending: {created - assigned}')
+        summary = waits.summary()
+        self.stdout.write(
+            'Assignment latency (simulated s): '
+            f'p50 {summary["p50_ms"] / 1000:.1f}  p95 {summary["p95_ms"] / 1000:.1f}  '
+            f'p99 {summary["p99_ms"] / 1000:.1f}'
+        )
+        summary = rounds.summary()
+        self.stdout.write(
+            f'Dispatch rounds: {summary["count"]}, wall ms p50 {summary["p50_ms"]:.1f}  '
+            f'p95 {summary["p95_ms"]:.1f}  p99 {summary["p99_ms"]:.1f}'
+        )
+        if wall:
+            self.stdout.write(f'Matching throughput: {assigned / wall:.0f} assignments per wall-clock second')
+            self.stdout.write(f'Dispatch wall time per simulated minute: '
+                              f'{wall / options["minutes"]:.2f} s')
+
+    def simulate(self, data, options):
+        rng = random.Random(0)
+        tiffins = data.tiffins
+        customers = data.customers
+        per_tick = options['rate'] * options['tick'] / 60
+        carry = 0.0
+
+        created_at = {}       # delivery id -> simulated second it became pending
+        assigned_at = {}      # delivery id -> (simulated second, rider id)
+        waits = []
+        rounds = Timer()
+        clock = 0.0
+
+        while clock < options['minutes'] * 60:
+            clock += options['tick']
+
+            # Riders finish trips that have run for the service time.
+            finished = [
+                (delivery_id, rider_id) for delivery_id, (at, rider_id) in assigned_at.items()
+                if clock - at >= options['service_time']
+            ]
+            if finished:
+                Delivery.objects.filter(id__in=[d for d, _ in finished]).update(status='delivered')
+                for delivery_id, _ in finished:
+                    del assigned_at[delivery_id]
+
+            # New orders become ready for pickup.
+            carry += per_tick
+            count, carry = int(carry), carry - int(carry)
+            orders = []
+            for _ in range(count):
+                customer = rng.choice(customers)
+                tiffin = rng.choice(tiffins)
+                orders.append(Order(
+                    customer=customer, tiffin=tiffin, quantity=1, total_price=tiffin.price,
+                    status='ready_for_delivery', delivery_address=customer.address,
+                    delivery_pincode=customer.pincode,
+                ))
+            Order.objects.bulk_create(orders)
+            new = Delivery.objects.bulk_create([
+                Delivery(order=order, pickup_address='Kitchen', delivery_address=order.delivery_address)
+                for order in orders
+            ])
+            for delivery in new:
+                # Orders become ready at random points during the tick.
+                created_at[delivery.id] = clock - rng.random() * options['tick']
+
+            # Dispatch until a round leaves nothing it could still match. The
+            # wall-clock time spent dispatching counts towards the wait.
+            tick_started = time.perf_counter()
+            while True:
+                with rounds.measure():
+                    result = dispatch.run_round()
+                spent = time.perf_counter() - tick_started
+                for assignment in result.assigned:
+                    assigned_at[assignment.delivery_id] = (clock, assignment.rider_id)
+                    waits.append(clock - created_at[assignment.delivery_id] + spent)
+                if len(result.assigned) < dispatch.BATCH_SIZE:
+                    break
+
+        return {
+            'created': len(created_at),
+            'assigned': len(waits),
+            'waits': waits,
+            'rounds': rounds,
+        }
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import logging
+import random
+import resource
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import events
+from api.bench import temporary_database, seed
+from api.models import Order
+
+STATUSES = ['confirmed', 'preparing', 'picked_up', 'delivered']
+
+
+def make_scope(token):
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': '/api/events/',
+        'raw_path': b'/api/events/',
+        'root_path': '',
+        'query_string': f'token={token}'.encode(),
+        'headers': [(b'host', b'localhost')],
+        'client': ('127.0.0.1', 50000),
+        'server': ('localhost', 80),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Open thousands of idle /api/events/ streams against the ASGI application, '
+        'then drive real order status updates and measure how fast they fan out.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=2000,
+                            help='Number of concurrent event streams to open.')
+        parser.add_argument('--users', type=int, default=200,
+                            help='Customers the streams are spread across.')
+        parser.add_argument('--updates', type=int, default=200,
+                            help='Order status updates to publish while streams are open.')
+
+    def handle(self, *args, **options):
+        from core.asgi import application
+
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        with tempfile.TemporaryDirectory() as tmp:
+            with temporary_database(name=Path(tmp) / 'events.sqlite3'):
+                data = seed(owners=20, tiffins_per_owner=3, customers=options['users'],
+                            riders=5, orders=options['updates'], deliveries=False)
+                orders = list(Order.objects.select_related('tiffin__owner__user').order_by('id'))
+                stats = asyncio.run(self.run(application, data.customers, orders, options))
+
+        self.stdout.write(f'Streams opened:        {stats["connected"]} in {stats["connect_s"]:.2f} s')
+        self.stdout.write(f'Max RSS growth:        {stats["rss_kb"] / 1024:.1f} MiB '
+                          f'({stats["rss_kb"] * 1024 / max(stats["connected"], 1):.0f} B per stream)')
+        self.stdout.write(f'Updates published:     {stats["updates"]} in {stats["publish_s"]:.2f} s')
+        self.stdout.write(f'Events delivered:      {stats["delivered"]} of {stats["expected"]} expected')
+        if stats['latencies']:
+            latencies = sorted(stats['latencies'])
+            self.stdout.write(
+                'Update-to-event ms:    '
+                f'p50 {latencies[len(latencies) // 2] * 1000:.1f}  '
+                f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f}  '
+                f'max {latencies[-1] * 1000:.1f}  '
+                f'mean {statistics.fmean(latencies) * 1000:.1f}'
+            )
+        self.stdout.write(f'Subscribers left open: {stats["leaked"]}')
+
+        if stats['connected'] != options['subscribers']:
+            raise CommandError('Not every stream connected.')
+        if stats['delivered'] != stats['expected']:
+            raise CommandError('Some events were not delivered.')
+        if stats['leaked']:
+            raise CommandError('Subscriptions were not cleaned up after disconnect.')
+
+    async def run(self, application, customers, orders, options):
+        broker = events.get_broker()
+        tokens = {c.id: str(AccessToken.for_user(c)) for c in customers}
+        streams_per_user = {c.id: 0 for c in customers}
+
+        sent = {}
+        latencies = []
+        delivered = 0
+        connected = 0
+        all_connected = asyncio.Event()
+        disconnect = asyncio.Event()
+
+        async def stream(user_id):
+            body_sent = False
+
+            async def receive():
+                nonlocal body_sent
+                if not body_sent:
+                    body_sent = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                nonlocal delivered, connected
+                if message['type'] != 'http.response.body':
+                    return
+                chunk = message.get('body', b'').decode()
+                if chunk.startswith('retry:'):
+                    connected += 1
+                    if connected == options['subscribers']:
+                        all_connected.set()
+                    return
+                for line in chunk.splitlines():
+                    if line.startswith('data: '):
+                        payload = json.loads(line[6:])
+                        started = sent.get((payload['order'], payload['status']))
+                        if started is not None:
+                            latencies.append(time.perf_counter() - started)
+                        delivered += 1
+
+            await application(make_scope(tokens[user_id]), receive, send)
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        tasks = []
+        for i in range(options['subscribers']):
+            user_id = customers[i % len(customers)].id
+            streams_per_user[user_id] += 1
+            tasks.append(asyncio.create_task(stream(user_id)))
+        try:
+            await asyncio.wait_for(all_connected.wait(), timeout=120)
+        except asyncio.TimeoutError:
+            pass
+        connect_s = time.perf_counter() - start
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+        expected = sum(streams_per_user[order.customer_id] for order in orders)
+        publish_start = time.perf_counter()
+        await asyncio.to_thread(self.publish_updates, orders, sent)
+        publish_s = time.perf_counter() - publish_start
+
+        # Let the loop drain the last deliveries, then hang up every stream.
+        deadline = time.perf_counter() + 10
+        while delivered < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        disconnect.set()
+        await asyncio.wait(tasks, timeout=30)
+
+        return {
+            'connected': connected,
+            'connect_s': connect_s,
+            'rss_kb': rss_kb,
+            'updates': len(orders),
+            'publish_s': publish_s,
+            'delivered': delivered,
+            'expected': expected,
+            'latencies': latencies,
+            'leaked': broker.subscriber_count() if hasattr(broker, 'subscriber_count') else 0,
+        }
+
+    def publish_updates(self, orders, sent):
+        rng = random.Random(0)
+        try:
+            for order in orders:
+                client = APIClient()
+                client.force_authenticate(user=order.tiffin.owner.user)
+                new_status = rng.choice(STATUSES)
+                sent[(order.id, new_status)] = time.perf_counter()
+                client.post(f'/api/orders/{order.id}/update_status/', {'status': new_status}, format='json')
+        finally:
+            connections.close_all()
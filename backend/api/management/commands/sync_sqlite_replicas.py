@@ -0,0 +1,42 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the default SQLite database onto every replica in DATABASE_REPLICAS '
+        'with the online backup API, once or on an interval to mimic replication lag.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Seconds between copies; 0 copies once and exits.')
+
+    def handle(self, *args, **options):
+        primary = connections['default'].settings_dict
+        replicas = list(getattr(settings, 'DATABASE_REPLICAS', ()))
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Only SQLite primaries can be copied this way.')
+        if not replicas:
+            raise CommandError('No replicas configured; set HOMEEATS_SQLITE_REPLICAS.')
+
+        while True:
+            started = time.perf_counter()
+            source = sqlite3.connect(str(primary['NAME']))
+            try:
+                for alias in replicas:
+                    target = sqlite3.connect(str(connections[alias].settings_dict['NAME']))
+                    try:
+                        source.backup(target)
+                    finally:
+                        target.close()
+            finally:
+                source.close()
+            self.stdout.write(f'Copied to {", ".join(replicas)} in {time.perf_counter() - started:.2f} s')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from api import tasks
+
+
+def _ms(seconds):
+    return '-' if seconds is None else f'{seconds * 1000:.0f}'
+
+
+class Command(BaseCommand):
+    help = 'Print the background task queue depth, and per task how long recent tasks waited and ran.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=float, default=900,
+                            help='Seconds of finished tasks to compute latencies from.')
+        parser.add_argument('--prune', action='store_true',
+                            help='Also delete tasks that finished longer ago than TASK_KEEP_DONE_SECONDS.')
+
+    def handle(self, *args, **options):
+        stats = tasks.metrics(window_seconds=options['window'])
+        self.stdout.write(
+            f'queued {stats["queued"]} (due {stats["due"]}, oldest due {stats["oldest_due_seconds"]:.1f} s), '
+            f'running {stats["running"]}, failed {stats["failed"]}'
+        )
+        self.stdout.write(
+            f'{"task":<36}{"done":>7}{"failed":>8}{"wait p50":>10}{"wait p95":>10}{"run p50":>9}{"run p95":>9}'
+        )
+        for name, entry in stats['tasks'].items():
+            self.stdout.write(
+                f'{name:<36}{entry["done"]:>7}{entry["failed"]:>8}{_ms(entry["wait_p50"]):>10}'
+                f'{_ms(entry["wait_p95"]):>10}{_ms(entry["run_p50"]):>9}{_ms(entry["run_p95"]):>9}'
+            )
+        self.stdout.write('Latencies in ms: wait is from due to started, run from started to finished.')
+        if options['prune']:
+            self.stdout.write(self.style.SUCCESS(f'Deleted {tasks.prune()} finished tasks.'))
@@ -0,0 +1,68 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+
+def create_fts_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE api_tiffin_fts USING fts5("
+                "name, description, "
+                "tokenize = 'porter unicode61 remove_diacritics 2', "
+                "prefix = '2 3')"
+            )
+        except OperationalError:
+            # SQLite compiled without FTS5; api.search falls back to LIKE.
+            return
+        cursor.execute(
+            "INSERT INTO api_tiffin_fts (rowid, name, description) "
+            "SELECT id, name, description FROM api_tiffin"
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS api_tiffin_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_alter_order_status"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TiffinSearchIndex",
+            fields=[
+                (
+                    "tiffin",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_entry",
+                        serialize=False,
+                        to="api.tiffin",
+                    ),
+                ),
+                ("name", models.TextField()),
+                ("description", models.TextField()),
+                ("document", models.TextField(db_column="api_tiffin_fts")),
+                ("rank", models.FloatField()),
+            ],
+            options={
+                "db_table": "api_tiffin_fts",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_order_delivery_keyset_index"),
+        ("users", "0002_viewset_filter_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="delivery",
+            name="delivery_boy",
+            field=models.ForeignKey(
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="deliveries",
+                to="users.deliveryboy",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="delivery",
+            index=models.Index(
+                condition=models.Q(("delivery_boy__isnull", False)),
+                fields=["delivery_boy"],
+                name="api_delivery_assigned_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="delivery",
+            index=models.Index(
+                condition=models.Q(("delivery_boy__isnull", True)),
+                fields=["order"],
+                name="api_delivery_unassigned_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["customer", "created_at", "id"],
+                name="api_order_customer_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["delivery_pincode", "status"],
+                name="api_order_pincode_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tiffin",
+            index=models.Index(
+                fields=["owner", "is_available"], name="api_tiffin_owner_avail_idx"
+            ),
+        ),
+    ]
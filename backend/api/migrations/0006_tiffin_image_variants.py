@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_viewset_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tiffin",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:34
+
+import csv
+import math
+import os
+
+from django.conf import settings
+from django.db import migrations, models
+
+# A copy of the grid in api.geo as it was when this migration was written,
+# so later changes to that module cannot change what the migration does.
+CELL_DEGREES = getattr(settings, "GEO_GRID_CELL_DEGREES", 0.01)
+COLUMNS = math.ceil(360 / CELL_DEGREES)
+BUNDLED_PINCODES = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "pincodes.csv"
+)
+
+
+def cell_for(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    row = math.floor((latitude + 90) / CELL_DEGREES)
+    column = math.floor((longitude + 180) / CELL_DEGREES)
+    return row * COLUMNS + column
+
+
+def read_pincodes(path):
+    with open(path, newline="", encoding="utf-8") as handle:
+        for row in csv.DictReader(handle):
+            code = (row.get("pincode") or "").strip()
+            try:
+                latitude, longitude = float(row["latitude"]), float(row["longitude"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if len(code) == 6 and code.isdigit():
+                yield code, (row.get("name") or "").strip()[:100], latitude, longitude
+
+
+def load_bundled_pincodes(apps, schema_editor):
+    Pincode = apps.get_model("api", "Pincode")
+    TiffinOwner = apps.get_model("users", "TiffinOwner")
+    centres = {}
+    for code, name, latitude, longitude in read_pincodes(BUNDLED_PINCODES):
+        centres[code] = Pincode(
+            code=code, name=name, latitude=latitude, longitude=longitude
+        )
+    Pincode.objects.bulk_create(centres.values(), batch_size=1000)
+
+    changed = []
+    for owner in TiffinOwner.objects.only(
+        "id", "business_pincode", "latitude", "longitude", "geo_cell"
+    ):
+        if owner.latitude is None or owner.longitude is None:
+            centre = centres.get(owner.business_pincode)
+            if centre is not None:
+                owner.latitude, owner.longitude = centre.latitude, centre.longitude
+        owner.geo_cell = cell_for(owner.latitude, owner.longitude)
+        changed.append(owner)
+    TiffinOwner.objects.bulk_update(
+        changed, ["latitude", "longitude", "geo_cell"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_sales_rollup"),
+        ("users", "0003_tiffinowner_location"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Pincode",
+            fields=[
+                (
+                    "code",
+                    models.CharField(max_length=6, primary_key=True, serialize=False),
+                ),
+                ("name", models.CharField(blank=True, max_length=100)),
+                ("latitude", models.FloatField()),
+                ("longitude", models.FloatField()),
+            ],
+        ),
+        migrations.RunPython(load_bundled_pincodes, migrations.RunPython.noop),
+    ]
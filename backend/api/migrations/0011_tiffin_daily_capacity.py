@@ -0,0 +1,67 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:05
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_task"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tiffin",
+            name="capacity_shards",
+            field=models.PositiveSmallIntegerField(
+                default=1,
+                validators=[
+                    django.core.validators.MinValueValidator(1),
+                    django.core.validators.MaxValueValidator(64),
+                ],
+            ),
+        ),
+        migrations.AddField(
+            model_name="tiffin",
+            name="daily_capacity",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="tiffin",
+            name="sold_out_on",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name="TiffinStock",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("shard", models.PositiveSmallIntegerField()),
+                ("remaining", models.IntegerField()),
+                (
+                    "tiffin",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock",
+                        to="api.tiffin",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="tiffinstock",
+            constraint=models.UniqueConstraint(
+                fields=("tiffin", "day", "shard"), name="api_tiffinstock_key"
+            ),
+        ),
+    ]
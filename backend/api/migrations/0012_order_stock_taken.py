@@ -0,0 +1,48 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:28
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def record_stock_taken(apps, schema_editor):
+    # Orders placed since 0011 on a day their tiffin had stock counters for
+    # took their quantity from them.
+    Order = apps.get_model("api", "Order")
+    TiffinStock = apps.get_model("api", "TiffinStock")
+    opened = set(TiffinStock.objects.values_list("tiffin_id", "day").distinct())
+    if not opened:
+        return
+    tz = timezone.get_default_timezone()
+    first_day = min(day for _, day in opened)
+    holding = []
+    for order in (
+        Order.objects.filter(tiffin__daily_capacity__isnull=False, created_at__date__gte=first_day)
+        .exclude(status="cancelled")
+        .only("id", "tiffin_id", "quantity", "created_at")
+    ):
+        day = timezone.localdate(order.created_at, tz)
+        if (order.tiffin_id, day) in opened:
+            order.stock_day, order.stock_taken = day, order.quantity
+            holding.append(order)
+    Order.objects.bulk_update(holding, ["stock_day", "stock_taken"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_tiffin_daily_capacity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="stock_day",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="stock_taken",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(record_stock_taken, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_order_stock_taken"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ConditionalCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("view", models.CharField(max_length=100)),
+                (
+                    "outcome",
+                    models.CharField(
+                        choices=[
+                            ("hit", "Hit"),
+                            ("miss", "Miss"),
+                            ("unconditional", "Unconditional"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("count", models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="conditionalcount",
+            constraint=models.UniqueConstraint(
+                fields=("view", "outcome"), name="api_conditionalcount_key"
+            ),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from users.models import User, TiffinOwner, DeliveryBoy
 
@@ -8,12 +9,73 @@ class Tiffin(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     is_available = models.BooleanField(default=True)
     image = models.ImageField(upload_to='tiffins/', blank=True, null=True)
+    # Resized copies of ``image``, filled in by ``api.images``.
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Orders the kitchen can cook per day; None for no limit. See ``api.stock``.
+    daily_capacity = models.PositiveIntegerField(null=True, blank=True)
+    # Counter rows the day's capacity is split over; more shards let more
+    # orders for a popular tiffin be placed at the same time.
+    capacity_shards = models.PositiveSmallIntegerField(
+        default=1, validators=[MinValueValidator(1), MaxValueValidator(64)])
+    # The day the tiffin sold out and was made unavailable, until it restocks.
+    sold_out_on = models.DateField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+
+    class Meta:
+        indexes = [
+            # Public catalog: available tiffins of the kitchens in a pincode.
+            models.Index(fields=['owner', 'is_available'], name='api_tiffin_owner_avail_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.owner.business_name}"
 
+class Pincode(models.Model):
+    """Approximate centre of a postal pincode, used to place kitchens and customers."""
+    code = models.CharField(max_length=6, primary_key=True)
+    name = models.CharField(max_length=100, blank=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    def __str__(self):
+        return f"{self.code} {self.name}".strip()
+
+class TiffinStock(models.Model):
+    """
+    What is left of a tiffin's daily capacity on one day, split over
+    ``Tiffin.capacity_shards`` rows. Maintained by ``api.stock``.
+    """
+    tiffin = models.ForeignKey(Tiffin, on_delete=models.CASCADE, related_name='stock')
+    day = models.DateField()
+    shard = models.PositiveSmallIntegerField()
+    remaining = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tiffin', 'day', 'shard'], name='api_tiffinstock_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.tiffin_id} {self.day} #{self.shard}: {self.remaining}"
+
+class TiffinSearchIndex(models.Model):
+    """
+    Read-only mapping of the ``api_tiffin_fts`` FTS5 table. ``document`` maps
+    to the table-named hidden column that ``MATCH`` is applied to, and
+    ``rank`` is the bm25 score of the current match. See ``api.search``.
+    """
+    tiffin = models.OneToOneField(Tiffin, on_delete=models.DO_NOTHING, primary_key=True,
+                                  db_column='rowid', related_name='search_entry')
+    name = models.TextField()
+    description = models.TextField()
+    document = models.TextField(db_column='api_tiffin_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'api_tiffin_fts'
+
 class Order(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -33,9 +95,25 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     delivery_address = models.TextField()
     delivery_pincode = models.CharField(max_length=6)
+    # Portions this order holds of its tiffin's daily capacity, and the day
+    # they count against (see api.stock). Cancelling gives them back.
+    stock_day = models.DateField(null=True, blank=True, editable=False)
+    stock_taken = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Keyset pagination order, see api.pagination.KeysetPagination.
+            models.Index(fields=['created_at', 'id'], name='api_order_created_id_idx'),
+            # A customer's order history, newest first.
+            models.Index(fields=['customer', 'created_at', 'id'], name='api_order_customer_created_idx'),
+            # Delivery partners: orders ready in their pincode.
+            models.Index(fields=['delivery_pincode', 'status'], name='api_order_pincode_status_idx'),
+            # Changes feed, see api.sync.
+            models.Index(fields=['updated_at', 'id'], name='api_order_updated_id_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} - {self.customer.username}"
     
@@ -54,12 +132,117 @@ class Delivery(models.Model):
     )
     
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='delivery')
-    delivery_boy = models.ForeignKey(DeliveryBoy, on_delete=models.SET_NULL, null=True, related_name='deliveries')
+    # Indexed through the two partial indexes in Meta instead of a plain FK index.
+    delivery_boy = models.ForeignKey(DeliveryBoy, on_delete=models.SET_NULL, null=True, related_name='deliveries',
+                                     db_index=False)
     pickup_address = models.TextField()
     delivery_address = models.TextField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='api_delivery_created_id_idx'),
+            # Changes feed, see api.sync.
+            models.Index(fields=['updated_at', 'id'], name='api_delivery_updated_id_idx'),
+            # A rider's own deliveries.
+            models.Index(fields=['delivery_boy'], condition=models.Q(delivery_boy__isnull=False),
+                         name='api_delivery_assigned_idx'),
+            # Unassigned deliveries, looked up per order once the rider's
+            # pincode has narrowed the orders down. Keeping NULLs out of the
+            # delivery_boy index stops SQLite from scanning every unassigned
+            # row across all pincodes instead.
+            models.Index(fields=['order'], condition=models.Q(delivery_boy__isnull=True),
+                         name='api_delivery_unassigned_idx'),
+        ]
+
+    def __str__(self):
+        return f"Delivery #{self.id} - Order #{self.order.id}"
+
+
+class SalesRollup(models.Model):
+    """
+    Running totals of orders per owner, tiffin, day and status, maintained by
+    ``api.rollups`` as orders are created, change status or are deleted.
+    """
+    owner = models.ForeignKey(TiffinOwner, on_delete=models.CASCADE, related_name='sales_rollups')
+    tiffin = models.ForeignKey(Tiffin, on_delete=models.CASCADE, related_name='sales_rollups')
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'tiffin', 'day', 'status'], name='api_salesrollup_key'),
+        ]
+        indexes = [
+            # Dashboard range queries for one owner.
+            models.Index(fields=['owner', 'day'], name='api_salesrollup_owner_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tiffin_id} {self.day} {self.status}: {self.order_count}"
+
+
+class Task(models.Model):
+    """
+    A background job queued by ``api.tasks.enqueue`` and run by the
+    ``run_tasks`` workers.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # When the task is due: enqueue time, or the next retry.
+    run_at = models.DateTimeField()
+    # The worker running the task, and when its claim lapses if it dies.
+    claimed_by = models.CharField(max_length=64, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers: the due tasks, oldest first.
+            models.Index(fields=['status', 'run_at'], name='api_task_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"Task #{self.id} {self.name} ({self.status})"
+
+
+class ConditionalCount(models.Model):
+    """
+    How many conditional GETs one view action answered with each outcome,
+    summed over every process by ``api.conditional``.
+    """
+    OUTCOME_CHOICES = (
+        ('hit', 'Hit'),
+        ('miss', 'Miss'),
+        ('unconditional', 'Unconditional'),
+    )
+
+    view = models.CharField(max_length=100)
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES)
+    count = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['view', 'outcome'], name='api_conditionalcount_key'),
+        ]
+
     def __str__(self):
-        return f"Delivery #{self.id} - Order #{self.order.id}" 
\ No newline at end of file
+        return f"{self.view} {self.outcome}: {self.count}"
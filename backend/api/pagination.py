@@ -0,0 +1,165 @@
+"""
+Keyset pagination for order and delivery history.
+
+``PageNumberPagination`` runs a ``COUNT(*)`` and an ``OFFSET`` scan for every
+page, both of which grow with the size of the history. ``KeysetPagination``
+instead orders on ``(created_at, id)`` newest first and seeks past the last
+row of the previous page with an index range scan, so every page costs the
+same. Clients opt in with ``?pagination=cursor`` (or by following a link that
+already carries ``?cursor=``); without it ``OptInKeysetPagination`` behaves
+exactly like the global page-number pagination.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CountedPageNumberPagination(PageNumberPagination):
+    """
+    Page numbers, without a ``COUNT(*)`` when the view has already counted the
+    rows (``validated_count``, see ``api.conditional``).
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.known_count = getattr(view, 'validated_count', None)
+        return super().paginate_queryset(queryset, request, view=view)
+
+    def django_paginator_class(self, queryset, page_size):
+        paginator = Paginator(queryset, page_size)
+        if self.known_count is not None:
+            paginator.count = self.known_count
+        return paginator
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = _('Invalid cursor')
+
+    def __init__(self, page_size=None):
+        self.page_size = page_size or api_settings.PAGE_SIZE
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            return datetime.fromisoformat(payload['c']), int(payload['i']), bool(payload.get('r'))
+        except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, reverse):
+        if isinstance(obj, dict):
+            # A row from a .values() queryset (see api.fast_serializers).
+            payload = {'c': obj['created_at'].isoformat(), 'i': obj['id']}
+        else:
+            payload = {'c': obj.created_at.isoformat(), 'i': obj.pk}
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode())
+        url = remove_query_param(self.base_url, 'page')
+        return replace_query_param(url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        if cursor is None:
+            created_at, pk, reverse = None, None, False
+            queryset = queryset.order_by('-created_at', '-id')
+        else:
+            created_at, pk, reverse = cursor
+            if reverse:
+                # Walking back towards newer rows: (created_at, id) > cursor.
+                queryset = queryset.filter(
+                    Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(id__gt=pk))
+                ).order_by('created_at', 'id')
+            else:
+                # (created_at, id) < cursor, written so the created_at range
+                # can seek the index.
+                queryset = queryset.filter(
+                    Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=pk))
+                ).order_by('-created_at', '-id')
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_link = None
+        self.previous_link = None
+        if rows:
+            if has_more or reverse:
+                self.next_link = self.encode_cursor(rows[-1], reverse=False)
+            if cursor is not None and (has_more or not reverse):
+                self.previous_link = self.encode_cursor(rows[0], reverse=True)
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.next_link,
+            'previous': self.previous_link,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class OptInKeysetPagination(BasePagination):
+    """
+    Page numbers by default, keyset pagination when the request asks for it
+    with ``?pagination=cursor`` or carries a ``cursor``.
+    """
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.page_number = CountedPageNumberPagination()
+        self.keyset = KeysetPagination()
+        self.active = self.page_number
+
+    def wants_keyset(self, request):
+        params = request.query_params
+        return (params.get(self.mode_query_param) == 'cursor'
+                or self.keyset.cursor_query_param in params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.active = self.keyset if self.wants_keyset(request) else self.page_number
+        return self.active.paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        return self.active.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number.get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return self.page_number.get_schema_operation_parameters(view)
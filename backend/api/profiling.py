@@ -0,0 +1,323 @@
+"""
+Per-request timings and stack sampling for slow requests.
+
+``ServerTimingMiddleware`` records, for every request:
+
+* ``sql``: number and total time of the queries run, on any connection
+  (including replicas and the threads ``sync_to_async`` hands work to),
+* ``auth``: time spent authenticating the JWT,
+* ``serialize``: time spent in serializers' ``to_representation`` and the
+  fast ``.values()`` serializers,
+* ``view``: time in the view itself, ``render`` the time to render the
+  response, ``compress`` the time to compress it, and ``total`` the time
+  through the middleware.
+
+Phases overlap: a query run while serializing counts towards both ``sql``
+and ``serialize``. The timings go out in a ``Server-Timing`` header, tagged
+with the viewset and action (``TiffinViewSet.list``), and to the
+``api.profiling`` logger.
+
+With ``REQUEST_PROFILE_THRESHOLD_MS`` set, a background thread samples the
+stack of every sync request in flight every
+``REQUEST_PROFILE_INTERVAL_MS``. Requests slower than the threshold have
+their samples written to ``REQUEST_PROFILE_DIR`` as a folded-stack file
+(open it with speedscope or ``flamegraph.pl``) next to a JSON file with the
+request's timings. Faster requests drop theirs. Only the newest
+``REQUEST_PROFILE_KEEP`` profiles are kept; older ones are deleted as new
+ones are written.
+
+Both are on by default only with ``DEBUG``: the header tells clients how
+the server spends its time, and the sampler costs every request a little.
+"""
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, 'SERVER_TIMING', settings.DEBUG)
+PROFILE_THRESHOLD_MS = getattr(settings, 'REQUEST_PROFILE_THRESHOLD_MS', None)
+PROFILE_INTERVAL_MS = getattr(settings, 'REQUEST_PROFILE_INTERVAL_MS', 5)
+PROFILE_DIR = getattr(settings, 'REQUEST_PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+PROFILE_KEEP = getattr(settings, 'REQUEST_PROFILE_KEEP', 100)
+PROFILE_SUFFIXES = ('.folded', '.json')
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self, request):
+        self.method = request.method
+        self.path = request.path
+        self.tag = None
+        self.started = time.perf_counter()
+        self.phases = dict.fromkeys(('auth', 'serialize', 'sql', 'view', 'render', 'compress'), 0.0)
+        self.queries = 0
+        self.open = set()
+        self.view_started = None
+        self.samples = Counter()
+
+    def add(self, phase, seconds):
+        self.phases[phase] += seconds
+
+    def as_dict(self, total):
+        return {
+            'method': self.method,
+            'path': self.path,
+            'view': self.tag,
+            'total_ms': round(total * 1000, 2),
+            'queries': self.queries,
+            **{f'{phase}_ms': round(seconds * 1000, 2) for phase, seconds in self.phases.items()},
+        }
+
+    def header(self, total):
+        entries = [
+            f'sql;dur={self.phases["sql"] * 1000:.2f};desc="{self.queries} queries"',
+            f'auth;dur={self.phases["auth"] * 1000:.2f}',
+            f'serialize;dur={self.phases["serialize"] * 1000:.2f}',
+        ]
+        view = f'view;dur={self.phases["view"] * 1000:.2f}'
+        if self.tag:
+            view += f';desc="{self.tag}"'
+        entries.append(view)
+        entries.append(f'render;dur={self.phases["render"] * 1000:.2f}')
+        entries.append(f'compress;dur={self.phases["compress"] * 1000:.2f}')
+        entries.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(entries)
+
+
+@contextmanager
+def timed(phase):
+    """
+    Add the time spent in the block to ``phase`` of the current request.
+    Nested blocks for the same phase count once.
+    """
+    timings = _current.get()
+    if timings is None or phase in timings.open:
+        yield
+        return
+    timings.open.add(phase)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+        timings.open.discard(phase)
+
+
+def record_queries(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.add('sql', time.perf_counter() - started)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # Connected to connection_created; the wrapper list outlives reconnects.
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
+
+
+class TimedSerializerMixin:
+    """Count ``to_representation`` towards the request's ``serialize`` phase."""
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+
+def _view_tag(view_func, method):
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__qualname__', None)
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower())
+    if action is None:
+        return cls.__name__
+    return f'{cls.__name__}.{action}'
+
+
+class StackSampler:
+    """Samples the stacks of the threads serving requests."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.active = {}
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def register(self, timings):
+        with self.lock:
+            self.active[threading.get_ident()] = timings
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='request-profiler', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def unregister(self):
+        with self.lock:
+            self.active.pop(threading.get_ident(), None)
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            time.sleep(self.interval)
+            with self.lock:
+                active = list(self.active.items())
+                if not self.active:
+                    self.wakeup.clear()
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for ident, timings in active:
+                frame = frames.get(ident)
+                if frame is not None:
+                    timings.samples[_fold(frame)] += 1
+
+
+def _fold(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_qualname} ({_short_path(code.co_filename)})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _short_path(filename):
+    for prefix in (str(settings.BASE_DIR), *sys.path):
+        if prefix and filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1:]
+    return filename
+
+
+def write_profile(timings, total):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%S.%f')
+    name = f'{stamp}-{timings.tag or "request"}-{round(total * 1000)}ms'
+    base = os.path.join(PROFILE_DIR, name)
+    with open(f'{base}.folded', 'w') as out:
+        for stack, count in timings.samples.most_common():
+            out.write(f'{stack} {count}\n')
+    with open(f'{base}.json', 'w') as out:
+        json.dump({**timings.as_dict(total), 'samples': sum(timings.samples.values()),
+                   'interval_ms': _sampler.interval * 1000}, out, indent=2)
+    prune_profiles()
+    return base
+
+
+def prune_profiles():
+    """Delete all but the newest ``PROFILE_KEEP`` profiles."""
+    # Names start with their timestamp, so they sort oldest first.
+    names = sorted({
+        name for name, suffix in map(os.path.splitext, os.listdir(PROFILE_DIR))
+        if suffix in PROFILE_SUFFIXES
+    })
+    for name in names[:max(len(names) - PROFILE_KEEP, 0)]:
+        for suffix in PROFILE_SUFFIXES:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name + suffix))
+            except FileNotFoundError:
+                # Another process pruned it first.
+                pass
+
+
+_sampler = StackSampler(PROFILE_INTERVAL_MS / 1000) if PROFILE_THRESHOLD_MS is not None else None
+
+
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            # The hooks only read the clock; Django would run sync ones in a thread.
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not ENABLED:
+            return self.get_response(request)
+        timings = RequestTimings(request)
+        token = _current.set(timings)
+        if _sampler is not None:
+            _sampler.register(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            if _sampler is not None:
+                _sampler.unregister()
+            _current.reset(token)
+        return self.finish(timings, response)
+
+    async def __acall__(self, request):
+        # Stacks are only sampled for sync requests: an event loop thread
+        # serves many requests at once.
+        if not ENABLED:
+            return await self.get_response(request)
+        timings = RequestTimings(request)
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(timings, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = _current.get()
+        if timings is not None:
+            timings.tag = _view_tag(view_func, request.method)
+            timings.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Runs once the view has returned, right before the response renders.
+        timings = _current.get()
+        if timings is not None and timings.view_started is not None:
+            rendering = time.perf_counter()
+            timings.add('view', rendering - timings.view_started)
+            response.add_post_render_callback(lambda r: timings.add('render', time.perf_counter() - rendering))
+        return response
+
+    async def aprocess_view(self, *args):
+        return ServerTimingMiddleware.process_view(self, *args)
+
+    async def aprocess_template_response(self, *args):
+        return ServerTimingMiddleware.process_template_response(self, *args)
+
+    def finish(self, timings, response):
+        total = time.perf_counter() - timings.started
+        if timings.view_started is not None and not timings.phases['view']:
+            # Plain responses skip process_template_response.
+            timings.add('view', total - (timings.view_started - timings.started))
+        response['Server-Timing'] = timings.header(total)
+        logger.debug('%s %s %s', timings.tag or timings.path, response.status_code, timings.header(total))
+        if PROFILE_THRESHOLD_MS is not None and total * 1000 >= PROFILE_THRESHOLD_MS and timings.samples:
+            try:
+                path = write_profile(timings, total)
+            except OSError:
+                logger.exception('Could not write the profile of %s %s', timings.method, timings.path)
+            else:
+                logger.warning('Slow request %s %s (%s) took %.0f ms; profile in %s',
+                               timings.method, timings.path, timings.tag, total * 1000, path)
+        return response
@@ -0,0 +1,61 @@
+"""
+JSON rendering and parsing through orjson.
+
+``FastJSONRenderer`` and ``FastJSONParser`` replace DRF's ``JSONRenderer`` and
+``JSONParser`` in ``REST_FRAMEWORK``. They produce and accept the same JSON as
+DRF's classes with the default ``COMPACT_JSON``, ``UNICODE_JSON`` and
+``STRICT_JSON`` settings. Dates, times and anything else orjson does not
+handle natively go through DRF's ``JSONEncoder``, so they render exactly
+as before.
+
+The stdlib ``json`` module is used instead when ``FAST_JSON`` is off, when
+orjson is not installed, for indented output (the browsable API) and for
+anything orjson rejects, such as integers wider than 64 bits.
+"""
+import codecs
+
+from django.conf import settings
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ENABLED = getattr(settings, 'FAST_JSON', True) and orjson is not None
+
+_encoder = JSONEncoder()
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    # Datetimes go to DRF's encoder, which trims microseconds and writes 'Z'.
+    options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            not ENABLED or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_encoder.default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escape U+2028 and U+2029 like DRF, so the output stays valid JavaScript.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastJSONParser(parsers.JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if not ENABLED or not self.strict or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,272 @@
+"""
+Sales rollups for owner dashboards.
+
+``SalesRollup`` keeps one row of running totals (orders, items, revenue) per
+owner, tiffin, day and status. Every order counts once, in the row for its
+current status and the day it was placed (in ``TIME_ZONE``).
+
+Rows are maintained as orders are written, in the same transaction:
+
+* ``Order`` saves and deletes through the ORM are picked up by signals;
+  ``order_pre_save`` reads the stored status so a change moves the order
+  from one row to the other. The signals write in whatever transaction the
+  save runs in, so ``OrderViewSet`` saves orders through ``save_order``,
+  which also locks the stored row before reading it (or inside its own
+  ``transaction.atomic()`` for inserts), and Django's admin
+  and ``delete()`` wrap theirs. A save in autocommit mode elsewhere updates
+  the rollups in a transaction of their own, right after the order.
+* ``bulk_create`` and ``update()`` skip signals, so ``OrderViewSet.batch``,
+  ``update_status`` and ``bulk_update_status`` call ``orders_created`` and
+  ``statuses_changed`` themselves, in their transaction.
+
+Additions are upserts. Removals are plain ``UPDATE``s, so removing an order
+whose row has already gone (for example when its tiffin is deleted and the
+rollups cascade) does nothing. ``rebuild`` recomputes everything from the
+orders table.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .db import lock_rows
+from .models import Order, SalesRollup, Tiffin
+
+REVENUE_EXCLUDED_STATUSES = ('cancelled',)
+
+
+def order_day(created_at):
+    return timezone.localdate(created_at, timezone.get_default_timezone())
+
+
+class Deltas:
+    """Accumulates ``(orders, quantity, revenue)`` changes per rollup key."""
+
+    def __init__(self):
+        self.items = defaultdict(lambda: [0, 0, Decimal('0')])
+
+    def add(self, owner_id, tiffin_id, day, status, orders, quantity, revenue):
+        entry = self.items[(owner_id, tiffin_id, day, status)]
+        entry[0] += orders
+        entry[1] += quantity
+        entry[2] += revenue
+
+    def add_order(self, owner_id, tiffin_id, created_at, status, quantity, total_price, sign=1):
+        self.add(owner_id, tiffin_id, order_day(created_at), status, sign, sign * quantity, sign * total_price)
+
+    def apply(self):
+        # Rows only gain orders through upserts; everything else (removals,
+        # or a quantity edit that keeps the order in its row) updates in place.
+        increments = [(key, value) for key, value in self.items.items() if value[0] > 0]
+        updates = [(key, value) for key, value in self.items.items() if value[0] <= 0 and any(value)]
+        # No savepoint: inside the order's transaction a failure rolls back
+        # the order too.
+        with transaction.atomic(savepoint=False):
+            _upsert(increments)
+            for (owner_id, tiffin_id, day, status), (orders, quantity, revenue) in updates:
+                SalesRollup.objects.filter(owner_id=owner_id, tiffin_id=tiffin_id, day=day, status=status).update(
+                    order_count=F('order_count') + orders,
+                    quantity=F('quantity') + quantity,
+                    revenue=F('revenue') + revenue,
+                )
+        self.items.clear()
+
+
+def _upsert(entries, batch_size=200):
+    """Add to the given rollup rows, creating those that do not exist yet."""
+    if not entries:
+        return
+    table = connection.ops.quote_name(SalesRollup._meta.db_table)
+    day_field = SalesRollup._meta.get_field('day')
+    revenue_field = SalesRollup._meta.get_field('revenue')
+    columns = ('owner_id', 'tiffin_id', 'day', 'status', 'order_count', 'quantity', 'revenue')
+    key = ', '.join(columns[:4])
+    counters = ', '.join(f'{column} = {table}.{column} + excluded.{column}' for column in columns[4:])
+    with connection.cursor() as cursor:
+        for start in range(0, len(entries), batch_size):
+            chunk = entries[start:start + batch_size]
+            placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(chunk))
+            params = []
+            for (owner_id, tiffin_id, day, status), (orders, quantity, revenue) in chunk:
+                params.extend([
+                    owner_id, tiffin_id, day_field.get_db_prep_value(day, connection), status, orders, quantity,
+                    revenue_field.get_db_prep_value(revenue, connection),
+                ])
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(columns)}) VALUES {placeholders} '
+                f'ON CONFLICT ({key}) DO UPDATE SET {counters}',
+                params,
+            )
+
+
+def _owner_id(order):
+    if Order.tiffin.is_cached(order):
+        return order.tiffin.owner_id
+    return Tiffin.objects.filter(pk=order.tiffin_id).values_list('owner_id', flat=True).first()
+
+
+def orders_created(orders):
+    """Count orders inserted with ``bulk_create``; their tiffins must be loaded."""
+    deltas = Deltas()
+    for order in orders:
+        deltas.add_order(order.tiffin.owner_id, order.tiffin_id, order.created_at, order.status,
+                         order.quantity, order.total_price)
+    deltas.apply()
+
+
+def statuses_changed(rows, new_status):
+    """
+    Move orders changed with ``update()`` to ``new_status``. ``rows`` are
+    ``(owner_id, tiffin_id, created_at, old_status, quantity, total_price)``.
+    """
+    deltas = Deltas()
+    for owner_id, tiffin_id, created_at, old_status, quantity, total_price in rows:
+        if old_status == new_status:
+            continue
+        deltas.add_order(owner_id, tiffin_id, created_at, old_status, quantity, total_price, sign=-1)
+        deltas.add_order(owner_id, tiffin_id, created_at, new_status, quantity, total_price)
+    deltas.apply()
+
+
+def rebuild(chunk_size=5000, stdout=None):
+    """
+    Recompute every rollup from the orders table, reading orders in id
+    ranges of ``chunk_size``. Runs in one transaction so dashboards never see
+    a half-built table.
+    """
+    tz = timezone.get_default_timezone()
+    with transaction.atomic():
+        SalesRollup.objects.all().delete()
+        bounds = Order.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        total = 0
+        for start in range(0, bounds, chunk_size):
+            deltas = Deltas()
+            rows = (
+                Order.objects.filter(id__gt=start, id__lte=start + chunk_size)
+                .annotate(day=TruncDate('created_at', tzinfo=tz))
+                .values('tiffin__owner_id', 'tiffin_id', 'day', 'status')
+                .annotate(orders=Count('id'), items=Sum('quantity'), revenue=Sum('total_price'))
+                .order_by()
+            )
+            for row in rows:
+                deltas.add(row['tiffin__owner_id'], row['tiffin_id'], row['day'], row['status'],
+                           row['orders'], row['items'], row['revenue'])
+                total += row['orders']
+            deltas.apply()
+            if stdout is not None:
+                stdout.write(f'Rolled up orders {start + 1}-{min(start + chunk_size, bounds)}')
+    return total
+
+
+def dashboard(owner_id, start, end, top=5):
+    """
+    Sales of one owner for the days ``start`` to ``end`` inclusive: totals,
+    orders per status, a per-day series and the best-selling tiffins.
+    Revenue and the series leave out ``REVENUE_EXCLUDED_STATUSES``.
+    """
+    rows = SalesRollup.objects.filter(owner_id=owner_id, day__gte=start, day__lte=end)
+    sold = rows.exclude(status__in=REVENUE_EXCLUDED_STATUSES)
+    sums = {'orders': Sum('order_count'), 'quantity': Sum('quantity'), 'revenue': Sum('revenue')}
+
+    by_status = {
+        row['status']: row['orders']
+        for row in rows.values('status').annotate(orders=Sum('order_count')).order_by('status')
+        if row['orders']
+    }
+    days = [
+        _totals(row, day=row['day'])
+        for row in sold.values('day').annotate(**sums).order_by('day')
+        if row['orders']
+    ]
+    top_dishes = [
+        _totals(row, tiffin=row['tiffin_id'], name=row['tiffin__name'])
+        for row in sold.values('tiffin_id', 'tiffin__name').annotate(**sums)
+        .filter(orders__gt=0).order_by('-revenue', '-quantity', 'tiffin_id')[:top]
+    ]
+    totals = {
+        'orders': sum(day['orders'] for day in days),
+        'quantity': sum(day['quantity'] for day in days),
+        'revenue': _money(sum((Decimal(day['revenue']) for day in days), Decimal('0'))),
+    }
+    return {
+        'start': start,
+        'end': end,
+        'totals': totals,
+        'by_status': by_status,
+        'days': days,
+        'top_dishes': top_dishes,
+    }
+
+
+def _totals(row, **extra):
+    return {
+        **extra,
+        'orders': row['orders'],
+        'quantity': row['quantity'],
+        'revenue': _money(row['revenue']),
+    }
+
+
+def _money(value):
+    # Rendered as a string, like the serializers' DecimalFields.
+    return f"{Decimal(value).quantize(Decimal('0.01')):f}"
+
+
+def save_order(order, save=None):
+    """
+    Save ``order`` and its rollup rows in one transaction. ``save`` does the
+    writing (default ``order.save``); pass a serializer's ``save``, or a
+    function that also makes the writes that go with the order. The stored
+    row is locked before it is read (see ``db.lock_rows``), so a concurrent
+    save of the same order cannot move the rollups from the same row twice.
+    """
+    with transaction.atomic():
+        order._rollup_previous = None
+        if order.pk is not None:
+            order._rollup_previous = _stored(lock_rows(Order.objects.filter(pk=order.pk)))
+        order._rollup_read = True
+        try:
+            return (save or order.save)()
+        finally:
+            order.__dict__.pop('_rollup_read', None)
+
+
+def _stored(queryset):
+    return queryset.values_list(
+        'tiffin__owner_id', 'tiffin_id', 'created_at', 'status', 'quantity', 'total_price',
+    ).first()
+
+
+def order_pre_save(sender, instance, raw=False, **kwargs):
+    if instance.__dict__.pop('_rollup_read', False):
+        # save_order() has read the stored row already.
+        return
+    if raw or instance._state.adding or instance.pk is None:
+        instance._rollup_previous = None
+        return
+    instance._rollup_previous = _stored(Order.objects.filter(pk=instance.pk))
+
+
+def order_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    current = (instance.tiffin_id, instance.status, instance.quantity, Decimal(instance.total_price))
+    if previous is not None and (previous[1], previous[3], previous[4], previous[5]) == current:
+        return
+    deltas = Deltas()
+    if previous is not None:
+        deltas.add_order(*previous, sign=-1)
+    deltas.add_order(_owner_id(instance), instance.tiffin_id, instance.created_at, instance.status,
+                     instance.quantity, Decimal(instance.total_price))
+    deltas.apply()
+
+
+def order_deleted(sender, instance, **kwargs):
+    deltas = Deltas()
+    deltas.add_order(_owner_id(instance), instance.tiffin_id, instance.created_at, instance.status,
+                     instance.quantity, Decimal(instance.total_price), sign=-1)
+    deltas.apply()
@@ -0,0 +1,113 @@
+"""
+Full-text search over tiffin names and descriptions.
+
+On SQLite builds with FTS5 the ``api_tiffin_fts`` virtual table (created by
+migration ``0003``) holds one row per tiffin, keyed by the tiffin id. The
+index is kept current by the ``post_save``/``post_delete`` handlers below,
+and results are ranked with FTS5's built-in bm25 ``rank`` column. When the
+table is missing (another database backend, or SQLite without FTS5) search
+falls back to the old ``icontains`` filter.
+"""
+import re
+
+from django.db import connections, models
+
+from .models import Tiffin, TiffinSearchIndex
+
+INDEX_TABLE = TiffinSearchIndex._meta.db_table
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# (alias, database name) pairs for which we already looked up whether the
+# index table exists.
+_available = {}
+
+
+@TiffinSearchIndex._meta.get_field('document').register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+def is_available(using='default'):
+    connection = connections[using]
+    key = (using, str(connection.settings_dict['NAME']))
+    if key not in _available:
+        _available[key] = (
+            connection.vendor == 'sqlite'
+            and INDEX_TABLE in connection.introspection.table_names()
+        )
+    return _available[key]
+
+
+def build_match_query(term):
+    """
+    Turn free text from the search box into an FTS5 query. Every word must
+    match, and the last one is treated as a prefix because the frontend
+    searches as the user types.
+    """
+    tokens = _TOKEN_RE.findall(term.lower())
+    if not tokens:
+        return None
+    quoted = [f'"{token}"' for token in tokens]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_tiffins(queryset, term):
+    """Restrict ``queryset`` to tiffins matching ``term``, best match first."""
+    if not is_available(queryset.db):
+        return queryset.filter(
+            models.Q(name__icontains=term) | models.Q(description__icontains=term)
+        )
+
+    match = build_match_query(term)
+    if match is None:
+        return queryset.none()
+    return queryset.filter(search_entry__document__match=match).order_by('search_entry__rank', 'id')
+
+
+def index_tiffin(tiffin, using='default'):
+    if not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [tiffin.pk])
+        cursor.execute(
+            f'INSERT INTO {INDEX_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+            [tiffin.pk, tiffin.name, tiffin.description],
+        )
+
+
+def unindex_tiffin(tiffin_id, using='default'):
+    if not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [tiffin_id])
+
+
+def rebuild_index(using='default'):
+    """Repopulate the whole index from ``api_tiffin``. Returns rows indexed."""
+    if not is_available(using):
+        return 0
+    tiffin_table = Tiffin._meta.db_table
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {INDEX_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {INDEX_TABLE} (rowid, name, description) '
+            f'SELECT id, name, description FROM {tiffin_table}'
+        )
+        return cursor.rowcount
+
+
+def tiffin_saved(sender, instance, using, raw=False, **kwargs):
+    if raw:
+        return
+    index_tiffin(instance, using=using)
+
+
+def tiffin_deleted(sender, instance, using, **kwargs):
+    unindex_tiffin(instance.pk, using=using)
@@ -1,8 +1,13 @@
+from datetime import timedelta
+
+from django.utils import timezone
 from rest_framework import serializers
 from users.models import User, TiffinOwner, DeliveryBoy
+from . import geo, images, locations
 from .models import Tiffin, Order, Delivery
+from .profiling import TimedSerializerMixin
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     business_name = serializers.CharField(write_only=True, required=False)
     business_address = serializers.CharField(write_only=True, required=False)
     vehicle_number = serializers.CharField(write_only=True, required=False)
@@ -63,12 +68,13 @@ class UserSerializer(serializers.ModelSerializer):
             )
         return user
 
-class TiffinOwnerSerializer(serializers.ModelSerializer):
+class TiffinOwnerSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer()
 
     class Meta:
         model = TiffinOwner
-        fields = ('id', 'user', 'business_name', 'business_address', 'business_pincode', 'is_verified')
+        fields = ('id', 'user', 'business_name', 'business_address', 'business_pincode', 'is_verified',
+                  'latitude', 'longitude')
 
     def create(self, validated_data):
         user_data = validated_data.pop('user')
@@ -76,7 +82,7 @@ class TiffinOwnerSerializer(serializers.ModelSerializer):
         tiffin_owner = TiffinOwner.objects.create(user=user, **validated_data)
         return tiffin_owner
 
-class DeliveryBoySerializer(serializers.ModelSerializer):
+class DeliveryBoySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer()
 
     class Meta:
@@ -89,16 +95,21 @@ class DeliveryBoySerializer(serializers.ModelSerializer):
         delivery_boy = DeliveryBoy.objects.create(user=user, **validated_data)
         return delivery_boy
 
-class TiffinSerializer(serializers.ModelSerializer):
+class TiffinSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     owner_name = serializers.CharField(source='owner.business_name', read_only=True)
     image = serializers.ImageField(required=False)
+    image_variants = serializers.SerializerMethodField()
     owner = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
         model = Tiffin
-        fields = ('id', 'owner', 'owner_name', 'name', 'description', 'price', 'is_available', 'image', 'created_at', 'updated_at')
+        fields = ('id', 'owner', 'owner_name', 'name', 'description', 'price', 'is_available', 'image',
+                  'image_variants', 'daily_capacity', 'capacity_shards', 'created_at', 'updated_at')
+
+    def get_image_variants(self, obj):
+        return images.variant_urls(obj, self.context.get('request'))
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     customer_name = serializers.CharField(source='customer.username', read_only=True)
     tiffin_name = serializers.CharField(source='tiffin.name', read_only=True)
     delivery_boy_name = serializers.CharField(source='delivery_boy.user.username', read_only=True)
@@ -111,7 +122,57 @@ class OrderSerializer(serializers.ModelSerializer):
                  'delivery_boy_name', 'quantity', 'total_price', 'status', 'delivery_address', 
                  'delivery_pincode', 'created_at', 'updated_at')
 
-class DeliverySerializer(serializers.ModelSerializer):
+class BatchOrderItemSerializer(serializers.Serializer):
+    tiffin = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+    delivery_address = serializers.CharField()
+    delivery_pincode = serializers.CharField(max_length=6)
+
+class BatchOrderSerializer(serializers.Serializer):
+    # Items are validated one by one in OrderViewSet.batch so that a bad line
+    # item is reported on its own instead of failing the whole cart.
+    items = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=50)
+
+class BulkOrderStatusSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=500)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+class SalesDashboardQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    top = serializers.IntegerField(min_value=1, max_value=50, default=5)
+
+    MAX_DAYS = 366
+
+    def validate(self, attrs):
+        end = attrs.get('end') or timezone.localdate()
+        start = attrs.get('start') or end - timedelta(days=29)
+        if start > end:
+            raise serializers.ValidationError({'start': 'Must not be after end.'})
+        if (end - start).days >= self.MAX_DAYS:
+            raise serializers.ValidationError({'start': f'Range is limited to {self.MAX_DAYS} days.'})
+        attrs['start'], attrs['end'] = start, end
+        return attrs
+
+class ProximityQuerySerializer(serializers.Serializer):
+    near = serializers.RegexField(r'^\d{6}$')
+    radius_km = serializers.FloatField(min_value=0.1, max_value=geo.MAX_RADIUS_KM, default=geo.DEFAULT_RADIUS_KM)
+
+    def validate_near(self, value):
+        centre = geo.locate(value)
+        if centre is None:
+            raise serializers.ValidationError('Unknown pincode.')
+        return centre
+
+class LocationPingSerializer(serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    recorded_at = serializers.DateTimeField(required=False)
+
+class LocationBatchSerializer(serializers.Serializer):
+    pings = LocationPingSerializer(many=True, allow_empty=False, max_length=locations.MAX_BATCH)
+
+class DeliverySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     order_details = OrderSerializer(source='order', read_only=True)
     delivery_boy_name = serializers.CharField(source='delivery_boy.user.username', read_only=True)
 
@@ -0,0 +1,190 @@
+"""
+Daily kitchen capacity.
+
+A tiffin with a ``daily_capacity`` takes at most that many portions of
+orders per day (in ``TIME_ZONE``). What is left is kept in ``TiffinStock``
+rows, created by the first order of the day. Orders take their quantity with
+a conditional ``UPDATE ... SET remaining = remaining - n WHERE remaining >= n``
+in the same transaction as the order insert. Two orders for the last portion
+cannot both succeed, and an order that rolls back gives its portions back.
+
+A popular tiffin can split its capacity over ``capacity_shards`` rows.
+Each order starts at a random shard and moves on to the next one if that
+shard cannot cover it, so a lunch rush on one dish spreads its updates over
+several rows rather than queueing on one. Only when no single shard is
+enough are the shards combined, under ``select_for_update``. SQLite takes
+one lock for the whole database on every write, so shards only pay off on
+databases with row locks.
+
+Each order records what it took in ``stock_taken`` and ``stock_day``.
+Cancelling it gives exactly that back, to that day, and clears both.
+Moving an order out of ``cancelled`` takes its quantity again from today's
+stock, or fails with ``OutOfStock``.
+
+When the last portion goes, the tiffin is made unavailable and
+``sold_out_on`` is set. Cancelling one of the day's orders gives its
+portions back and makes the tiffin available again. Otherwise the
+``restock`` task, queued for the next midnight, does it. A new
+``daily_capacity`` applies from the next day.
+"""
+import random
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import catalog_cache, tasks
+from .models import Tiffin, TiffinStock
+
+
+class OutOfStock(Exception):
+    """The tiffin has fewer than the requested portions left today."""
+
+    def __init__(self, remaining):
+        super().__init__(remaining)
+        self.remaining = remaining
+
+    @property
+    def message(self):
+        if self.remaining <= 0:
+            return 'Sold out for today.'
+        return f'Only {self.remaining} left today.'
+
+
+def today():
+    return timezone.localdate(timezone.now(), timezone.get_default_timezone())
+
+
+def shard_sizes(capacity, shards):
+    """Split ``capacity`` over ``shards`` counters as evenly as possible."""
+    size, extra = divmod(capacity, shards)
+    return [size + (1 if shard < extra else 0) for shard in range(shards)]
+
+
+def open_day(tiffin, day):
+    """Create the tiffin's counters for ``day`` unless another order already did."""
+    TiffinStock.objects.bulk_create([
+        TiffinStock(tiffin_id=tiffin.pk, day=day, shard=shard, remaining=size)
+        for shard, size in enumerate(shard_sizes(tiffin.daily_capacity, tiffin.capacity_shards))
+    ], ignore_conflicts=True)
+
+
+def remaining(tiffin_id, day=None):
+    """Portions left on ``day``, or ``None`` if no order has opened the day yet."""
+    return (
+        TiffinStock.objects.filter(tiffin_id=tiffin_id, day=day or today())
+        .aggregate(remaining=Sum('remaining'))['remaining']
+    )
+
+
+def _take_from_one(tiffin, day, quantity):
+    shards = tiffin.capacity_shards
+    start = random.randrange(shards)
+    for offset in range(shards):
+        taken = TiffinStock.objects.filter(
+            tiffin_id=tiffin.pk, day=day, shard=(start + offset) % shards, remaining__gte=quantity,
+        ).update(remaining=F('remaining') - quantity)
+        if taken:
+            return True
+    return False
+
+
+def _take_from_several(tiffin, day, quantity):
+    rows = list(
+        TiffinStock.objects.select_for_update()
+        .filter(tiffin_id=tiffin.pk, day=day, remaining__gt=0)
+        .order_by('shard').values_list('shard', 'remaining')
+    )
+    left = sum(count for _, count in rows)
+    if left < quantity:
+        raise OutOfStock(left)
+    need = quantity
+    for shard, count in rows:
+        part = min(count, need)
+        taken = TiffinStock.objects.filter(
+            tiffin_id=tiffin.pk, day=day, shard=shard, remaining__gte=part,
+        ).update(remaining=F('remaining') - part)
+        if not taken:
+            # Changed since it was read: only possible without row locks.
+            raise OutOfStock(remaining(tiffin.pk, day))
+        need -= part
+        if not need:
+            return
+
+
+def take(tiffin, quantity):
+    """
+    Take ``quantity`` portions of today's capacity for an order, or raise
+    ``OutOfStock``. Call it in the transaction that saves the order. Return
+    the day taken from, or ``None`` for a tiffin without a capacity.
+    """
+    if tiffin.daily_capacity is None:
+        return None
+    day = today()
+    with transaction.atomic():
+        taken = _take_from_one(tiffin, day, quantity)
+        if not taken and remaining(tiffin.pk, day) is None:
+            open_day(tiffin, day)
+            taken = _take_from_one(tiffin, day, quantity)
+        if not taken and tiffin.capacity_shards > 1:
+            _take_from_several(tiffin, day, quantity)
+            taken = True
+        left = remaining(tiffin.pk, day)
+        if not taken:
+            raise OutOfStock(left)
+        if left <= 0:
+            sold_out(tiffin, day)
+    return day
+
+
+def take_for(order):
+    """``take`` the order's quantity and record it on the (unsaved) order."""
+    order.stock_day = take(order.tiffin, order.quantity)
+    order.stock_taken = order.quantity if order.stock_day else 0
+
+
+def sold_out(tiffin, day):
+    """Make the tiffin unavailable until ``restock`` runs at the next midnight."""
+    changed = Tiffin.objects.filter(pk=tiffin.pk, is_available=True).update(
+        is_available=False, sold_out_on=day, updated_at=timezone.now(),
+    )
+    if changed:
+        tiffin.is_available, tiffin.sold_out_on = False, day
+        catalog_cache.invalidate(tiffin.owner.business_pincode)
+        midnight = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min),
+                                       timezone.get_default_timezone())
+        restock.enqueue(tiffin.pk, day.isoformat(), delay=(midnight - timezone.now()).total_seconds())
+
+
+def _make_available(tiffin_ids, day):
+    tiffins = Tiffin.objects.filter(pk__in=tiffin_ids, sold_out_on=day)
+    pincodes = set(tiffins.values_list('owner__business_pincode', flat=True))
+    if tiffins.update(is_available=True, sold_out_on=None, updated_at=timezone.now()):
+        catalog_cache.invalidate(*pincodes)
+
+
+def orders_cancelled(rows):
+    """
+    Give back what cancelled orders took. ``rows`` are ``(tiffin_id,
+    stock_day, stock_taken)``; the caller clears those on the orders.
+    """
+    day = today()
+    returned = set()
+    for tiffin_id, stock_day, taken in rows:
+        if not taken:
+            continue
+        # Every tiffin with stock for a day has a shard 0.
+        TiffinStock.objects.filter(tiffin_id=tiffin_id, day=stock_day, shard=0).update(
+            remaining=F('remaining') + taken,
+        )
+        if stock_day == day:
+            returned.add(tiffin_id)
+    if returned:
+        _make_available(returned, day)
+
+
+@tasks.task
+def restock(tiffin_id, day):
+    """Make a tiffin that sold out on ``day`` available again."""
+    _make_available([tiffin_id], datetime.fromisoformat(day).date())
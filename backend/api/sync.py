@@ -0,0 +1,144 @@
+"""
+Delta sync: the orders and deliveries that changed since a cursor.
+
+``GET /api/changes/?cursor=<opaque>`` returns the ``Order`` and ``Delivery``
+rows the user can list (the same rules as ``/api/orders/`` and
+``/api/deliveries/``) whose ``updated_at`` is past the cursor, oldest change
+first, plus a new cursor. Cancelled rows come back as tombstones, only their
+ids under ``removed``, so clients can drop them. Without a cursor the feed
+starts from the beginning; clients keep polling while ``has_more`` is true.
+
+The cursor holds the ``(updated_at, id)`` of the last row returned for each
+model, and the query seeks past it on the ``(updated_at, id)`` indexes. So a
+poll costs the rows that changed, not the size of the history. Every write
+path, including the bulk ``update()`` calls, sets ``updated_at``.
+
+``updated_at`` is stamped when a row is saved, not when its transaction
+commits. A row saved just before the cursor's position could still be
+uncommitted when that position was read. Rows are therefore only served once
+they are ``SYNC_SETTLE_SECONDS`` old. That window has to be longer than a
+transaction can stay open after stamping a row: on SQLite a write can wait
+up to the ``busy_timeout`` for the lock before committing, so the setting
+sits well above it.
+
+Hard deletes are not reported; orders are cancelled, not deleted. A row that
+leaves a user's view for another reason also goes unreported, for example a
+rider's order once delivered. The rider's delivery stream carries that change.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import permissions
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import fast_serializers
+from .fast_serializers import FastDeliverySerializer, FastOrderSerializer
+from .serializers import DeliverySerializer, OrderSerializer
+from .views import DeliveryViewSet, OrderViewSet
+
+PAGE_SIZE = getattr(settings, 'SYNC_PAGE_SIZE', 100)
+MAX_PAGE_SIZE = getattr(settings, 'SYNC_MAX_PAGE_SIZE', 500)
+SETTLE_SECONDS = getattr(settings, 'SYNC_SETTLE_SECONDS', 10)
+
+# cursor key -> (response key, list viewset, fast serializer, serializer)
+STREAMS = {
+    'o': ('orders', OrderViewSet, FastOrderSerializer, OrderSerializer),
+    'd': ('deliveries', DeliveryViewSet, FastDeliverySerializer, DeliverySerializer),
+}
+REMOVED_STATUSES = ('cancelled',)
+
+
+def decode_cursor(encoded):
+    """``{stream key: (updated_at, id)}`` from an opaque cursor."""
+    if not encoded:
+        return {}
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        return {
+            key: (datetime.fromisoformat(payload[key][0]), int(payload[key][1]))
+            for key in STREAMS if key in payload
+        }
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError, IndexError):
+        raise NotFound(_('Invalid cursor'))
+
+
+def encode_cursor(positions):
+    payload = {key: [updated_at.isoformat(), pk] for key, (updated_at, pk) in positions.items()}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode('ascii')
+
+
+def changed_since(queryset, position, until):
+    """Rows updated after ``position`` and no later than ``until``, in change order."""
+    queryset = queryset.filter(updated_at__lte=until)
+    if position is not None:
+        updated_at, pk = position
+        queryset = queryset.filter(
+            Q(updated_at__gte=updated_at) & (Q(updated_at__gt=updated_at) | Q(id__gt=pk))
+        )
+    return queryset.order_by('updated_at', 'id')
+
+
+def list_queryset(viewset_class, request):
+    """The queryset ``viewset_class`` would list for this request."""
+    view = viewset_class(request=request, action='list', format_kwarg=None, args=(), kwargs={})
+    return view.get_queryset()
+
+
+def read_stream(request, stream, position, until, limit):
+    """Return ``(changed rows, removed ids, new position, has_more)`` for one model."""
+    viewset_class, fast_class, serializer_class = STREAMS[stream][1:]
+    queryset = changed_since(list_queryset(viewset_class, request), position, until)
+    context = {'request': request}
+
+    if fast_serializers.ENABLED:
+        reader = fast_class(context=context)
+        rows = list(reader.values(queryset)[:limit + 1])
+        keys = [(row['updated_at'], row['id'], row['status']) for row in rows]
+    else:
+        rows = list(queryset[:limit + 1])
+        keys = [(row.updated_at, row.id, row.status) for row in rows]
+    has_more = len(rows) > limit
+    rows, keys = rows[:limit], keys[:limit]
+
+    kept = [row for row, key in zip(rows, keys) if key[2] not in REMOVED_STATUSES]
+    removed = [key[1] for key in keys if key[2] in REMOVED_STATUSES]
+    if fast_serializers.ENABLED:
+        changed = reader.serialize(kept)
+    else:
+        changed = serializer_class(kept, many=True, context=context).data
+    if keys:
+        position = keys[-1][:2]
+    return changed, removed, position, has_more
+
+
+class ChangesView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        positions = decode_cursor(request.query_params.get('cursor'))
+        try:
+            limit = max(1, min(int(request.query_params['limit']), MAX_PAGE_SIZE))
+        except (KeyError, ValueError):
+            limit = PAGE_SIZE
+        until = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+
+        data, removed, has_more = {}, {}, False
+        for stream, spec in STREAMS.items():
+            name = spec[0]
+            data[name], removed[name], position, more = read_stream(
+                request, stream, positions.get(stream), until, limit)
+            if position is not None:
+                positions[stream] = position
+            has_more = has_more or more
+        data['removed'] = removed
+        data['cursor'] = encode_cursor(positions)
+        data['has_more'] = has_more
+        return Response(data)
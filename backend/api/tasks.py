@@ -0,0 +1,336 @@
+"""
+Background tasks, persisted in the ``Task`` table and run by ``run_tasks``.
+
+Work that does not have to finish before the response goes out (creating
+deliveries, notifications, rollups) is queued instead of done in the request:
+
+    @tasks.task
+    def create_deliveries(order_ids):
+        ...
+
+    create_deliveries.enqueue(order_ids)
+
+``enqueue`` inserts the task row in the current transaction, so the task
+exists exactly when the writes it follows up on are committed, and a rolled
+back request queues nothing. Tasks survive restarts: nothing is held only in
+memory. Arguments are stored as JSON.
+
+Workers (``python manage.py run_tasks``) claim due tasks with a conditional
+``UPDATE``, the same way ``api.dispatch`` claims deliveries, so any number of
+them can share the table. Each claim carries a lease that the worker renews
+while the task runs; the tasks of a worker that dies are picked up by
+another once their lease lapses, or marked ``failed`` if that was their
+last attempt. Tasks run on a thread pool, or on a process
+pool for CPU-bound work, and should be idempotent: a task can run again
+after a crash.
+
+With ``TASK_RUN_INLINE`` (on when ``DEBUG`` is), a task queued without a
+delay runs in the web process as soon as its transaction commits, through
+the same claim and bookkeeping, so ``runserver`` works without a worker.
+Delayed tasks and retries still wait for ``run_tasks``.
+
+A task that raises is retried after an exponential backoff with jitter,
+until ``max_attempts``; after that it stays ``failed`` with its traceback in
+``last_error``. ``metrics`` reports queue depth and how long tasks waited
+and ran (see the ``task_stats`` command).
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+POOLS = ('thread', 'process')
+POOL = getattr(settings, 'TASK_POOL', 'thread')
+CONCURRENCY = getattr(settings, 'TASK_CONCURRENCY', 4)
+POLL_SECONDS = getattr(settings, 'TASK_POLL_SECONDS', 0.5)
+LEASE_SECONDS = getattr(settings, 'TASK_LEASE_SECONDS', 300)
+MAX_ATTEMPTS = getattr(settings, 'TASK_MAX_ATTEMPTS', 5)
+RETRY_BASE_SECONDS = getattr(settings, 'TASK_RETRY_BASE_SECONDS', 2)
+RETRY_MAX_SECONDS = getattr(settings, 'TASK_RETRY_MAX_SECONDS', 600)
+KEEP_DONE_SECONDS = getattr(settings, 'TASK_KEEP_DONE_SECONDS', 24 * 3600)
+RUN_INLINE = getattr(settings, 'TASK_RUN_INLINE', False)
+
+_registry = {}
+
+# Set when a task is queued, so a worker in this process starts it without
+# waiting for its next poll.
+_wakeup = threading.Event()
+
+
+def task(func=None, *, max_attempts=None):
+    """
+    Register ``func`` as a task named after its module and function, and
+    give it an ``enqueue(*args, delay=0)`` method.
+    """
+    def register(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+        _registry[name] = func
+        func.task_name = name
+        func.max_attempts = max_attempts or MAX_ATTEMPTS
+        func.enqueue = lambda *args, delay=0: enqueue(func, *args, delay=delay)
+        return func
+
+    return register(func) if func is not None else register
+
+
+def get_task(name):
+    """The function registered as ``name``, importing its module if needed."""
+    if name not in _registry:
+        module, _, _ = name.rpartition('.')
+        try:
+            import_module(module)
+        except ImportError:
+            pass
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError(f'No task is registered as {name!r}.') from None
+
+
+def enqueue(func, *args, delay=0):
+    """
+    Queue ``func(*args)`` (a registered task or its name) to run ``delay``
+    seconds from now, as part of the current transaction.
+    """
+    func = get_task(getattr(func, 'task_name', func))
+    queued = Task.objects.create(
+        name=func.task_name, args=list(args), max_attempts=func.max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    if RUN_INLINE and delay <= 0:
+        transaction.on_commit(lambda: run_inline(queued.pk))
+    else:
+        transaction.on_commit(_wakeup.set)
+    return queued
+
+
+def run_inline(task_id):
+    """Run a queued task in this thread, as a worker would (``TASK_RUN_INLINE``)."""
+    worker = Worker(concurrency=1, pool='thread')
+    for claimed in worker.claim(1, ids=[task_id]):
+        future = Future()
+        try:
+            get_task(claimed.name)(*claimed.args)
+        except Exception as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(None)
+        worker.finish(future, claimed)
+    worker.executor.shutdown()
+
+
+def execute(name, args):
+    """Run one task; called on the worker's pool."""
+    try:
+        get_task(name)(*args)
+    finally:
+        close_old_connections()
+
+
+def backoff(attempts):
+    """Seconds before retrying a task that has failed ``attempts`` times."""
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    # Jitter, so tasks that failed together do not all retry together.
+    return delay * random.uniform(0.5, 1)
+
+
+def _setup_process():
+    # Pool processes started with 'spawn' have not loaded Django yet.
+    import django
+    django.setup()
+
+
+class Worker:
+    """Claims due tasks and runs them on a thread or process pool."""
+
+    def __init__(self, concurrency=CONCURRENCY, pool=POOL, poll_seconds=POLL_SECONDS,
+                 lease_seconds=LEASE_SECONDS):
+        if pool not in POOLS:
+            raise ValueError(f'pool must be one of {", ".join(POOLS)}, not {pool!r}')
+        self.id = f'{socket.gethostname()[:40]}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.running = {}
+        self.counts = Counter()
+        self.renewed_at = self.pruned_at = time.monotonic()
+        if pool == 'process':
+            # Forked pool processes must not share the parent's connections.
+            connections.close_all()
+            self.executor = ProcessPoolExecutor(max_workers=concurrency, initializer=_setup_process)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='tasks')
+
+    def claim(self, limit, ids=None):
+        """
+        Mark up to ``limit`` due tasks (only those in ``ids``, if given) as
+        running on this worker and return them.
+        """
+        now = timezone.now()
+        lapsed = Q(status='running', lease_expires_at__lt=now)
+        due = Q(status='queued', run_at__lte=now) | lapsed
+        if ids is not None:
+            due &= Q(id__in=ids)
+        rows = list(
+            Task.objects.filter(due).order_by('run_at', 'id')
+            .values_list('id', 'attempts', 'max_attempts')[:limit]
+        )
+        exhausted = [pk for pk, attempts, max_attempts in rows if attempts >= max_attempts]
+        if exhausted:
+            self.give_up(exhausted, lapsed, now)
+        claimable = [pk for pk, attempts, max_attempts in rows if attempts < max_attempts]
+        if not claimable:
+            return []
+        lease = now + timedelta(seconds=self.lease_seconds)
+        # Another worker may claim some of the same rows first; the condition
+        # is checked again by the UPDATE, so each task goes to one worker.
+        Task.objects.filter(due, id__in=claimable, attempts__lt=F('max_attempts')).update(
+            status='running', claimed_by=self.id, lease_expires_at=lease, started_at=now,
+            attempts=F('attempts') + 1,
+        )
+        return list(
+            Task.objects.filter(id__in=claimable, claimed_by=self.id, lease_expires_at=lease).order_by('run_at', 'id')
+        )
+
+    def give_up(self, ids, lapsed, now):
+        """Fail lapsed tasks whose worker stopped during their last attempt."""
+        failed = Task.objects.filter(lapsed, id__in=ids, attempts__gte=F('max_attempts')).update(
+            status='failed', finished_at=now, claimed_by='', lease_expires_at=None,
+            last_error='The lease of the last attempt expired before the task finished.',
+        )
+        if failed:
+            self.counts['failed'] += failed
+            logger.error('Failed %d task(s) whose last attempt did not finish: %s', failed, ids)
+
+    def finish(self, future, claimed):
+        """Record the outcome of a task that has returned or raised."""
+        now = timezone.now()
+        # The claim may have lapsed and been taken over; then the row is not ours.
+        mine = Task.objects.filter(pk=claimed.pk, claimed_by=self.id, status='running')
+        error = future.exception()
+        if error is None:
+            mine.update(status='done', finished_at=now, claimed_by='', lease_expires_at=None, last_error='')
+            self.counts['done'] += 1
+            return
+        details = ''.join(traceback.format_exception(error))[-4000:]
+        if claimed.attempts < claimed.max_attempts:
+            delay = backoff(claimed.attempts)
+            mine.update(status='queued', run_at=now + timedelta(seconds=delay), claimed_by='',
+                        lease_expires_at=None, last_error=details)
+            self.counts['retried'] += 1
+            logger.warning('Task %s #%s failed (attempt %d of %d); retrying in %.0f s: %r',
+                           claimed.name, claimed.pk, claimed.attempts, claimed.max_attempts, delay, error)
+        else:
+            mine.update(status='failed', finished_at=now, claimed_by='', lease_expires_at=None,
+                        last_error=details)
+            self.counts['failed'] += 1
+            logger.error('Task %s #%s failed for good after %d attempts: %r',
+                         claimed.name, claimed.pk, claimed.attempts, error)
+
+    def maintain(self):
+        """Renew the leases of running tasks and drop old finished ones."""
+        now = time.monotonic()
+        if self.running and now - self.renewed_at >= self.lease_seconds / 3:
+            Task.objects.filter(
+                id__in=[claimed.pk for claimed in self.running.values()], claimed_by=self.id, status='running',
+            ).update(lease_expires_at=timezone.now() + timedelta(seconds=self.lease_seconds))
+            self.renewed_at = now
+        if now - self.pruned_at >= 3600:
+            prune()
+            self.pruned_at = now
+
+    def run_once(self):
+        """Start what fits in the pool, then wait for a task to finish or a poll to pass."""
+        close_old_connections()
+        self.maintain()
+        started = 0
+        free = self.concurrency - len(self.running)
+        if free:
+            for claimed in self.claim(free):
+                self.running[self.executor.submit(execute, claimed.name, claimed.args)] = claimed
+                started += 1
+        if self.running:
+            finished, _ = wait(self.running, timeout=self.poll_seconds, return_when=FIRST_COMPLETED)
+            for future in finished:
+                self.finish(future, self.running.pop(future))
+        elif not started:
+            _wakeup.wait(self.poll_seconds)
+            _wakeup.clear()
+        return started
+
+    def close(self):
+        """Let running tasks finish and record them."""
+        for future, claimed in list(self.running.items()):
+            wait([future])
+            self.finish(future, claimed)
+        self.running.clear()
+        self.executor.shutdown()
+
+
+def prune(keep_seconds=KEEP_DONE_SECONDS):
+    """Delete tasks that finished successfully more than ``keep_seconds`` ago."""
+    cutoff = timezone.now() - timedelta(seconds=keep_seconds)
+    deleted, _ = Task.objects.filter(status='done', finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def metrics(window_seconds=900):
+    """
+    Queue depth now, and per task name how long the tasks finished in the
+    last ``window_seconds`` waited once due (``wait``) and ran (``run``), in
+    seconds.
+    """
+    now = timezone.now()
+    depth = dict(Task.objects.values_list('status').annotate(Count('id')).order_by())
+    due = Task.objects.filter(status='queued', run_at__lte=now).aggregate(count=Count('id'), oldest=Min('run_at'))
+    result = {
+        'queued': depth.get('queued', 0),
+        'due': due['count'],
+        'running': depth.get('running', 0),
+        'failed': depth.get('failed', 0),
+        'oldest_due_seconds': (now - due['oldest']).total_seconds() if due['oldest'] else 0.0,
+        'tasks': {},
+    }
+    rows = Task.objects.filter(
+        status__in=('done', 'failed'), finished_at__gte=now - timedelta(seconds=window_seconds),
+    ).values_list('name', 'status', 'run_at', 'started_at', 'finished_at')
+    samples = {}
+    for name, status, run_at, started_at, finished_at in rows:
+        entry = samples.setdefault(name, {'done': 0, 'failed': 0, 'wait': [], 'run': []})
+        entry[status] += 1
+        entry['wait'].append(max(0.0, (started_at - run_at).total_seconds()))
+        entry['run'].append((finished_at - started_at).total_seconds())
+    for name, entry in sorted(samples.items()):
+        result['tasks'][name] = {
+            'done': entry['done'],
+            'failed': entry['failed'],
+            'wait_p50': _percentile(entry['wait'], 50),
+            'wait_p95': _percentile(entry['wait'], 95),
+            'run_p50': _percentile(entry['run'], 50),
+            'run_p95': _percentile(entry['run'], 95),
+        }
+    return result
@@ -1,16 +1,32 @@
+import logging
+from collections import defaultdict
+
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters import rest_framework as filters
 from users.models import User, TiffinOwner, DeliveryBoy
 from .models import Tiffin, Order, Delivery
+from . import catalog_cache, dispatch, events, geo, locations, rollups, search, stock
+from .catalog_cache import CatalogCacheMixin
+from .conditional import ConditionalGetMixin
+from .db import ReplicaReadMixin, lock_rows
+from .fast_serializers import (
+    FastListMixin, FastUserSerializer, FastTiffinSerializer, FastOrderSerializer, FastDeliverySerializer
+)
+from .pagination import OptInKeysetPagination
 from .serializers import (
     UserSerializer, TiffinOwnerSerializer, DeliveryBoySerializer,
-    TiffinSerializer, OrderSerializer, DeliverySerializer
+    TiffinSerializer, OrderSerializer, DeliverySerializer,
+    BatchOrderSerializer, BatchOrderItemSerializer, BulkOrderStatusSerializer,
+    SalesDashboardQuerySerializer, ProximityQuerySerializer, LocationPingSerializer, LocationBatchSerializer
 )
 from rest_framework.permissions import AllowAny
-from django.db import models
-from rest_framework.exceptions import PermissionDenied
+from django.db import models, transaction
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+
+logger = logging.getLogger(__name__)
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
@@ -18,9 +34,10 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
             return True
         return obj.owner.user == request.user
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(FastListMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    fast_serializer_class = FastUserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_permissions(self):
@@ -29,13 +46,19 @@ class UserViewSet(viewsets.ModelViewSet):
         return super().get_permissions()
 
     def get_queryset(self):
+        queryset = User.objects.select_related('tiffin_owner', 'delivery_boy').order_by('id')
         if self.request.user.user_type == 'owner':
-            return User.objects.filter(id=self.request.user.id)
-        return User.objects.all()
+            return queryset.filter(id=self.request.user.id)
+        return queryset
 
     @action(detail=False, methods=['get'])
     def me(self, request):
-        serializer = self.get_serializer(request.user)
+        # request.user may come from the authentication cache, and rider
+        # positions are written with bulk updates, so report fresh rows.
+        user = request.user
+        if user.is_authenticated:
+            user = User.objects.select_related('tiffin_owner', 'delivery_boy').get(pk=user.pk)
+        serializer = self.get_serializer(user)
         return Response(serializer.data)
 
 class TiffinOwnerViewSet(viewsets.ModelViewSet):
@@ -44,9 +67,24 @@ class TiffinOwnerViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
+        queryset = TiffinOwner.objects.select_related('user', 'user__delivery_boy').order_by('id')
         if self.request.user.user_type == 'owner':
-            return TiffinOwner.objects.filter(user=self.request.user)
-        return TiffinOwner.objects.all()
+            return queryset.filter(user=self.request.user)
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def dashboard(self, request):
+        """
+        Revenue, order counts and top dishes of the calling owner between
+        ``?start=`` and ``?end=`` (inclusive, default the last 30 days),
+        read from the sales rollups rather than the order history.
+        """
+        if not hasattr(request.user, 'tiffin_owner'):
+            raise PermissionDenied("User is not a tiffin owner")
+        params = SalesDashboardQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = rollups.dashboard(request.user.tiffin_owner.id, **params.validated_data)
+        return Response(data)
 
 class DeliveryBoyViewSet(viewsets.ModelViewSet):
     queryset = DeliveryBoy.objects.all()
@@ -54,44 +92,87 @@ class DeliveryBoyViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
+        queryset = DeliveryBoy.objects.select_related('user', 'user__tiffin_owner').order_by('id')
         if self.request.user.user_type == 'delivery':
-            return DeliveryBoy.objects.filter(user=self.request.user)
-        return DeliveryBoy.objects.all()
+            return queryset.filter(user=self.request.user)
+        return queryset
 
-class TiffinViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def location(self, request):
+        """
+        Report the rider's position: one ping (``latitude``, ``longitude``,
+        optional ``recorded_at``) or ``{"pings": [...]}``. Positions are
+        written to the database in batches; see ``api.locations``.
+        """
+        rider = getattr(request.user, 'delivery_boy', None)
+        if rider is None:
+            raise PermissionDenied("User is not a delivery boy")
+        if 'pings' in request.data:
+            params = LocationBatchSerializer(data=request.data)
+            params.is_valid(raise_exception=True)
+            pings = params.validated_data['pings']
+        else:
+            params = LocationPingSerializer(data=request.data)
+            params.is_valid(raise_exception=True)
+            pings = [params.validated_data]
+        locations.record(rider.id, pings)
+        return Response({'accepted': len(pings)}, status=status.HTTP_202_ACCEPTED)
+
+def browse_tiffins(params):
+    """
+    The catalog as customers and anonymous visitors see it: available tiffins,
+    narrowed by ``?pincode=``, ``?search=`` and ``?near=`` in ``params``.
+    """
+    # For anonymous users or non-owners, always filter by availability
+    queryset = Tiffin.objects.select_related('owner').filter(is_available=True).order_by('id')
+
+    # Apply pincode filter if provided
+    pincode = params.get('pincode', None)
+    if pincode:
+        queryset = queryset.filter(owner__business_pincode=pincode)
+
+    # Apply search filter if provided; results come back best match first
+    search_term = params.get('search', None)
+    if search_term:
+        queryset = search.search_tiffins(queryset, search_term)
+
+    # Kitchens within radius_km of a pincode, nearest first
+    if params.get('near'):
+        proximity = ProximityQuerySerializer(data=params)
+        proximity.is_valid(raise_exception=True)
+        latitude, longitude = proximity.validated_data['near']
+        queryset = geo.near(queryset, latitude, longitude, proximity.validated_data['radius_km'])
+
+    return queryset
+
+class TiffinViewSet(ReplicaReadMixin, ConditionalGetMixin, CatalogCacheMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Tiffin.objects.all()
     serializer_class = TiffinSerializer
+    fast_serializer_class = FastTiffinSerializer
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
             return [AllowAny()]
         return [permissions.IsAuthenticated(), IsOwnerOrReadOnly()]
 
+    def get_validators(self):
+        # Cached catalog pages are versioned on every tiffin or kitchen
+        # change, so the cache key validates them without a query.
+        if catalog_cache.is_cacheable(self.request):
+            key, _ = catalog_cache.make_key(self.request, self.action, pk=self.kwargs.get('pk'))
+            return [key], None
+        return super().get_validators()
+
     def get_queryset(self):
         user = self.request.user
-        queryset = Tiffin.objects.all()
+        queryset = Tiffin.objects.select_related('owner').order_by('id')
 
         if user.is_authenticated and user.user_type == 'owner':
             # Owners only see their own tiffins.
-            print(f"Filtering tiffins for owner: {user.username}")  # Debug log
+            logger.debug('Filtering tiffins for owner %s', user.username)
             return queryset.filter(owner__user=user)
 
-        # For anonymous users or non-owners, always filter by availability
-        queryset = queryset.filter(is_available=True)
-
-        # Apply pincode filter if provided
-        pincode = self.request.query_params.get('pincode', None)
-        if pincode:
-            queryset = queryset.filter(owner__business_pincode=pincode)
-
-        # Apply search filter if provided
-        search_term = self.request.query_params.get('search', None)
-        if search_term:
-            queryset = queryset.filter(
-                models.Q(name__icontains=search_term) | models.Q(description__icontains=search_term)
-            )
-
-        return queryset
+        return browse_tiffins(self.request.query_params)
 
     def perform_create(self, serializer):
         if not hasattr(self.request.user, 'tiffin_owner'):
@@ -106,15 +187,21 @@ class OrderFilter(filters.FilterSet):
         model = Order
         fields = ['status', 'customer', 'tiffin', 'delivery_boy', 'pincode']
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ReplicaReadMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    fast_serializer_class = FastOrderSerializer
     permission_classes = [permissions.IsAuthenticated]
     filterset_class = OrderFilter
+    pagination_class = OptInKeysetPagination
+    etag_related = ('tiffin__updated_at',)
 
     def get_queryset(self):
         user = self.request.user
-        queryset = Order.objects.all()
+        # Newest first, the order keyset pagination uses too.
+        queryset = Order.objects.select_related(
+            'customer', 'tiffin__owner', 'delivery_boy__user'
+        ).order_by('-created_at', '-id')
         
         if user.user_type == 'customer':
             return queryset.filter(customer=user)
@@ -137,8 +224,159 @@ class OrderViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         tiffin = serializer.validated_data['tiffin']
         quantity = serializer.validated_data['quantity']
+        if not tiffin.is_available:
+            raise ValidationError({'tiffin': ['Tiffin is not available.']})
         total_price = tiffin.price * quantity
-        serializer.save(customer=self.request.user, total_price=total_price)
+        # One transaction for the stock, the order and its rollup row.
+        with transaction.atomic():
+            try:
+                stock_day = stock.take(tiffin, quantity)
+            except stock.OutOfStock as exc:
+                raise ValidationError({'quantity': [exc.message]})
+            serializer.save(customer=self.request.user, total_price=total_price,
+                            stock_day=stock_day, stock_taken=quantity if stock_day else 0)
+
+    def perform_update(self, serializer):
+        rollups.save_order(serializer.instance, serializer.save)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Place every line item of a cart in one request. Valid items are
+        inserted together in a single transaction; invalid ones, and items
+        the kitchen has no capacity left for, are reported per item
+        alongside them.
+        """
+        serializer = BatchOrderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['items']
+
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            item_serializer = BatchOrderItemSerializer(data=item)
+            if item_serializer.is_valid():
+                valid.append((index, item_serializer.validated_data))
+            else:
+                results[index] = {'index': index, 'status': 'error', 'errors': item_serializer.errors}
+
+        tiffins = Tiffin.objects.in_bulk({data['tiffin'] for _, data in valid})
+        orders = []
+        for index, data in valid:
+            tiffin = tiffins.get(data['tiffin'])
+            if tiffin is None:
+                results[index] = {'index': index, 'status': 'error',
+                                  'errors': {'tiffin': ['Invalid pk - object does not exist.']}}
+                continue
+            if not tiffin.is_available:
+                results[index] = {'index': index, 'status': 'error',
+                                  'errors': {'tiffin': ['Tiffin is not available.']}}
+                continue
+            orders.append((index, Order(
+                customer=request.user,
+                tiffin=tiffin,
+                quantity=data['quantity'],
+                total_price=tiffin.price * data['quantity'],
+                delivery_address=data['delivery_address'],
+                delivery_pincode=data['delivery_pincode'],
+            )))
+
+        with transaction.atomic():
+            in_stock = []
+            for index, order in orders:
+                if not order.tiffin.is_available:
+                    # Sold out by an earlier item of this cart.
+                    results[index] = {'index': index, 'status': 'error',
+                                      'errors': {'tiffin': ['Tiffin is not available.']}}
+                    continue
+                try:
+                    stock.take_for(order)
+                except stock.OutOfStock as exc:
+                    results[index] = {'index': index, 'status': 'error', 'errors': {'quantity': [exc.message]}}
+                    continue
+                in_stock.append((index, order))
+            orders = in_stock
+            Order.objects.bulk_create([order for _, order in orders])
+            rollups.orders_created([order for _, order in orders])
+
+        for index, order in orders:
+            results[index] = {'index': index, 'status': 'created', 'order': OrderSerializer(order).data}
+
+        if not orders:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif len(orders) < len(items):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({'results': results}, status=response_status)
+
+    @action(detail=False, methods=['post'])
+    def bulk_update_status(self, request):
+        """
+        Move many orders to the same status at once, e.g. a kitchen marking
+        its whole lunch batch ready. IDs outside the caller's orders are
+        reported per ID and left alone; the rest are updated with a single
+        UPDATE, and orders becoming ready for delivery get their Delivery
+        rows from a single background task.
+        """
+        serializer = BulkOrderStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        new_status = serializer.validated_data['status']
+
+        errors = {}
+        with transaction.atomic():
+            # Lock the orders before reading them: whether an order gives
+            # its portions back or takes them again depends on the status it
+            # has now, and a concurrent request must not act on it too.
+            rows = list(lock_rows(self.get_queryset().filter(id__in=ids)).values_list(
+                'id', 'customer_id', 'tiffin__owner__user_id', 'delivery_boy__user_id',
+                'tiffin__owner_id', 'tiffin_id', 'created_at', 'status', 'quantity', 'total_price',
+                'stock_day', 'stock_taken',
+            ))
+            # Cancelled orders gave their portions back; reopening one takes them again.
+            reopened = [row for row in rows if row[7] == 'cancelled'] if new_status != 'cancelled' else []
+            tiffins = Tiffin.objects.select_related('owner').in_bulk({row[5] for row in reopened})
+
+            taken = defaultdict(list)
+            for row in reopened:
+                try:
+                    stock_day = stock.take(tiffins[row[5]], row[8])
+                except stock.OutOfStock as exc:
+                    errors[row[0]] = exc.message
+                    continue
+                if stock_day is not None:
+                    taken[stock_day].append(row[0])
+            rows = [row for row in rows if row[0] not in errors]
+            found = {row[0]: row[1:4] for row in rows}
+            rollup_rows = [row[4:10] for row in rows]
+
+            changes = {'status': new_status, 'updated_at': timezone.now()}
+            if new_status == 'cancelled':
+                changes.update(stock_day=None, stock_taken=0)
+            Order.objects.filter(id__in=found).update(**changes)
+            for stock_day, order_ids in taken.items():
+                Order.objects.filter(id__in=order_ids).update(stock_day=stock_day, stock_taken=models.F('quantity'))
+            rollups.statuses_changed(rollup_rows, new_status)
+            if new_status == 'cancelled':
+                stock.orders_cancelled([(row[5], row[10], row[11]) for row in rows])
+            if new_status == 'ready_for_delivery':
+                dispatch.create_deliveries.enqueue(list(found))
+            for order_id, (customer_id, owner_user_id, rider_user_id) in found.items():
+                events.order_status_changed(order_id, new_status, customer_id, owner_user_id, rider_user_id)
+
+        results = [
+            {'id': order_id, 'status': 'updated'} if order_id in found
+            else {'id': order_id, 'status': 'error', 'error': errors.get(order_id, 'Order not found.')}
+            for order_id in ids
+        ]
+        if not found:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif len(found) < len(ids):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_200_OK
+        return Response({'status': new_status, 'results': results}, status=response_status)
 
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
@@ -148,19 +386,51 @@ class OrderViewSet(viewsets.ModelViewSet):
         if new_status not in dict(Order.STATUS_CHOICES):
             return Response({'error': 'Invalid status'}, status=status.HTTP_400_BAD_REQUEST)
         
-        order.status = new_status
-        order.save()
-
-        if new_status == 'ready_for_delivery':
-            # Create a new Delivery record
-            Delivery.objects.create(
-                order=order,
-                pickup_address=order.tiffin.owner.business_address,
-                delivery_address=order.delivery_address,
-                status='pending', # Initial status for the delivery
-                delivery_boy=None # Delivery boy will be assigned later
-            )
+        cancelling = new_status == 'cancelled' and order.status != 'cancelled'
+        reopening = order.status == 'cancelled' and new_status != 'cancelled'
+        # What happens to the order's stock is decided from the row as
+        # get_object() read it, so the UPDATE only applies while the row is
+        # still that way: of two requests racing to cancel or reopen the
+        # order, one wins and the other gets a 409.
+        unchanged = Order.objects.filter(
+            pk=order.pk, status=order.status, tiffin_id=order.tiffin_id, quantity=order.quantity,
+            total_price=order.total_price, stock_day=order.stock_day, stock_taken=order.stock_taken,
+        )
+        previous = (
+            order.tiffin.owner_id, order.tiffin_id, order.created_at, order.status, order.quantity,
+            order.total_price,
+        )
+        changes = {'status': new_status, 'updated_at': timezone.now()}
 
+        try:
+            with transaction.atomic():
+                if cancelling:
+                    changes.update(stock_day=None, stock_taken=0)
+                elif reopening:
+                    # It gave its portions back when it was cancelled.
+                    stock_day = stock.take(order.tiffin, order.quantity)
+                    changes.update(stock_day=stock_day, stock_taken=order.quantity if stock_day else 0)
+                if unchanged.update(**changes) != 1:
+                    transaction.set_rollback(True)
+                    return Response(
+                        {'error': 'The order was changed by another request. Reload it and try again.'},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                if cancelling:
+                    stock.orders_cancelled([(order.tiffin_id, order.stock_day, order.stock_taken)])
+                rollups.statuses_changed([previous], new_status)
+                if new_status == 'ready_for_delivery':
+                    # The Delivery record is created by a background task.
+                    dispatch.create_deliveries.enqueue([order.id])
+        except stock.OutOfStock as exc:
+            return Response({'error': exc.message}, status=status.HTTP_400_BAD_REQUEST)
+        for field, value in changes.items():
+            setattr(order, field, value)
+
+        events.order_status_changed(
+            order.id, new_status, order.customer_id, order.tiffin.owner.user_id,
+            order.delivery_boy.user_id if order.delivery_boy else None
+        )
         return Response(OrderSerializer(order).data)
 
 class DeliveryFilter(filters.FilterSet):
@@ -172,27 +442,41 @@ class DeliveryFilter(filters.FilterSet):
         model = Delivery
         fields = ['status', 'delivery_boy', 'pincode', 'delivery_boy_is_null']
 
-class DeliveryViewSet(viewsets.ModelViewSet):
+class DeliveryViewSet(ReplicaReadMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Delivery.objects.all()
     serializer_class = DeliverySerializer
+    fast_serializer_class = FastDeliverySerializer
     permission_classes = [permissions.IsAuthenticated]
     filterset_class = DeliveryFilter
+    pagination_class = OptInKeysetPagination
+    etag_related = ('order__updated_at',)
 
     def get_queryset(self):
         user = self.request.user
+        queryset = Delivery.objects.select_related(
+            'delivery_boy__user',
+            'order__customer',
+            'order__tiffin__owner',
+            'order__delivery_boy__user',
+        ).order_by('-created_at', '-id')
         if user.user_type == 'delivery':
             # Delivery boys see deliveries in their pincode, either assigned or unassigned
             # For unassigned deliveries, check if the delivery_boy field is null and in their pincode
             # For assigned deliveries, ensure it's assigned to them
-            return Delivery.objects.filter(
-                models.Q(delivery_boy__user=user) |
-                models.Q(delivery_boy__isnull=True, order__delivery_pincode=user.pincode)
+            # Both branches are written as conditions on api_delivery's own
+            # columns so SQLite can answer each from an index and OR them.
+            unassigned = Delivery.objects.filter(
+                delivery_boy__isnull=True, order__delivery_pincode=user.pincode
+            ).values('id')
+            return queryset.filter(
+                models.Q(delivery_boy__in=DeliveryBoy.objects.filter(user=user).values('id')) |
+                models.Q(id__in=unassigned)
             )
         elif user.user_type == 'owner':
-            return Delivery.objects.filter(order__tiffin__owner__user=user)
+            return queryset.filter(order__tiffin__owner__user=user)
         elif user.user_type == 'customer':
-            return Delivery.objects.filter(order__customer=user)
-        return Delivery.objects.none()
+            return queryset.filter(order__customer=user)
+        return queryset.none()
 
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
@@ -204,27 +488,81 @@ class DeliveryViewSet(viewsets.ModelViewSet):
         
         delivery.status = new_status
         delivery.save()
+        events.delivery_status_changed(
+            delivery.id, delivery.order_id, new_status, delivery.order.customer_id,
+            delivery.order.tiffin.owner.user_id,
+            delivery.delivery_boy.user_id if delivery.delivery_boy else None
+        )
         return Response(DeliverySerializer(delivery).data)
 
+    @action(detail=True, methods=['get'])
+    def rider_location(self, request, pk=None):
+        """Latest position of the rider on an accepted or picked up delivery."""
+        try:
+            rider_id = (
+                self.get_queryset().filter(pk=int(pk), status__in=('accepted', 'picked_up'))
+                .values_list('delivery_boy_id', flat=True).first()
+            )
+        except ValueError:
+            rider_id = None
+        if rider_id is None:
+            return Response({'error': 'No rider is on this delivery.'}, status=status.HTTP_404_NOT_FOUND)
+        position = locations.current_position(rider_id)
+        if position is None:
+            return Response({'error': 'Rider has not reported a location yet.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'delivery': int(pk),
+            'delivery_boy': rider_id,
+            'latitude': position.latitude,
+            'longitude': position.longitude,
+            'recorded_at': position.recorded_at,
+        })
+
     @action(detail=True, methods=['post'])
     def accept(self, request, pk=None):
-        delivery = self.get_object()
         user = self.request.user
 
         if user.user_type != 'delivery':
             return Response({'error': 'Only delivery boys can accept deliveries.'}, status=status.HTTP_403_FORBIDDEN)
 
-        if delivery.status != 'pending':
-            return Response({'error': 'Delivery is not in pending status.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if delivery.delivery_boy is not None:
-            return Response({'error': 'Delivery already assigned.'}, status=status.HTTP_400_BAD_REQUEST)
-
         try:
-            delivery_boy_profile = DeliveryBoy.objects.get(user=user)
-            delivery.delivery_boy = delivery_boy_profile
-            delivery.status = 'accepted'
-            delivery.save()
-            return Response(DeliverySerializer(delivery).data)
+            # Loaded with the user by api.authentication.
+            delivery_boy_profile = user.delivery_boy
         except DeliveryBoy.DoesNotExist:
-            return Response({'error': 'Delivery boy profile not found.'}, status=status.HTTP_404_NOT_FOUND) 
\ No newline at end of file
+            return Response({'error': 'Delivery boy profile not found.'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise NotFound()
+
+        # Claim the delivery with a single conditional UPDATE so that when
+        # many riders accept at once exactly one of them matches the row.
+        # It is looked up by id rather than through get_object(): once won,
+        # a delivery leaves the other riders' queryset, and they should hear
+        # that they lost it (409), not that it does not exist.
+        now = timezone.now()
+        claimed = Delivery.objects.filter(
+            pk=pk, status='pending', delivery_boy__isnull=True, order__delivery_pincode=user.pincode
+        ).update(delivery_boy=delivery_boy_profile, status='accepted', updated_at=now)
+
+        if not claimed:
+            current = Delivery.objects.filter(pk=pk).values(
+                'status', 'delivery_boy', 'order__delivery_pincode'
+            ).first()
+            if current is None or (
+                current['delivery_boy'] is None and current['order__delivery_pincode'] != user.pincode
+            ):
+                raise NotFound()
+            if current['delivery_boy'] is not None:
+                return Response(
+                    {'error': 'Delivery already assigned.', 'delivery_boy': current['delivery_boy']},
+                    status=status.HTTP_409_CONFLICT
+                )
+            return Response({'error': 'Delivery is not in pending status.'}, status=status.HTTP_409_CONFLICT)
+
+        delivery = self.get_object()
+        events.delivery_status_changed(
+            delivery.id, delivery.order_id, 'accepted', delivery.order.customer_id,
+            delivery.order.tiffin.owner.user_id, user.id
+        )
+        return Response(DeliverySerializer(delivery).data) 
\ No newline at end of file
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Serve anonymous catalog reads from the async views (see api/async_catalog.py).
+os.environ.setdefault('HOMEEATS_ASYNC_CATALOG', '1')
 
 application = get_asgi_application() 
\ No newline at end of file
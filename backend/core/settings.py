@@ -33,6 +33,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.profiling.ServerTimingMiddleware',
+    'api.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -41,6 +43,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.db.read_your_writes_middleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -68,9 +71,138 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests, checking them before reuse.
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Applied to every new SQLite connection (see api/db.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,  # KiB, i.e. about 20 MB per connection
+    'mmap_size': 268435456,  # 256 MB
+    'busy_timeout': 5000,  # ms
+    'temp_store': 'MEMORY',
+}
+
+# Read replicas for list/retrieve actions, as comma-separated SQLite files
+# kept current with `manage.py sync_sqlite_replicas`.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.environ.get('HOMEEATS_SQLITE_REPLICAS', '').split(',')), 1):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['api.db.ReplicaRouter']
+# How long a user's reads stay on the primary after they write.
+DATABASE_REPLICA_STICKY_SECONDS = 10
+
+# Cache
+# 'default' is per process. 'shared' holds the small values every process
+# has to agree on, such as token and catalog versions (see
+# api/authentication.py and api/catalog_cache.py): Redis when
+# HOMEEATS_REDIS_URL is set (needs the redis package), otherwise files that
+# all processes on this host read.
+REDIS_URL = os.environ.get('HOMEEATS_REDIS_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'home-eats',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+SHARED_CACHE_ALIAS = 'shared'
+
+# Public tiffin catalog response cache (see api/catalog_cache.py)
+CATALOG_CACHE_TIMEOUT = 300  # seconds
+CATALOG_CACHE_LOCK_TIMEOUT = 5  # seconds
+
+# Real-time status events (see api/events.py)
+EVENTS_BROKER = 'api.events.InProcessBroker'
+EVENTS_HEARTBEAT_SECONDS = 15
+
+# Automatic delivery dispatch (see api/dispatch.py)
+DISPATCH_MAX_ACTIVE_PER_RIDER = 1
+DISPATCH_BATCH_SIZE = 500
+
+# Per-process cache of authenticated users (see api/authentication.py)
+AUTH_USER_CACHE_TIMEOUT = 60  # seconds
+AUTH_USER_CACHE_MAX_ENTRIES = 10000
+
+# List endpoints serialize .values() rows directly (see api/fast_serializers.py)
+FAST_READ_SERIALIZERS = True
+
+# Background resizing of tiffin photos (see api/images.py)
+IMAGE_PIPELINE_WORKERS = 2
+
+# Proximity search: grid cell size in degrees and radius limits (see api/geo.py)
+GEO_GRID_CELL_DEGREES = 0.01
+GEO_DEFAULT_RADIUS_KM = 5
+GEO_MAX_RADIUS_KM = 25
+
+# Rider location pings are coalesced in memory and written in batches (see api/locations.py)
+RIDER_LOCATION_FLUSH_SECONDS = 5
+RIDER_LOCATION_MAX_BATCH = 100
+# Flush early once this many riders have positions waiting
+RIDER_LOCATION_MAX_BUFFERED = 5000
+
+# Changes feed page size and how old a change must be before it is served (see api/sync.py).
+# The settle window must outlast a write waiting for the SQLite lock
+# (busy_timeout in SQLITE_PRAGMAS, 5 s) plus the transaction itself.
+SYNC_PAGE_SIZE = 100
+SYNC_MAX_PAGE_SIZE = 500
+SYNC_SETTLE_SECONDS = 10
+
+# Server-Timing header on every response, and stack profiles of requests
+# slower than the threshold (see api/profiling.py); None stops sampling.
+# Development only by default: the header is visible to every client.
+SERVER_TIMING = DEBUG
+REQUEST_PROFILE_THRESHOLD_MS = 500 if DEBUG else None
+REQUEST_PROFILE_INTERVAL_MS = 5
+REQUEST_PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+REQUEST_PROFILE_KEEP = 100
+
+# How often each process adds its conditional GET counts to the database
+# (see api/conditional.py)
+CONDITIONAL_STATS_FLUSH_SECONDS = 60
+
+# JSON through orjson when it is installed (see api/renderers.py)
+FAST_JSON = True
+
+# gzip / brotli response compression (see api/compression.py)
+COMPRESSION_MIN_BYTES = 1024
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Answer anonymous catalog reads with async views (see api/async_catalog.py).
+# core/asgi.py turns this on; under WSGI the sync viewset is faster.
+ASYNC_CATALOG = os.environ.get('HOMEEATS_ASYNC_CATALOG') == '1'
+
+# Background tasks (see api/tasks.py). Deliveries and restocks are created
+# by tasks, so production needs at least one manage.py run_tasks worker. With
+# TASK_RUN_INLINE undelayed tasks run in the web process after each commit
+# instead, which is enough for runserver; delayed tasks still need a worker.
+TASK_RUN_INLINE = DEBUG
+TASK_POOL = 'thread'  # or 'process' for CPU-bound tasks
+TASK_CONCURRENCY = 4
+TASK_POLL_SECONDS = 0.5
+TASK_LEASE_SECONDS = 300
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_BASE_SECONDS = 2
+TASK_RETRY_MAX_SECONDS = 600
+TASK_KEEP_DONE_SECONDS = 24 * 3600
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -109,11 +241,20 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10
 }
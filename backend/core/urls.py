@@ -9,6 +9,9 @@ from api.views import (
     UserViewSet, TiffinOwnerViewSet, DeliveryBoyViewSet,
     TiffinViewSet, OrderViewSet, DeliveryViewSet
 )
+from api.async_catalog import tiffin_detail, tiffin_list
+from api.events import event_stream
+from api.sync import ChangesView
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
@@ -36,8 +39,18 @@ schema_view = get_schema_view(
     permission_classes=(permissions.AllowAny,),
 )
 
+# Anonymous catalog reads, natively async under ASGI; everything else on
+# these URLs falls through to TiffinViewSet.
+catalog_urlpatterns = [
+    path('api/tiffins/', tiffin_list, name='tiffin-browse'),
+    re_path(r'^api/tiffins/(?P<pk>[^/.]+)/$', tiffin_detail, name='tiffin-browse-detail'),
+]
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/events/', event_stream, name='events'),
+    path('api/changes/', ChangesView.as_view(), name='changes'),
+    *(catalog_urlpatterns if settings.ASYNC_CATALOG else []),
     path('api/', include(router.urls)),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
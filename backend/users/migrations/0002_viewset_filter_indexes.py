@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="tiffinowner",
+            index=models.Index(
+                fields=["business_pincode"], name="users_owner_pincode_idx"
+            ),
+        ),
+    ]
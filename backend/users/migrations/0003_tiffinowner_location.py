@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_viewset_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tiffinowner",
+            name="geo_cell",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="tiffinowner",
+            name="latitude",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="tiffinowner",
+            name="longitude",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="tiffinowner",
+            index=models.Index(
+                fields=["geo_cell", "latitude", "longitude"],
+                name="users_owner_geo_cell_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_tiffinowner_location"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="deliveryboy",
+            name="latitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="deliveryboy",
+            name="location_updated_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="deliveryboy",
+            name="longitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -22,7 +22,17 @@ class TiffinOwner(models.Model):
     business_address = models.TextField()
     business_pincode = models.CharField(max_length=6)
     is_verified = models.BooleanField(default=False)
-    
+    # Defaults to the centre of business_pincode; see api/geo.py.
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geo_cell = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['business_pincode'], name='users_owner_pincode_idx'),
+            models.Index(fields=['geo_cell', 'latitude', 'longitude'], name='users_owner_geo_cell_idx'),
+        ]
+
     def __str__(self):
         return self.business_name
 
@@ -31,6 +41,11 @@ class DeliveryBoy(models.Model):
     vehicle_number = models.CharField(max_length=20)
     is_available = models.BooleanField(default=True)
     current_location = models.CharField(max_length=100, blank=True)
+    # Last position reported through the location endpoint, written in
+    # batches by api.locations.
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    location_updated_at = models.DateTimeField(null=True, blank=True, editable=False)
     
     def __str__(self):
         return f"{self.user.username} - {self.vehicle_number}" 
\ No newline at end of file